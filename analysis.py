@@ -0,0 +1,192 @@
+import random
+from collections import namedtuple
+
+from . import itemgen
+from . import placegen
+from . import weighted_random
+
+# Exact outcome distributions of the generators, computed by propagating probabilities through the weight tables
+# instead of sampling, so the effect of a change to sources/*.json can be seen right away
+# distributions are dictionaries of outcome to probability
+
+# Value distributions with more distinct copper values than this are sampled instead of enumerated
+MAX_ENUMERATED_VALUES = 200000
+DEFAULT_SAMPLES = 100000
+DEFAULT_SEED = 1
+
+# The distributions of a generate_item request, mean_value is the expected value in copper
+ItemDistribution = namedtuple('ItemDistribution', 'categories items rarities tiers artifact mean_value')
+
+# The distributions of create_fortress, empties, intruders and monsters are the probabilities of the whole fortress
+# rather than conditional ones, so moved_in is the probability that the fortress is overrun by intruders
+FortressDistribution = namedtuple('FortressDistribution', 'ages conditions inhabitants empties intruders monsters '
+                                                          'empty moved_in')
+
+# The distributions of create_room
+# contents, treasures and door_states are per roll, treasure_chance is the chance of a treasure per content roll,
+# trapped_treasure the chance of a treasure being trapped, items the expected items of every value class per room,
+# and trapped, inhabited and trapped_doors the chance of a trap, of a monster and the expected trapped doors per room
+RoomDistribution = namedtuple('RoomDistribution', 'types doors door_states contents treasure_chance treasure_counts '
+                                                  'treasures trapped_treasure items trapped inhabited trapped_doors')
+
+
+# Normalizes weights into probabilities, keys without a positive weight are never drawn and left out
+def normalize(weights):
+    weights = {key: weight for key, weight in weights.items() if weight > 0}
+    total = sum(weights.values())
+    return {key: weight / total for key, weight in weights.items()}
+
+
+# Adds probability to the outcome of a distribution
+def add(distribution, key, probability):
+    distribution[key] = distribution.get(key, 0) + probability
+
+
+# The marginal distribution of a part of the outcomes, e.g. marginal(outcomes, lambda outcome: outcome.rarity)
+def marginal(distribution, key):
+    result = {}
+    for outcome, probability in distribution.items():
+        add(result, key(outcome), probability)
+    return result
+
+
+# The chance that a d6 roll comes up at most chance, as create_room rolls for treasure
+def get_roll_chance(chance):
+    return min(max(chance, 0), 6) / 6
+
+
+# The chance that a d6 roll comes up at least chance, as create_room rolls for treasure traps, 0 is never
+def get_trap_chance(chance):
+    return min(max(7 - chance, 0), 6) / 6 if chance > 0 else 0
+
+
+# The distribution of the number of successes in rolls with a chance of success each
+def get_binomial(rolls, chance):
+    distribution = {0: 1.0}
+    for _ in range(rolls):
+        result = {}
+        for successes, probability in distribution.items():
+            add(result, successes, probability * (1 - chance))
+            add(result, successes + 1, probability * chance)
+        distribution = result
+    return distribution
+
+
+def get_item_distribution(item_types=('any',), item_value='cheap', max_weight=100):
+    outcomes = itemgen.get_item_outcomes(tuple(item_types), item_value, max_weight)
+    mean_value = sum(probability * sum(itemgen.get_outcome_copper_range(outcome)) / 2
+                     for outcome, probability in outcomes.items())
+    return ItemDistribution(categories=marginal(outcomes, lambda outcome: outcome.item.category),
+                            items=marginal(outcomes, lambda outcome: outcome.item.name),
+                            rarities=marginal(outcomes, lambda outcome: outcome.rarity),
+                            tiers=marginal(outcomes, lambda outcome: (outcome.rarity, outcome.tier)),
+                            artifact=sum(probability for outcome, probability in outcomes.items()
+                                         if itemgen.get_outcome_tier(outcome).is_artifact),
+                            mean_value=mean_value)
+
+
+# The distribution of the value in copper of an item, values of at most 0 are worthless
+# enumerated exactly unless there are more than max_values distinct values to enumerate,
+# then the items and tiers are drawn from their exact distribution and only the randomized value is sampled
+def get_value_distribution(item_types=('any',), item_value='cheap', max_weight=100, max_values=MAX_ENUMERATED_VALUES,
+                           samples=DEFAULT_SAMPLES, seed=DEFAULT_SEED):
+    outcomes = itemgen.get_item_outcomes(tuple(item_types), item_value, max_weight)
+    ranges = {outcome: itemgen.get_outcome_copper_range(outcome) for outcome in outcomes}
+
+    distribution = {}
+    if sum(high - low + 1 for low, high in ranges.values()) <= max_values:
+        for outcome, probability in outcomes.items():
+            low, high = ranges[outcome]
+            for value in range(low, high + 1):
+                add(distribution, value, probability / (high - low + 1))
+        return distribution
+
+    rng = random.Random(seed)
+    sampler = weighted_random.WeightedSampler(outcomes)
+    for _ in range(samples):
+        add(distribution, rng.randint(*ranges[sampler.choice(rng)]), 1 / samples)
+    return distribution
+
+
+def get_fortress_distribution():
+    ages = normalize(placegen.AGE_SAMPLERS['fortresses'].weights)
+    conditions = {}
+    for age, age_probability in ages.items():
+        for condition, probability in normalize(placegen.CONDITION_SAMPLERS[age].weights).items():
+            add(conditions, condition, age_probability * probability)
+
+    inhabitants = {}
+    for condition, condition_probability in conditions.items():
+        for inhabitant, probability in normalize(placegen.INHABITANT_SAMPLERS[condition].weights).items():
+            add(inhabitants, inhabitant, condition_probability * probability)
+
+    empty = sum(probability for inhabitant, probability in inhabitants.items()
+                if placegen.FORTRESS_INHABITANTS[inhabitant].roll_empty)
+    moved_in = sum(probability for inhabitant, probability in inhabitants.items()
+                   if placegen.FORTRESS_INHABITANTS[inhabitant].roll_moved_in)
+
+    empties = {name: empty * probability for name, probability in normalize(placegen.EMPTY_SAMPLER.weights).items()}
+    intruders = {name: moved_in * probability
+                 for name, probability in normalize(placegen.INTRUDER_SAMPLER.weights).items()}
+    monster_intruders = sum(probability for name, probability in intruders.items()
+                            if placegen.INTRUDERS[name].roll_for_monster)
+    monsters = {name: monster_intruders * probability
+                for name, probability in normalize(placegen.MONSTER_SAMPLER.weights).items()}
+
+    return FortressDistribution(ages=ages, conditions=conditions, inhabitants=inhabitants, empties=empties,
+                                intruders=intruders, monsters=monsters, empty=empty, moved_in=moved_in)
+
+
+def get_room_distribution():
+    types = normalize({room_type.name: room_type.weight for room_type in placegen.ROOM_TYPES.values()})
+    doors = {int(number): probability for number, probability in normalize(placegen.ROOM_DOORS).items()}
+    door_states = normalize({state.name: state.weight for state in placegen.ROOM_DOOR_STATES.values()})
+    contents = normalize({content.name: content.weight for content in placegen.ROOM_CONTENTS.values()})
+    treasures = normalize({treasure.name: treasure.weight for treasure in placegen.ROOM_TREASURES.values()})
+
+    treasure_chance = sum(probability * get_roll_chance(placegen.ROOM_CONTENTS[content].treasure_chance)
+                          for content, probability in contents.items())
+    trap_chance = sum(probability for content, probability in contents.items()
+                      if placegen.ROOM_CONTENTS[content].trapped)
+    inhabited_chance = sum(probability for content, probability in contents.items()
+                           if placegen.ROOM_CONTENTS[content].inhabited)
+
+    # Every content roll is independent, so the treasures of a room are binomial in its content rolls
+    treasure_counts = {}
+    trapped = 0
+    inhabited = 0
+    for room_type, type_probability in types.items():
+        rolls = max(placegen.ROOM_TYPES[room_type].content_rolls, 0)
+        for count, probability in get_binomial(rolls, treasure_chance).items():
+            add(treasure_counts, count, type_probability * probability)
+        trapped += type_probability * (1 - (1 - trap_chance) ** rolls)
+        inhabited += type_probability * (1 - (1 - inhabited_chance) ** rolls)
+    expected_treasures = sum(count * probability for count, probability in treasure_counts.items())
+
+    items = {'cheap': 0, 'valuable': 0, 'precious': 0}
+    for name, probability in treasures.items():
+        treasure = placegen.ROOM_TREASURES[name]
+        items['cheap'] += expected_treasures * probability * treasure.simple_treasure_rolls
+        items['valuable'] += expected_treasures * probability * treasure.valuable_treasure_rolls
+        items['precious'] += expected_treasures * probability * treasure.precious_treasure_rolls
+
+    trapped_door = sum(probability for state, probability in door_states.items()
+                       if placegen.ROOM_DOOR_STATES[state].trapped)
+    trapped_treasure = sum(probability * get_trap_chance(placegen.ROOM_TREASURES[name].trap_chance)
+                           for name, probability in treasures.items())
+    expected_doors = sum(number * probability for number, probability in doors.items())
+
+    return RoomDistribution(types=types, doors=doors, door_states=door_states, contents=contents,
+                            treasure_chance=treasure_chance, treasure_counts=treasure_counts, treasures=treasures,
+                            trapped_treasure=trapped_treasure, items=items, trapped=trapped, inhabited=inhabited,
+                            trapped_doors=expected_doors * trapped_door)
+
+
+# Estimates a distribution by sampling, for the generators and parts of them that are not enumerated above
+# key picks the part of a generated record to count, e.g. sample(placegen.create_village, lambda v: v.size.name)
+def sample(generator, key, samples=DEFAULT_SAMPLES, seed=DEFAULT_SEED):
+    rng = random.Random(seed)
+    distribution = {}
+    for _ in range(samples):
+        add(distribution, key(generator(rng=rng)), 1 / samples)
+    return distribution
@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+from . import chargen
+from . import itemgen
+from . import placegen
+
+# Benchmarks of every generator on fixed seeds, with a baseline file to compare later runs against
+# latencies are in microseconds, throughput in calls per second and peak memory in bytes
+
+# A generator benchmark, run calls run(rng) on one seeded rng
+Benchmark = namedtuple('Benchmark', 'name run')
+
+BENCHMARKS = [Benchmark('generate_character', lambda rng: chargen.generate_character(rng=rng))]
+BENCHMARKS += [Benchmark(f'generate_item[{item_value}]',
+                         lambda rng, item_value=item_value: itemgen.generate_item(['any'], item_value, rng=rng))
+               for item_value in itemgen.TIER_WEIGHTS]
+BENCHMARKS += [Benchmark('create_village', lambda rng: placegen.create_village(rng=rng)),
+               Benchmark('create_dungeon', lambda rng: placegen.create_dungeon(rng=rng)),
+               Benchmark('create_fortress', lambda rng: placegen.create_fortress(rng=rng)),
+               Benchmark('create_room', lambda rng: placegen.create_room(rng=rng))]
+
+DEFAULT_SEED = 1
+DEFAULT_ITERATIONS = 2000
+DEFAULT_MEMORY_ITERATIONS = 200
+DEFAULT_IMPORT_RUNS = 5
+DEFAULT_THRESHOLD = 0.2
+
+# Whether a higher value of a measurement is better, for the comparison with a baseline
+HIGHER_IS_BETTER = {'throughput': True, 'p50': False, 'p95': False, 'p99': False, 'peak_memory': False,
+                    'seconds': False}
+
+# Imports the generators in a fresh interpreter and prints the seconds taken by the import and by the first use,
+# which loads the tables (from their snapshots when they are warm)
+IMPORT_SCRIPT = '''
+import time
+t1 = time.perf_counter()
+from {package} import chargen, itemgen, placegen
+t2 = time.perf_counter()
+placegen.create_room()
+itemgen.generate_item(['any'], 'artifact')
+chargen.generate_character()
+t3 = time.perf_counter()
+print(t2 - t1, t3 - t1)
+'''
+
+
+# The value at a percentile of sorted values, by the nearest rank
+def get_percentile(values, percentile):
+    rank = max(math.ceil(percentile / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def run_benchmark(benchmark, iterations=DEFAULT_ITERATIONS, memory_iterations=DEFAULT_MEMORY_ITERATIONS,
+                  seed=DEFAULT_SEED):
+    # Warm up the tables and caches outside of the measurements
+    warmup_rng = random.Random(seed - 1)
+    for _ in range(min(iterations, 100)):
+        benchmark.run(warmup_rng)
+
+    rng = random.Random(seed)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter_ns()
+        benchmark.run(rng)
+        latencies.append((time.perf_counter_ns() - t) / 1000)
+    seconds = time.perf_counter() - start
+    latencies.sort()
+
+    # tracemalloc slows every allocation down, so memory is measured in a separate, shorter run
+    rng = random.Random(seed)
+    tracemalloc.start()
+    try:
+        for _ in range(memory_iterations):
+            benchmark.run(rng)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'throughput': iterations / seconds,
+            'p50': get_percentile(latencies, 50),
+            'p95': get_percentile(latencies, 95),
+            'p99': get_percentile(latencies, 99),
+            'peak_memory': peak_memory}
+
+
+# Median import and startup seconds over fresh interpreters
+def run_import_benchmark(runs=DEFAULT_IMPORT_RUNS):
+    package_folder = os.path.dirname(os.path.abspath(__file__))
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [os.path.dirname(package_folder)] + [path for path in [os.environ.get('PYTHONPATH')] if path]))
+    script = IMPORT_SCRIPT.format(package=__package__)
+
+    imports = []
+    startups = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', script], env=environment, capture_output=True, text=True,
+                                check=True).stdout
+        import_seconds, startup_seconds = (float(value) for value in output.split())
+        imports.append(import_seconds)
+        startups.append(startup_seconds)
+
+    return {'import': {'seconds': statistics.median(imports)},
+            'startup': {'seconds': statistics.median(startups)}}
+
+
+# Runs the benchmarks whose names contain one of the selected strings, or all of them
+def run(selected=None, iterations=DEFAULT_ITERATIONS, memory_iterations=DEFAULT_MEMORY_ITERATIONS,
+        seed=DEFAULT_SEED, import_runs=DEFAULT_IMPORT_RUNS, report=None):
+    results = {}
+    for benchmark in BENCHMARKS:
+        if selected and not any(name in benchmark.name for name in selected):
+            continue
+        results[benchmark.name] = run_benchmark(benchmark, iterations, memory_iterations, seed)
+        if report:
+            report(benchmark.name, results[benchmark.name])
+
+    if import_runs and (not selected or any(name in benchmark_name for name in selected
+                                            for benchmark_name in ('import', 'startup'))):
+        for name, result in run_import_benchmark(import_runs).items():
+            results[name] = result
+            if report:
+                report(name, result)
+
+    return {'meta': {'python': platform.python_version(),
+                     'platform': platform.platform(),
+                     'seed': seed,
+                     'iterations': iterations,
+                     'memory_iterations': memory_iterations,
+                     'created': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'results': results}
+
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# A measurement compared with its baseline, change is the relative change, positive when it got worse
+Comparison = namedtuple('Comparison', 'benchmark measurement baseline current change regression')
+
+
+# Compares every measurement with the baseline, a change of more than threshold for the worse is a regression
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    comparisons = []
+    for name, result in current['results'].items():
+        baseline_result = baseline['results'].get(name)
+        if baseline_result is None:
+            continue
+        for measurement, value in result.items():
+            baseline_value = baseline_result.get(measurement)
+            if not baseline_value:
+                continue
+            change = (value - baseline_value) / baseline_value
+            if HIGHER_IS_BETTER[measurement]:
+                change = -change
+            comparisons.append(Comparison(benchmark=name, measurement=measurement, baseline=baseline_value,
+                                          current=value, change=change, regression=change > threshold))
+    return comparisons
+
+
+def format_value(measurement, value):
+    if measurement == 'throughput':
+        return f'{value:,.0f}/s'
+    if measurement == 'peak_memory':
+        return f'{value / 1024:,.0f} KiB'
+    if measurement == 'seconds':
+        return f'{value * 1000:,.1f} ms'
+    return f'{value:,.1f} us'
+
+
+def format_result(name, result):
+    values = '  '.join(f'{measurement} {format_value(measurement, value)}' for measurement, value in result.items())
+    return f'{name:<28} {values}'
+
+
+def format_comparison(comparison):
+    flag = 'REGRESSION' if comparison.regression else ''
+    return (f'{comparison.benchmark:<28} {comparison.measurement:<12} '
+            f'{format_value(comparison.measurement, comparison.baseline):>14} -> '
+            f'{format_value(comparison.measurement, comparison.current):>14} '
+            f'{(comparison.current - comparison.baseline) / comparison.baseline:+8.1%} {flag}')
@@ -0,0 +1,107 @@
+import os
+import random
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from . import chargen
+from . import columns
+from . import data_loader
+from . import itemgen
+from . import placegen
+from . import weighted_random
+
+# The generators a bulk job can run, all of them take an rng keyword argument
+GENERATORS = {'place': placegen.create_place,
+              'village': placegen.create_village,
+              'dungeon': placegen.create_dungeon,
+              'fortress': placegen.create_fortress,
+              'room': placegen.create_room,
+              'item': itemgen.generate_item,
+              'character': chargen.generate_character}
+
+DEFAULT_SHARD_SIZE = 100
+
+
+# Derive the seed of a shard from the master seed, the same way every seeded generator derives its rng from a key
+# the shards only depend on the master seed and their index, never on the number of workers
+def get_shard_seed(master_seed, shard):
+    return weighted_random.get_seed((master_seed, shard))
+
+
+# Runs once in every worker process before its first shard
+# loads every generator table (from the snapshot if it is warm) and compiles the character plans,
+# so the shards only draw from them
+def init_worker():
+    data_loader.load_all()
+    chargen.prewarm_plans()
+
+
+# Generate one shard of results on its own random stream
+def run_shard(kind, seed, count, args, kwargs):
+    rng = random.Random(seed)
+    generator = GENERATORS[kind]
+    return [generator(*args, rng=rng, **kwargs) for _ in range(count)]
+
+
+def get_shards(kind, count, master_seed, shard_size, args, kwargs):
+    for shard, start in enumerate(range(0, count, shard_size)):
+        yield kind, get_shard_seed(master_seed, shard), min(shard_size, count - start), args, kwargs
+
+
+# Generate count results of a kind, spread over worker processes in shards of shard_size
+# results are yielded as they come in, in order by default or as soon as each shard is done with ordered=False
+# for a given master seed and shard size the results are the same for any number of workers
+def generate(kind, count, *args, master_seed=None, workers=None, shard_size=DEFAULT_SHARD_SIZE, ordered=True,
+             **kwargs):
+    if kind not in GENERATORS:
+        raise ValueError(f'unknown kind {kind!r}, expected one of {", ".join(GENERATORS)}')
+    if master_seed is None:
+        master_seed = random.SystemRandom().getrandbits(64)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    shards = get_shards(kind, count, master_seed, shard_size, args, kwargs)
+
+    # Load the tables before the pool starts, so forked workers inherit them instead of each loading them
+    init_worker()
+
+    if workers <= 1:
+        for shard in shards:
+            yield from run_shard(*shard)
+        return
+
+    # Keep a bounded number of shards in flight so memory stays flat for large counts
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        pending = deque()
+        for shard in shards:
+            pending.append(executor.submit(run_shard, *shard))
+            if len(pending) < max_pending:
+                continue
+            if ordered:
+                yield from pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield from future.result()
+
+        if ordered:
+            while pending:
+                yield from pending.popleft().result()
+        else:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    yield from future.result()
+
+
+# Generate count items or characters into a columnar batch (columns.ItemColumns or columns.CharacterColumns)
+# instead of a list of records, the records are coded as they come in so only one of them is alive at a time
+def generate_columns(kind, count, *args, **kwargs):
+    if kind not in columns.COLUMNS:
+        raise ValueError(f'there is no columnar batch of {kind!r}, expected one of {", ".join(columns.COLUMNS)}')
+    batch = columns.COLUMNS[kind]()
+    batch.extend(generate(kind, count, *args, **kwargs))
+    return batch
@@ -0,0 +1,92 @@
+import sys
+from collections import OrderedDict
+from collections import namedtuple
+
+from . import bulk
+from . import chargen
+from . import weighted_random
+
+# A bounded, least recently used cache of seeded content
+# every record is generated from its seed (e.g. the coordinates of a location) on a private rng, so a record
+# that has been evicted is generated again, the same as before, the next time it is asked for
+# nothing is ever persisted
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+CacheStats = namedtuple('CacheStats', 'hits misses evictions entries bytes')
+
+# Records every character shares with the tables, which do not count towards the size of a character
+SHARED_TYPES = (chargen.Kin, chargen.Profession, chargen.Age)
+
+
+# The approximate size in bytes of a generated record, with everything it holds
+def get_size(value, seen=None):
+    if seen is None:
+        seen = set()
+    if id(value) in seen or isinstance(value, SHARED_TYPES):
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(get_size(key, seen) + get_size(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(get_size(item, seen) for item in value)
+    return size
+
+
+# The arguments of a generator as a hashable key, lists become tuples
+def freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    return value
+
+
+class ContentCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # (kind, seed, args, kwargs): (record, size), least recently used first
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Returns the record of a kind (one of bulk.GENERATORS) for a seed, e.g. get('village', (3, 4)),
+    # other arguments are passed on to the generator and are part of the key
+    # the seed is turned into the int the generator would seed its rng with first, so seeds that freeze to the same
+    # key but give different content, e.g. [3, 4] and (3, 4), are kept apart
+    def get(self, kind, seed, *args, **kwargs):
+        seed = weighted_random.get_seed(seed)
+        key = (kind, seed, freeze(args), freeze(kwargs))
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        record = bulk.GENERATORS[kind](*args, seed=seed, **kwargs)
+        size = get_size(record)
+        self.entries[key] = (record, size)
+        self.bytes += size
+        while self.entries and (len(self.entries) > self.max_entries or
+                                (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+        return record
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return CacheStats(hits=self.hits, misses=self.misses, evictions=self.evictions, entries=len(self.entries),
+                          bytes=self.bytes)
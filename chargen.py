@@ -1,11 +1,14 @@
+import bisect
+import math
 import random
 import time
 from collections import namedtuple
+from functools import lru_cache
 from . import data_loader as dl
+from . import metrics
+from . import records
 from . import weighted_random as wr
 
-# Initialize and load data from JSON file
-char_data = dl.init_data('char_data.json')
 
 # A character with attributes
 Character = namedtuple('Character', ['name', 'title', 'kin', 'profession', 'attributes', 'skills', 'talents',
@@ -30,235 +33,411 @@ Talent = namedtuple('Talent', ['name', 'type', 'level'])
 
 Personality = namedtuple('Personality', ['trait', 'like', 'dislike'])
 
+# The creator of an artifact, only the parts of a character its myth, perk and drawback use
+# skill is the name of the creator's highest skill
+Creator = namedtuple('Creator', ['name', 'title', 'kin', 'profession', 'skill'])
+
+# The static definitions in char_data.json that the generated characters draw from
+SkillDefinition = namedtuple('SkillDefinition', 'name attribute')
+TalentDefinition = namedtuple('TalentDefinition', 'name type races professions skills')
+
+# The name parts of a kin and the title parts of a profession
+KinNames = namedtuple('KinNames', 'name_beginnings name_middles name_endings title_beginnings title_endings')
+ProfessionTitles = namedtuple('ProfessionTitles', 'title_beginnings title_endings')
+
+Personalities = namedtuple('Personalities', 'traits things')
+
+# The names made of one part from each list in parts, without the combinations that are banned or too short
+# the size valid combinations are ranked in product order, rank k is the combination at flat index
+# k + bisect_right(offsets, k), where offsets[i] is the flat index of the i-th excluded combination minus i
+NameSpace = namedtuple('NameSpace', 'parts size offsets')
+
+# The shape of char_data.json, checked once when the tables are built
+POINT_LIMITS_SCHEMA = {'DEFAULT': int}
+CHAR_DATA_SCHEMA = {
+    'races': records.ListOf({'name': str, 'ages': records.DictOf(records.NUMBER), 'attribute': str,
+                             'professions': records.STRINGS, 'talent': str, 'compound': str}),
+    'point_limits': {'attributes': POINT_LIMITS_SCHEMA, 'skills': POINT_LIMITS_SCHEMA,
+                     'talents': POINT_LIMITS_SCHEMA},
+    'weights': {'BASE': records.NUMBER, 'attributes': records.NUMBER, 'skills': records.NUMBER,
+                'professions': records.NUMBER, 'talents': records.NUMBER},
+    'ages': records.ListOf({'name': str, 'renown': int, 'attribute_points': int, 'skill_points': int,
+                            'talent_points': int}),
+    'professions': records.ListOf({'name': str, 'attribute': str, 'skills': records.STRINGS,
+                                   'talents': records.STRINGS, 'definite': str}),
+    'attributes': records.ListOf({'name': str}),
+    'skills': records.ListOf({'name': str, 'attribute': str}),
+    'talents': records.ListOf({'name': str, 'type': str, 'races': records.STRINGS,
+                               'professions': records.STRINGS, 'skills': records.STRINGS}),
+    'names': {'races': records.DictOf({'name_beginnings': records.STRINGS, 'name_middles': records.STRINGS,
+                                       'name_endings': records.STRINGS, 'title_beginnings': records.STRINGS,
+                                       'title_endings': records.STRINGS}),
+              'professions': records.DictOf({'title_beginnings': records.STRINGS,
+                                             'title_endings': records.STRINGS}),
+              'banned': {'names': records.STRINGS, 'titles': records.STRINGS}},
+    'personalities': {'traits': records.STRINGS, 'things': records.STRINGS}}
+
 
 # Return a dictionary of possible ages and their attributes
 # {'young': Age(name='young', base_renown=...)}
-def parse_ages():
-    ages = []
-    age_data = char_data.get('ages')
-    for age in age_data:
-        ages.append(Age(name=age.get('name'),
-                        renown=age.get('renown'),
-                        attribute_points=age.get('attribute_points'),
-                        skill_points=age.get('skill_points'),
-                        talent_points=age.get('talent_points')))
+def parse_ages(char_data):
+    ages = [records.make_record(Age, age) for age in char_data.get('ages')]
     return {age.name: age for age in ages}
 
 
 # Return a dictionary of possible kins and their attributes
 # {'human': Kin(name='human', age_weights=...)}
-def parse_kins():
+def parse_kins(char_data):
     kins = []
     kin_data = char_data.get('races')
     for kin in kin_data:
-        kins.append(Kin(name=kin.get('name'),
-                        age_weights=kin.get('ages'),
-                        attribute=kin.get('attribute'),
-                        professions=kin.get('professions'),
-                        compound=kin.get('compound'),
-                        talent=kin.get('talent')))
+        kins.append(records.make_record(Kin, kin,
+                                        age_weights={records.intern_value(age): weight
+                                                     for age, weight in kin.get('ages').items()},
+                                        professions=records.interned_set(kin.get('professions'))))
     return {kin.name: kin for kin in kins}
 
 
 # Return a dictionary of possible professions and their attributes
 # {'warrior': Profession(name='warrior', attribute=...)}
-def parse_professions():
+def parse_professions(char_data):
     professions = []
     profession_data = char_data.get('professions')
     for profession in profession_data:
-        professions.append(Profession(name=profession.get('name'),
-                                      attribute=profession.get('attribute'),
-                                      skills=profession.get('skills'),
-                                      talents=profession.get('talents'),
-                                      definite=profession.get('definite')))
+        professions.append(records.make_record(Profession, profession,
+                                               skills=records.interned_set(profession.get('skills')),
+                                               talents=records.interned_tuple(profession.get('talents'))))
     return {profession.name: profession for profession in professions}
 
 
+# Return a dictionary of talent definitions, their kins, professions and skills as frozensets
+# {'adaptiv': TalentDefinition(name='adaptiv', type='racial', races=frozenset(), ...)}
+def parse_talents(char_data):
+    talents = [records.make_record(TalentDefinition, talent,
+                                   races=records.interned_set(talent.get('races')),
+                                   professions=records.interned_set(talent.get('professions')),
+                                   skills=records.interned_set(talent.get('skills')))
+               for talent in char_data.get('talents')]
+    return {talent.name: talent for talent in talents}
+
+
+# Return the point limits of a kind as a tuple indexed by the number of matches, up to max_matches
+# (4, 5, 6) for {'DEFAULT': 4, '1': 5, '2': 6}, match counts without a limit of their own take the default
+def parse_point_limits(point_limits, max_matches):
+    return tuple(point_limits.get(str(matches)) or point_limits.get('DEFAULT') for matches in range(max_matches + 1))
+
+
+# Return the name and title parts of every kin and profession and the banned names and titles
+def parse_names(name_data):
+    def parts(record_type, data):
+        return record_type(*(records.interned_tuple(data.get(field)) for field in record_type._fields))
+
+    banned = name_data.get('banned')
+    return {'KIN_NAMES': {records.intern_value(kin): parts(KinNames, names)
+                          for kin, names in name_data.get('races').items()},
+            'PROFESSION_TITLES': {records.intern_value(profession): parts(ProfessionTitles, titles)
+                                  for profession, titles in name_data.get('professions').items()},
+            'BANNED_NAMES': records.interned_set(banned.get('names')),
+            'BANNED_TITLES': records.interned_set(banned.get('titles'))}
+
+
+# The flat positions and names of the combinations of parts whose every prefix fits, in the order of
+# itertools.product, combinations are only extended while they fit so the whole product is never enumerated
+def find_combinations(parts, fits):
+    combinations = [(0, '')]
+    for part in parts:
+        combinations = [(flat * len(part) + position, name + text)
+                        for flat, name in combinations
+                        for position, text in enumerate(part)
+                        if fits(name + text)]
+    return combinations
+
+
+# Compile the name space of some name parts, the combinations that are banned or too short are found once here
+# instead of on every draw, by spelling out each banned name and every name of at most two letters
+def compile_name_space(parts, banned):
+    excluded = {flat for flat, _ in find_combinations(parts, lambda name: len(name) <= 2)}
+    for banned_name in banned:
+        excluded.update(flat for flat, name in find_combinations(parts, banned_name.startswith)
+                        if name == banned_name)
+    excluded = sorted(excluded)
+    return NameSpace(parts=tuple(parts),
+                     size=math.prod(len(part) for part in parts) - len(excluded),
+                     offsets=tuple(flat - position for position, flat in enumerate(excluded)))
+
+
+# Name spaces of every kin and title spaces of every kin and profession
+def compile_name_spaces(names):
+    name_spaces = {kin: compile_name_space((kin_names.name_beginnings, kin_names.name_middles,
+                                            kin_names.name_endings), names['BANNED_NAMES'])
+                   for kin, kin_names in names['KIN_NAMES'].items()}
+    title_spaces = {(kin, profession): compile_name_space((kin_names.title_beginnings + titles.title_beginnings,
+                                                           kin_names.title_endings + titles.title_endings),
+                                                          names['BANNED_TITLES'])
+                    for kin, kin_names in names['KIN_NAMES'].items()
+                    for profession, titles in names['PROFESSION_TITLES'].items()}
+    return {'NAME_SPACES': name_spaces, 'TITLE_SPACES': title_spaces}
+
+
 # Instantiate static lists/dicts of character options
-AGES = parse_ages()
-KINS = parse_kins()
-PROFESSIONS = parse_professions()
-ATTRIBUTES = char_data.get('attributes')
-SKILLS = {skill.get('name'): skill for skill in char_data.get('skills')}
-TALENTS = {talent.get('name'): talent for talent in char_data.get('talents')}
-POINT_LIMITS = char_data.get('point_limits')
-
-WEIGHTS = char_data.get('weights')
-BASE_WEIGHT = WEIGHTS.get('BASE')
-ATTRIBUTE_WEIGHT = WEIGHTS.get('attributes')
-SKILL_WEIGHT = WEIGHTS.get('skills')
-PROFESSION_WEIGHT = WEIGHTS.get('professions')
-TALENT_WEIGHT = WEIGHTS.get('talents')
-
-
-def get_attributes(base_points, kin, profession):
-    points = base_points + random.randint(-1, 1)
-    attributes = {attribute.get('name'): 2 for attribute in ATTRIBUTES}
-    point_limits = {}
-    weights = {}
-
-    for attribute in attributes.keys():
+def build_tables(char_data):
+    records.validate(char_data, CHAR_DATA_SCHEMA, 'char_data')
+    weights = char_data.get('weights')
+    point_limits = char_data.get('point_limits')
+    kins = parse_kins(char_data)
+    professions = parse_professions(char_data)
+    ages = parse_ages(char_data)
+    personalities = char_data.get('personalities')
+    names = parse_names(char_data.get('names'))
+    return {'AGES': ages,
+            'KINS': kins,
+            'PROFESSIONS': professions,
+            'AGE_CODES': records.enumeration(ages),
+            'KIN_CODES': records.enumeration(kins),
+            'PROFESSION_CODES': records.enumeration(professions),
+            'ATTRIBUTES': records.interned_tuple(attribute.get('name') for attribute in char_data.get('attributes')),
+            'SKILLS': {skill.name: skill for skill in (records.make_record(SkillDefinition, skill)
+                                                       for skill in char_data.get('skills'))},
+            'TALENTS': parse_talents(char_data),
+            'ATTRIBUTE_LIMITS': parse_point_limits(point_limits.get('attributes'), 2),
+            'SKILL_LIMITS': parse_point_limits(point_limits.get('skills'), 1),
+            'TALENT_LIMIT': point_limits.get('talents').get('DEFAULT'),
+            'WEIGHTS': weights,
+            'BASE_WEIGHT': weights.get('BASE'),
+            'ATTRIBUTE_WEIGHT': weights.get('attributes'),
+            'SKILL_WEIGHT': weights.get('skills'),
+            'PROFESSION_WEIGHT': weights.get('professions'),
+            'TALENT_WEIGHT': weights.get('talents'),
+            **names,
+            **compile_name_spaces(names),
+            'PERSONALITIES': Personalities(traits=records.interned_tuple(personalities.get('traits')),
+                                           things=records.interned_tuple(personalities.get('things')))}
+
+
+# Static tables, loaded from char_data.json (or a snapshot of it) on first use
+tables = dl.register('chargen', build_tables, 'char_data.json')
+
+
+# Module level access to the tables and the source, e.g. chargen.KINS
+def __getattr__(name):
+    if name == 'char_data':
+        return dl.init_data('char_data.json')
+    return getattr(tables, name)
+
+
+# Everything a kin and profession derive from the tables, compiled once and shared by all their characters
+# limits are the point limits by attribute or skill, the samplers are frozen and copied for every character
+# age only sets the number of points to allocate, which is read from the Age record, so it is not part of the key
+CharacterPlan = namedtuple('CharacterPlan', ['kin', 'profession', 'attribute_limits', 'attribute_sampler',
+                                             'skill_limits', 'skill_sampler', 'profession_talent_sampler',
+                                             'talent_sampler'])
+
+PLAN_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def get_plan(kin_name, profession_name):
+    kin = tables.KINS[kin_name]
+    profession = tables.PROFESSIONS[profession_name]
+
+    attribute_limits = {}
+    attribute_weights = {}
+    for attribute in tables.ATTRIBUTES:
         # matches is the number of matching attributes with the main attribute of the kin and profession
         # if they match, the point limit of the particular attribute will be higher
-        matches = len({kin.attribute} & {attribute}) + len({profession.attribute} & {attribute})
-        point_limit = POINT_LIMITS.get('attributes').get(str(matches))
-        point_limits[attribute] = point_limit if point_limit else POINT_LIMITS.get('attributes').get('DEFAULT')
-
-        # getting the weights of the different attributes depending on the number of matches
-        weights[attribute] = ATTRIBUTE_WEIGHT if matches > 0 else BASE_WEIGHT - ATTRIBUTE_WEIGHT
-
-    while points > 0 and len(weights.keys()) > 0:
-        attribute = wr.weighted_random_choice(weights)
-        if attributes[attribute] < point_limits[attribute]:
-            attributes[attribute] += 1
-            points -= 1
-        else:
-            del weights[attribute]
-
-    return [Attribute(name=key, level=value) for key, value in attributes.items()]
-
-
-def get_skills(base_points, profession):
-    points = base_points + random.randint(-1, 1)
-    skills = {skill.get('name'): 0 for skill in SKILLS.values()}
-    point_limits = {}
-    weights = {}
-
-    for skill in skills.keys():
+        matches = (kin.attribute == attribute) + (profession.attribute == attribute)
+        attribute_limits[attribute] = tables.ATTRIBUTE_LIMITS[matches]
+        attribute_weights[attribute] = (tables.ATTRIBUTE_WEIGHT if matches > 0
+                                        else tables.BASE_WEIGHT - tables.ATTRIBUTE_WEIGHT)
+
+    skill_limits = {}
+    skill_weights = {}
+    for skill in tables.SKILLS:
         # matches is the number of matching skills with the skills of the profession
         # if matches, the higher the point limit of the particular skill
-        matches = len(set(profession.skills) & {skill})
-        point_limit = POINT_LIMITS.get('skills').get(str(matches))
-        point_limits[skill] = point_limit if point_limit else POINT_LIMITS.get('skills').get('DEFAULT')
-
-        # getting the weights of the different skills depending on the number of matches
-        weights[skill] = SKILL_WEIGHT if matches > 0 else BASE_WEIGHT - SKILL_WEIGHT
-
-    while points > 0 and len(weights.keys()) > 0:
-        skill = wr.weighted_random_choice(weights)
-        if skills[skill] < point_limits[skill]:
-            skills[skill] += 1
+        matches = int(skill in profession.skills)
+        skill_limits[skill] = tables.SKILL_LIMITS[matches]
+        skill_weights[skill] = tables.SKILL_WEIGHT if matches > 0 else tables.BASE_WEIGHT - tables.SKILL_WEIGHT
+
+    profession_talent_weights, talent_weights = get_talent_weights(kin, profession)
+
+    return CharacterPlan(kin=kin,
+                         profession=profession,
+                         attribute_limits=attribute_limits,
+                         attribute_sampler=wr.WeightedSampler(attribute_weights, frozen=True),
+                         skill_limits=skill_limits,
+                         skill_sampler=wr.WeightedSampler(skill_weights, frozen=True),
+                         profession_talent_sampler=wr.WeightedSampler(profession_talent_weights, frozen=True),
+                         talent_sampler=wr.WeightedSampler(talent_weights, frozen=True))
+
+
+# Compile the plans of every kin and profession up front, e.g. before forking worker processes
+def prewarm_plans():
+    for kin_name in tables.KINS:
+        for profession_name in tables.PROFESSIONS:
+            get_plan(kin_name, profession_name)
+
+
+# The weighted profession sampler of a kin, professions of the kin are likelier
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def get_profession_sampler(kin_name):
+    kin = tables.KINS[kin_name]
+    return wr.WeightedSampler({profession: tables.PROFESSION_WEIGHT if profession in kin.professions
+                               else tables.BASE_WEIGHT - tables.PROFESSION_WEIGHT
+                               for profession in tables.PROFESSIONS}, frozen=True)
+
+
+# Raise the levels by weighted draws until the points run out or every level is at its limit
+def allocate_points(levels, points, limits, sampler, rng=random):
+    sampler = sampler.copy()
+    while points > 0 and sampler:
+        key = sampler.choice(rng)
+        if levels[key] < limits[key]:
+            levels[key] += 1
             points -= 1
         else:
-            del weights[skill]
-
-    return [Skill(name=key, level=value, attribute=SKILLS.get(key).get('attribute')) for key, value in skills.items()
-            if value > 0]
+            sampler.remove(key)
+    return levels
 
 
-def get_talents(base_points, kin, profession, skills):
-    points = base_points
-    talents = {kin.talent: 1}
+def draw_attributes(plan, base_points, rng=random):
+    points = base_points + rng.randint(-1, 1)
+    attributes = allocate_points(dict.fromkeys(tables.ATTRIBUTES, 2), points, plan.attribute_limits,
+                                 plan.attribute_sampler, rng)
+    return [Attribute(name=key, level=value) for key, value in attributes.items()]
 
-    point_limit = POINT_LIMITS.get('talents').get('DEFAULT')
-    weights = {}
 
-    for profession_talent in profession.talents:
-        talent = TALENTS.get(profession_talent)
-        matches = (len({kin.name} & set(talent.get('races'))) +
-                   len({profession.name} & set(talent.get('professions'))) +
-                   len(set(skills) & set(talent.get('skills'))))
-        weights[profession_talent] = TALENT_WEIGHT * matches if matches > 0 else BASE_WEIGHT - TALENT_WEIGHT
+def draw_skills(plan, base_points, rng=random):
+    points = base_points + rng.randint(-1, 1)
+    skills = allocate_points(dict.fromkeys(tables.SKILLS, 0), points, plan.skill_limits, plan.skill_sampler, rng)
+    return [Skill(name=key, level=value, attribute=tables.SKILLS[key].attribute)
+            for key, value in skills.items() if value > 0]
 
-    talents[wr.weighted_random_choice(weights)] = 1
 
-    for talent in TALENTS.values():
-        if talent.get('type') == 'general':
-            matches = (len({kin.name} & set(talent.get('races'))) +
-                       len({profession.name} & set(talent.get('professions'))) +
-                       len(set(skills) & set(talent.get('skills'))))
-            weights[talent.get('name')] = TALENT_WEIGHT * matches if matches > 0 else BASE_WEIGHT - TALENT_WEIGHT
+def draw_talents(plan, base_points, rng=random):
+    points = base_points
+    talents = {plan.kin.talent: 1}
+    talents[plan.profession_talent_sampler.choice(rng)] = 1
 
-    while points > 0 and len(weights.keys()) > 0:
-        talent = wr.weighted_random_choice(weights)
+    sampler = plan.talent_sampler.copy()
+    while points > 0 and sampler:
+        talent = sampler.choice(rng)
         if talents.get(talent):
-            if talents[talent] < point_limit:
+            if talents[talent] < tables.TALENT_LIMIT:
                 talents[talent] += 1
                 points -= 1
             else:
-                del weights[talent]
+                sampler.remove(talent)
         else:
             talents[talent] = 1
             points -= 1
 
-    return [Talent(name=key, level=value, type=TALENTS.get(key).get('type')) for key, value in talents.items()]
+    return [Talent(name=key, level=value, type=tables.TALENTS[key].type) for key, value in talents.items()]
 
 
-NAME_BITS = char_data.get('names')
+def get_attributes(base_points, kin, profession, rng=random):
+    return draw_attributes(get_plan(kin.name, profession.name), base_points, rng)
 
 
-def get_character_name(kin: str):
-    name_beginnings = NAME_BITS.get('races').get(kin).get('name_beginnings')
-    name_middles = NAME_BITS.get('races').get(kin).get('name_middles')
-    name_endings = NAME_BITS.get('races').get(kin).get('name_endings')
+def get_skills(base_points, profession, rng=random):
+    # the skills only depend on the profession, any kin's plan has the same skill sampler
+    return draw_skills(get_plan(next(iter(tables.KINS)), profession.name), base_points, rng)
 
-    def generate_name():
-        name = random.choice(name_beginnings) + random.choice(name_middles) + random.choice(name_endings)
 
-        while name in NAME_BITS.get('banned').get('names') or len(name) <= 2:
-            name = generate_name()
+# skills are accepted for compatibility, they never add talent matches (see get_talent_weights)
+def get_talents(base_points, kin, profession, skills, rng=random):
+    return draw_talents(get_plan(kin.name, profession.name), base_points, rng)
 
-        return name
 
-    return generate_name()
+# Returns the name at a rank of a name space
+def get_space_name(space, rank):
+    flat = rank + bisect.bisect_right(space.offsets, rank)
+    parts = []
+    for part in reversed(space.parts):
+        flat, index = divmod(flat, len(part))
+        parts.append(part[index])
+    return ''.join(reversed(parts))
 
 
-def get_character_title(kin: str, profession: str):
-    title_beginnings = NAME_BITS.get('races').get(kin).get('title_beginnings') + \
-                       NAME_BITS.get('professions').get(profession).get('title_beginnings')
-    title_endings = NAME_BITS.get('races').get(kin).get('title_endings') + \
-                    NAME_BITS.get('professions').get(profession).get('title_endings')
+# Returns a uniformly drawn name of a name space, one draw without any retries
+def draw_space_name(space, rng=random):
+    if space.size <= 0:
+        raise ValueError('the name space has no valid names')
+    return get_space_name(space, rng.randrange(space.size))
 
-    def generate_title():
-        title = random.choice(title_beginnings) + random.choice(title_endings)
 
-        while title in NAME_BITS.get('banned').get('titles') or len(title) <= 2:
-            title = generate_title()
+def get_character_name(kin: str, rng=random):
+    return draw_space_name(tables.NAME_SPACES[kin], rng)
 
-        return title
 
-    return generate_title()
+def get_character_title(kin: str, profession: str, rng=random):
+    return draw_space_name(tables.TITLE_SPACES[(kin, profession)], rng)
 
 
-PERSONALITIES = char_data.get('personalities')
-
-
-def get_personality():
-    trait = random.choice(PERSONALITIES.get('traits'))
-    like, dislike = random.sample(PERSONALITIES.get('things'), 2)
+def get_personality(rng=random):
+    trait = rng.choice(tables.PERSONALITIES.traits)
+    like, dislike = rng.sample(tables.PERSONALITIES.things, 2)
 
     return Personality(trait=trait,
                        like=like,
                        dislike=dislike)
 
 
-def generate_character(requested_kin=None, requested_profession=None):
-    t1 = time.time()
+# Returns the kin, age and profession of a new character, the requested ones or weighted random ones
+def roll_background(requested_kin=None, requested_profession=None, rng=random):
     # Get requested kin or choose a random one
     if requested_kin:
-        kin = KINS.get(requested_kin)
+        kin = tables.KINS.get(requested_kin)
     else:
-        kin = random.choice(list(KINS.values()))
+        kin = rng.choice(list(tables.KINS.values()))
 
     # Get a weighted random age depending on kin
-    age = AGES.get(wr.weighted_random_choice(kin.age_weights))
+    age = tables.AGES.get(wr.weighted_random_choice(kin.age_weights, rng))
 
     # Get requested kin or choose a random one based on kin
     if requested_profession:
-        profession = PROFESSIONS.get(requested_profession)
+        profession = tables.PROFESSIONS.get(requested_profession)
     else:
-        profession_weights = {}
-        for profession in PROFESSIONS.values():
-            profession_weights[profession.name] = PROFESSION_WEIGHT if profession.name in kin.professions \
-                else BASE_WEIGHT - PROFESSION_WEIGHT
-        profession = PROFESSIONS.get(wr.weighted_random_choice(profession_weights))
-
-    attributes = get_attributes(age.attribute_points, kin, profession)
-    skills = get_skills(age.skill_points, profession)
-    talents = get_talents(age.talent_points, kin, profession, skills)
-    name = get_character_name(kin.name)
-    title = get_character_title(kin.name, profession.name)
-    personality = get_personality()
+        profession = tables.PROFESSIONS.get(get_profession_sampler(kin.name).choice(rng))
+
+    return kin, age, profession
+
+
+# Returns the name of the highest skill, the first one listed if several share the highest level
+def get_highest_skill(skills):
+    highest = None
+    for skill in skills:
+        if highest is None or skill.level > highest.level:
+            highest = skill
+    return highest.name if highest else None
+
+
+# seed, an int or any other key, draws the character from a private rng instead of rng
+@dl.consistent
+def generate_character(requested_kin=None, requested_profession=None, rng=random, seed=None):
+    if seed is not None:
+        rng = wr.get_rng(seed)
+    timed = metrics.enabled
+    if timed:
+        t1 = t2 = time.perf_counter()
+
+    kin, age, profession = roll_background(requested_kin, requested_profession, rng)
+    plan = get_plan(kin.name, profession.name)
+
+    attributes = draw_attributes(plan, age.attribute_points, rng)
+    if timed:
+        t2 = metrics.end_stage('attributes', t2)
+    skills = draw_skills(plan, age.skill_points, rng)
+    if timed:
+        t2 = metrics.end_stage('skills', t2)
+    talents = draw_talents(plan, age.talent_points, rng)
+    if timed:
+        t2 = metrics.end_stage('talents', t2)
+    name = get_character_name(kin.name, rng)
+    title = get_character_title(kin.name, profession.name, rng)
+    if timed:
+        metrics.end_stage('character_naming', t2)
+    personality = get_personality(rng)
 
     character = Character(name=name,
                           title=title,
@@ -271,8 +450,246 @@ def generate_character(requested_kin=None, requested_profession=None):
                           talents=talents,
                           personality=personality)
 
-    t2 = time.time() - t1
+    if timed:
+        metrics.observe_generator('generate_character', time.perf_counter() - t1)
+
+    return character
+
+
+# Generate only what an artifact creator needs: kin, age and profession, the skills (for the highest one),
+# the name and the title, without the attributes, talents and personality of a full character
+# the highest skill has the same distribution as for generate_character, since skills are allocated the same way
+@dl.consistent
+def generate_creator(requested_kin=None, requested_profession=None, rng=random):
+    timed = metrics.enabled
+    if timed:
+        t1 = time.perf_counter()
+
+    kin, age, profession = roll_background(requested_kin, requested_profession, rng)
+    skills = draw_skills(get_plan(kin.name, profession.name), age.skill_points, rng)
+    creator = Creator(name=get_character_name(kin.name, rng),
+                      title=get_character_title(kin.name, profession.name, rng),
+                      kin=kin,
+                      profession=profession,
+                      skill=get_highest_skill(skills))
+
+    if timed:
+        metrics.observe_generator('generate_creator', time.perf_counter() - t1)
+
+    return creator
+
+
+# Allocate points over the columns of a (characters x options) matrix in vectorized steps
+# every step draws one option per character among the options still below their cap, which is the same
+# distribution as the scalar loops that remove an option once it is drawn at its cap
+def allocate_capped_points(rng, levels, weights, caps, points):
+    import numpy as np
+
+    points = points.copy()
+    while True:
+        open_options = levels < caps
+        rows = np.nonzero((points > 0) & open_options.any(axis=1))[0]
+        if len(rows) == 0:
+            return levels
+
+        cumulative_weights = np.where(open_options[rows], weights[rows], 0).cumsum(axis=1)
+        draws = rng.random(len(rows)) * cumulative_weights[:, -1]
+        picks = np.minimum((cumulative_weights <= draws[:, None]).sum(axis=1), levels.shape[1] - 1)
+        levels[rows, picks] += 1
+        points[rows] -= 1
+
+
+# Draw one weighted option index per row, weights is either a vector or a (rows x options) matrix
+def draw_weighted_indexes(rng, weights, count):
+    import numpy as np
+
+    cumulative_weights = np.cumsum(weights, axis=-1)
+    draws = rng.random(count) * cumulative_weights[..., -1]
+    if cumulative_weights.ndim == 1:
+        return np.searchsorted(cumulative_weights, draws, side='right')
+    return (cumulative_weights <= draws[:, None]).sum(axis=1)
+
+
+# Draw count names of a name space, each one a single draw just like draw_space_name
+def draw_names(rng, space, count):
+    import numpy as np
+
+    if space.size <= 0:
+        raise ValueError('the name space has no valid names')
+    ranks = rng.integers(0, space.size, size=count)
+    flats = ranks + np.searchsorted(np.array(space.offsets, dtype=np.int64), ranks, side='right')
+    indexes = np.unravel_index(flats, [len(part) for part in space.parts])
+    return [''.join(part[index] for part, index in zip(space.parts, combination)) for combination in zip(*indexes)]
+
+
+# Static weight/cap tables for the batch generator, indexed by kin, profession and age in table order
+@lru_cache(maxsize=1)
+def get_batch_tables():
+    import numpy as np
+
+    kins = list(tables.KINS.values())
+    ages = list(tables.AGES.values())
+    professions = list(tables.PROFESSIONS.values())
+    attribute_names = list(tables.ATTRIBUTES)
+    skill_names = list(tables.SKILLS.keys())
+
+    attribute_weights = np.zeros((len(kins), len(professions), len(attribute_names)))
+    attribute_caps = np.zeros((len(kins), len(professions), len(attribute_names)), dtype=int)
+    for k, kin in enumerate(kins):
+        for p, profession in enumerate(professions):
+            for a, attribute in enumerate(attribute_names):
+                matches = (kin.attribute == attribute) + (profession.attribute == attribute)
+                attribute_caps[k, p, a] = tables.ATTRIBUTE_LIMITS[matches]
+                attribute_weights[k, p, a] = (tables.ATTRIBUTE_WEIGHT if matches > 0
+                                              else tables.BASE_WEIGHT - tables.ATTRIBUTE_WEIGHT)
+
+    skill_weights = np.zeros((len(professions), len(skill_names)))
+    skill_caps = np.zeros((len(professions), len(skill_names)), dtype=int)
+    for p, profession in enumerate(professions):
+        for s, skill in enumerate(skill_names):
+            matches = int(skill in profession.skills)
+            skill_caps[p, s] = tables.SKILL_LIMITS[matches]
+            skill_weights[p, s] = tables.SKILL_WEIGHT if matches > 0 else tables.BASE_WEIGHT - tables.SKILL_WEIGHT
+
+    age_weights = np.array([[kin.age_weights.get(age.name, 0) for age in ages] for kin in kins], dtype=float)
+    profession_weights = np.array([[tables.PROFESSION_WEIGHT if profession.name in kin.professions
+                                    else tables.BASE_WEIGHT - tables.PROFESSION_WEIGHT for profession in professions]
+                                   for kin in kins], dtype=float)
+
+    return {'kins': kins, 'ages': ages, 'professions': professions, 'attribute_names': attribute_names,
+            'skill_names': skill_names, 'attribute_weights': attribute_weights, 'attribute_caps': attribute_caps,
+            'skill_weights': skill_weights, 'skill_caps': skill_caps, 'age_weights': age_weights,
+            'profession_weights': profession_weights}
+
+
+# Talent weights of a kin and profession, first for the profession talents and then for all eligible talents
+# get_talents compares Skill tuples with skill names, so skills never add matches and are left out here too
+def get_talent_weights(kin, profession):
+    def talent_weight(talent):
+        matches = (kin.name in talent.races) + (profession.name in talent.professions)
+        return tables.TALENT_WEIGHT * matches if matches > 0 else tables.BASE_WEIGHT - tables.TALENT_WEIGHT
+
+    weights = {name: talent_weight(tables.TALENTS[name]) for name in profession.talents}
+    profession_weights = dict(weights)
+    for talent in tables.TALENTS.values():
+        if talent.type == 'general':
+            weights[talent.name] = talent_weight(talent)
+    return profession_weights, weights
+
+
+@dl.consistent
+def generate_characters(n, requested_kin=None, requested_profession=None, seed=None):
+    # numpy is only needed for the batch generator, so it is imported on first use instead of with the module
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError('generate_characters requires numpy') from None
+
+    timed = metrics.enabled
+    if timed:
+        t1 = time.perf_counter()
+
+    rng = np.random.default_rng(seed)
+    batch_tables = get_batch_tables()
+    kins, ages, professions = batch_tables['kins'], batch_tables['ages'], batch_tables['professions']
+
+    # Kin, age and profession indexes for every character
+    if requested_kin:
+        kin_indexes = np.full(n, tables.KIN_CODES.codes[requested_kin])
+    else:
+        kin_indexes = rng.integers(0, len(kins), size=n)
 
-    print(f'character generated in {t2*1000} ms')
+    age_indexes = draw_weighted_indexes(rng, batch_tables['age_weights'][kin_indexes], n)
 
-    return character
\ No newline at end of file
+    if requested_profession:
+        profession_indexes = np.full(n, tables.PROFESSION_CODES.codes[requested_profession])
+    else:
+        profession_indexes = draw_weighted_indexes(rng, batch_tables['profession_weights'][kin_indexes], n)
+
+    attribute_points = np.array([age.attribute_points for age in ages])[age_indexes] + rng.integers(-1, 2, size=n)
+    skill_points = np.array([age.skill_points for age in ages])[age_indexes] + rng.integers(-1, 2, size=n)
+    talent_points = np.array([age.talent_points for age in ages])[age_indexes]
+
+    # Capped multinomial point allocation over the attribute and skill matrices
+    attribute_levels = allocate_capped_points(rng, np.full((n, len(batch_tables['attribute_names'])), 2),
+                                              batch_tables['attribute_weights'][kin_indexes, profession_indexes],
+                                              batch_tables['attribute_caps'][kin_indexes, profession_indexes],
+                                              attribute_points)
+    skill_levels = allocate_capped_points(rng, np.zeros((n, len(batch_tables['skill_names'])), dtype=int),
+                                          batch_tables['skill_weights'][profession_indexes],
+                                          batch_tables['skill_caps'][profession_indexes],
+                                          skill_points)
+
+    # Talents, names and titles are drawn per kin and profession group
+    talents = [None] * n
+    names = [None] * n
+    titles = [None] * n
+    talent_limit = tables.TALENT_LIMIT
+    group_keys = kin_indexes * len(professions) + profession_indexes
+    for group_key in np.unique(group_keys):
+        rows = np.nonzero(group_keys == group_key)[0]
+        kin = kins[group_key // len(professions)]
+        profession = professions[group_key % len(professions)]
+
+        profession_weights, weights = get_talent_weights(kin, profession)
+        talent_names = list(weights.keys())
+        talent_levels = np.zeros((len(rows), len(talent_names)), dtype=int)
+        first_talents = draw_weighted_indexes(rng, np.array(list(profession_weights.values()), dtype=float),
+                                              len(rows))
+        talent_levels[np.arange(len(rows)), first_talents] = 1
+        talent_levels = allocate_capped_points(rng, talent_levels,
+                                               np.tile(np.array(list(weights.values()), dtype=float),
+                                                       (len(rows), 1)),
+                                               np.full(talent_levels.shape, talent_limit),
+                                               talent_points[rows])
+        for row, character in enumerate(rows):
+            first_talent = talent_names[first_talents[row]]
+            character_talents = {kin.talent: 1, first_talent: talent_levels[row, first_talents[row]]}
+            for t in np.nonzero(talent_levels[row])[0]:
+                character_talents.setdefault(talent_names[t], talent_levels[row, t])
+            talents[character] = [Talent(name=key, level=int(value), type=tables.TALENTS[key].type)
+                                  for key, value in character_talents.items()]
+
+        group_names = draw_names(rng, tables.NAME_SPACES[kin.name], len(rows))
+        group_titles = draw_names(rng, tables.TITLE_SPACES[(kin.name, profession.name)], len(rows))
+        for row, character in enumerate(rows):
+            names[character] = group_names[row]
+            titles[character] = group_titles[row]
+
+    # Personalities: a trait and two different things, one liked and one disliked
+    traits = tables.PERSONALITIES.traits
+    things = tables.PERSONALITIES.things
+    trait_indexes = rng.integers(0, len(traits), size=n)
+    like_indexes = rng.integers(0, len(things), size=n)
+    dislike_indexes = rng.integers(0, len(things) - 1, size=n)
+    dislike_indexes += dislike_indexes >= like_indexes
+
+    attribute_names = batch_tables['attribute_names']
+    skill_names = batch_tables['skill_names']
+    characters = []
+    for i in range(n):
+        age = ages[age_indexes[i]]
+        characters.append(Character(
+            name=names[i],
+            title=titles[i],
+            age=age,
+            renown=age.renown,
+            kin=kins[kin_indexes[i]],
+            profession=professions[profession_indexes[i]],
+            attributes=[Attribute(name=name, level=int(level))
+                        for name, level in zip(attribute_names, attribute_levels[i])],
+            skills=[Skill(name=name, level=int(level), attribute=tables.SKILLS[name].attribute)
+                    for name, level in zip(skill_names, skill_levels[i]) if level > 0],
+            talents=talents[i],
+            personality=Personality(trait=traits[trait_indexes[i]],
+                                    like=things[like_indexes[i]],
+                                    dislike=things[dislike_indexes[i]])))
+
+    if timed:
+        metrics.observe_generator('generate_characters', time.perf_counter() - t1)
+
+    return characters
+
+
+# The plans and batch tables are compiled from the tables, so a reload of char_data.json clears them
+dl.add_caches(tables, get_plan, get_profession_sampler, get_batch_tables, wr._compile_weights)
@@ -0,0 +1,194 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+from . import benchmark
+from . import bulk
+from . import chargen
+from . import itemgen
+from . import placegen
+
+# Output is written through a large buffer, so millions of records are not millions of small writes
+WRITE_BUFFER_SIZE = 1 << 20
+
+FORMATS = ('jsonl', 'csv')
+
+# The CSV columns of every kind, nested values are written as JSON in their column
+CSV_FIELDS = {'item': itemgen.Item._fields,
+              'character': chargen.Character._fields,
+              'village': placegen.Village._fields,
+              'dungeon': placegen.Dungeon._fields,
+              'fortress': placegen.Fortress._fields,
+              'room': placegen.Room._fields,
+              'place': tuple(dict.fromkeys(placegen.Village._fields + placegen.Dungeon._fields +
+                                           placegen.Fortress._fields))}
+
+
+# Converts a generated value into plain JSON data, namedtuples become objects and sets become sorted lists
+def to_data(value):
+    if isinstance(value, tuple) and hasattr(value, '_fields'):
+        return {field: to_data(item) for field, item in zip(value._fields, value)}
+    if isinstance(value, (list, tuple)):
+        return [to_data(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(to_data(item) for item in value)
+    if isinstance(value, dict):
+        return {key: to_data(item) for key, item in value.items()}
+    return value
+
+
+def to_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class JsonlWriter:
+    def __init__(self, stream, kind):
+        self.stream = stream
+
+    def write(self, record):
+        self.stream.write(to_json(to_data(record)))
+        self.stream.write('\n')
+
+
+class CsvWriter:
+    def __init__(self, stream, kind):
+        self.writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS[kind], restval='')
+        self.writer.writeheader()
+
+    def write(self, record):
+        row = {}
+        for field, value in to_data(record).items():
+            row[field] = to_json(value) if isinstance(value, (dict, list)) else value
+        self.writer.writerow(row)
+
+
+WRITERS = {'jsonl': JsonlWriter, 'csv': CsvWriter}
+
+
+# Opens the output file, or standard output for '-', as a text stream with a large write buffer
+def open_output(path):
+    if path == '-':
+        raw = open(sys.stdout.fileno(), 'wb', closefd=False)
+    else:
+        raw = open(path, 'wb')
+    return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size=WRITE_BUFFER_SIZE), encoding='utf-8', newline='')
+
+
+# The positional and keyword arguments of the generator of a kind
+def get_generator_arguments(args):
+    if args.kind == 'item':
+        return [args.item_types], {'item_value': args.item_value, 'max_weight': args.max_weight}
+    if args.kind == 'character':
+        return [], {'requested_kin': args.kin, 'requested_profession': args.profession}
+    return [], {}
+
+
+def generate(args):
+    generator_args, generator_kwargs = get_generator_arguments(args)
+    records = bulk.generate(args.kind, args.count, *generator_args, master_seed=args.seed, workers=args.workers,
+                            shard_size=args.shard_size, ordered=not args.unordered, **generator_kwargs)
+
+    start = time.perf_counter()
+    written = 0
+    output = open_output(args.output)
+    try:
+        writer = WRITERS[args.format](output, args.kind)
+        for record in records:
+            writer.write(record)
+            written += 1
+    finally:
+        output.flush()
+        if args.output == '-':
+            output.detach()
+        else:
+            output.close()
+    seconds = time.perf_counter() - start
+
+    if not args.quiet:
+        rate = written / seconds if seconds > 0 else float('inf')
+        print(f'{written} {args.kind} records in {seconds:.2f} s, {rate:.0f} records/s', file=sys.stderr)
+
+
+def run_benchmarks(args):
+    def report(name, result):
+        if not args.quiet:
+            print(benchmark.format_result(name, result), file=sys.stderr)
+
+    results = benchmark.run(selected=args.only, iterations=args.iterations, memory_iterations=args.memory_iterations,
+                            seed=args.seed, import_runs=args.import_runs, report=report)
+    if args.save:
+        benchmark.save(results, args.save)
+    if args.compare:
+        comparisons = benchmark.compare(benchmark.load(args.compare), results, args.threshold)
+        for comparison in comparisons:
+            print(benchmark.format_comparison(comparison))
+        regressions = sum(comparison.regression for comparison in comparisons)
+        if regressions:
+            print(f'{regressions} measurements regressed by more than {args.threshold:.0%}')
+            return 1
+    return 0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog=f'python -m {__package__}',
+                                     description='Generate content for Svärdets Sång')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help='stream generated records as JSON lines or CSV')
+    generate_parser.add_argument('--kind', required=True, choices=list(bulk.GENERATORS))
+    generate_parser.add_argument('--count', type=int, default=1)
+    generate_parser.add_argument('--seed', type=int, default=None,
+                                 help='master seed, the same seed gives the same records for any number of workers')
+    generate_parser.add_argument('--format', choices=FORMATS, default='jsonl')
+    generate_parser.add_argument('--output', default='-', help='output file, standard output by default')
+    generate_parser.add_argument('--workers', type=int, default=1,
+                                 help=f'worker processes, up to {os.cpu_count()} on this machine')
+    generate_parser.add_argument('--shard-size', type=int, default=bulk.DEFAULT_SHARD_SIZE)
+    generate_parser.add_argument('--unordered', action='store_true',
+                                 help='write the shards as soon as they are done instead of in order')
+    generate_parser.add_argument('--quiet', action='store_true', help='do not report the records per second')
+
+    item_options = generate_parser.add_argument_group('item options')
+    item_options.add_argument('--item-types', nargs='+', default=['any'])
+    item_options.add_argument('--item-value', choices=list(itemgen.TIER_WEIGHTS), default='cheap')
+    item_options.add_argument('--max-weight', type=float, default=100)
+
+    character_options = generate_parser.add_argument_group('character options')
+    character_options.add_argument('--kin', default=None)
+    character_options.add_argument('--profession', default=None)
+
+    generate_parser.set_defaults(run=generate)
+
+    benchmark_parser = commands.add_parser('benchmark', help='benchmark the generators on fixed seeds')
+    benchmark_parser.add_argument('--only', nargs='+', default=None,
+                                  help='only run the benchmarks whose names contain one of these')
+    benchmark_parser.add_argument('--iterations', type=int, default=benchmark.DEFAULT_ITERATIONS)
+    benchmark_parser.add_argument('--memory-iterations', type=int, default=benchmark.DEFAULT_MEMORY_ITERATIONS)
+    benchmark_parser.add_argument('--import-runs', type=int, default=benchmark.DEFAULT_IMPORT_RUNS,
+                                  help='fresh interpreters to time the import and startup in, 0 to skip')
+    benchmark_parser.add_argument('--seed', type=int, default=benchmark.DEFAULT_SEED)
+    benchmark_parser.add_argument('--save', default=None, help='write the results to a baseline file')
+    benchmark_parser.add_argument('--compare', default=None,
+                                  help='compare the results with a baseline file and fail on regressions')
+    benchmark_parser.add_argument('--threshold', type=float, default=benchmark.DEFAULT_THRESHOLD,
+                                  help='the relative change for the worse that counts as a regression')
+    benchmark_parser.add_argument('--quiet', action='store_true', help='do not print the results as they come in')
+    benchmark_parser.set_defaults(run=run_benchmarks)
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'count', 0) < 0:
+        parser.error('--count must not be negative')
+    try:
+        return args.run(args) or 0
+    except BrokenPipeError:
+        # The reader went away, e.g. piped into head, which is not an error
+        sys.stderr.close()
+        return 0
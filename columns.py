@@ -0,0 +1,258 @@
+from array import array
+
+from . import chargen
+from . import itemgen
+from . import records
+
+# Columnar batches of items and characters, for bulk results that would not fit in memory as namedtuples
+# repeated strings are stored once in a vocabulary and coded as integers, values in copper and carry weights
+# as numbers, and the display strings are only built when a record is read back
+
+# The bonus or damage of an item without one, they are never negative otherwise
+NO_NUMBER = -1
+
+
+# The value of a coded field of an item, attributes are coded as a tuple
+def get_coded_value(item, field):
+    value = getattr(item, field)
+    if field == 'attributes' and value is not None:
+        value = tuple(value)
+    return value
+
+
+# Interned values coded as integers in the order they were first seen, None included
+class Vocabulary:
+    __slots__ = ('values', 'codes')
+
+    def __init__(self, values=()):
+        self.values = []
+        self.codes = {}
+        for value in values:
+            self.code(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ItemColumns:
+    # The item fields coded against a vocabulary, attributes are coded as whole tuples since they repeat as well
+    CODED_FIELDS = ('name', 'category', 'type', 'grip', 'rarity', 'range', 'attributes')
+
+    def __init__(self, items=()):
+        self.vocabularies = {field: Vocabulary() for field in self.CODED_FIELDS}
+        self.codes = {field: array('I') for field in self.CODED_FIELDS}
+        self.bonuses = array('h')
+        self.damages = array('h')
+        self.values = array('q')
+        self.weights = array('d')
+        # The myth, perk and drawback of the artifacts by row, every other item has none
+        self.artifacts = {}
+        self.extend(items)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        attributes = self.get('attributes', row)
+        myth, perk, drawback = self.artifacts.get(row, (None, None, None))
+        return itemgen.Item(name=self.get('name', row),
+                            category=self.get('category', row),
+                            type=self.get('type', row),
+                            grip=self.get('grip', row),
+                            rarity=self.get('rarity', row),
+                            bonus=self.bonuses[row] if self.bonuses[row] != NO_NUMBER else None,
+                            damage=self.damages[row] if self.damages[row] != NO_NUMBER else None,
+                            range=self.get('range', row),
+                            value=itemgen.format_value(self.values[row]),
+                            weight=itemgen.format_weight(self.weights[row]),
+                            attributes=list(attributes) if attributes is not None else None,
+                            myth=myth,
+                            perk=perk,
+                            drawback=drawback)
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    # The value of a coded field of a row
+    def get(self, field, row):
+        return self.vocabularies[field][self.codes[field][row]]
+
+    def append(self, item):
+        row = len(self)
+        for field in self.CODED_FIELDS:
+            self.codes[field].append(self.vocabularies[field].code(get_coded_value(item, field)))
+        self.bonuses.append(item.bonus if item.bonus is not None else NO_NUMBER)
+        self.damages.append(item.damage if item.damage is not None else NO_NUMBER)
+        self.values.append(itemgen.parse_value(item.value))
+        self.weights.append(itemgen.parse_weight(item.weight))
+        if item.myth or item.perk or item.drawback:
+            self.artifacts[row] = (item.myth, item.perk, item.drawback)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    # Appends a row for every position in rows, a copy of templates[position] with its own value in copper,
+    # e.g. from itemgen.generate_loot, rows and values are numpy arrays of the same length
+    # a template is coded once however many rows share it
+    def extend_rows(self, templates, rows, values):
+        import numpy as np
+
+        start = len(self)
+        for field in self.CODED_FIELDS:
+            vocabulary = self.vocabularies[field]
+            codes = np.array([vocabulary.code(get_coded_value(template, field)) for template in templates],
+                             dtype=np.uint32)
+            self.codes[field].frombytes(codes[rows].astype(self.codes[field].typecode).tobytes())
+        for column, numbers in ((self.bonuses, [template.bonus for template in templates]),
+                                (self.damages, [template.damage for template in templates]),
+                                (self.weights, [itemgen.parse_weight(template.weight) for template in templates])):
+            numbers = np.array([number if number is not None else NO_NUMBER for number in numbers],
+                               dtype=column.typecode)
+            column.frombytes(numbers[rows].tobytes())
+        self.values.frombytes(np.asarray(values, dtype=self.values.typecode).tobytes())
+
+        texts = {position: (template.myth, template.perk, template.drawback)
+                 for position, template in enumerate(templates)
+                 if template.myth or template.perk or template.drawback}
+        if texts:
+            for row in np.nonzero(np.isin(rows, list(texts)))[0].tolist():
+                self.artifacts[start + row] = texts[int(rows[row])]
+
+    # Every row as an Item, the same as list(self) but with every distinct value and weight formatted only once
+    def to_items(self):
+        with records.allocating():
+            return self.build_items()
+
+    def build_items(self):
+        fields = {field: list(map(self.vocabularies[field].values.__getitem__, self.codes[field]))
+                  for field in self.CODED_FIELDS}
+        money = {value: itemgen.format_value(value) for value in set(self.values)}
+        weights = {weight: itemgen.format_weight(weight) for weight in set(self.weights)}
+        myths = [None] * len(self)
+        perks = [None] * len(self)
+        drawbacks = [None] * len(self)
+        for row, (myth, perk, drawback) in self.artifacts.items():
+            myths[row], perks[row], drawbacks[row] = myth, perk, drawback
+        rows = zip(fields['name'],
+                   fields['category'],
+                   fields['type'],
+                   fields['grip'],
+                   fields['rarity'],
+                   [bonus if bonus != NO_NUMBER else None for bonus in self.bonuses],
+                   [damage if damage != NO_NUMBER else None for damage in self.damages],
+                   fields['range'],
+                   map(money.__getitem__, self.values),
+                   map(weights.__getitem__, self.weights),
+                   [list(attributes) if attributes is not None else None for attributes in fields['attributes']],
+                   myths,
+                   perks,
+                   drawbacks)
+        return list(map(itemgen.Item._make, rows))
+
+
+class CharacterColumns:
+    CODED_FIELDS = ('name', 'title', 'trait', 'like', 'dislike')
+
+    def __init__(self, characters=()):
+        tables = chargen.tables
+        self.attribute_names = tables.ATTRIBUTES
+        self.skill_names = tuple(tables.SKILLS)
+        self.skill_codes = {name: code for code, name in enumerate(self.skill_names)}
+
+        self.vocabularies = {field: Vocabulary() for field in self.CODED_FIELDS}
+        self.codes = {field: array('I') for field in self.CODED_FIELDS}
+        self.kins = array('B')
+        self.ages = array('B')
+        self.professions = array('B')
+        # Attribute and skill levels, a row of len(attribute_names) and len(skill_names) levels per character,
+        # a skill of level 0 is one the character does not have
+        self.attributes = array('B')
+        self.skills = array('B')
+        # The talents of character i are talent_codes[talent_offsets[i]:talent_offsets[i + 1]], in drawing order
+        self.talents = Vocabulary()
+        self.talent_codes = array('H')
+        self.talent_levels = array('B')
+        self.talent_offsets = array('I', [0])
+        self.extend(characters)
+
+    def __len__(self):
+        return len(self.kins)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        tables = chargen.tables
+        age = tables.AGES[tables.AGE_CODES.names[self.ages[row]]]
+        attributes = self.attributes[row * len(self.attribute_names):(row + 1) * len(self.attribute_names)]
+        skills = self.skills[row * len(self.skill_names):(row + 1) * len(self.skill_names)]
+        talents = range(self.talent_offsets[row], self.talent_offsets[row + 1])
+        return chargen.Character(
+            name=self.get('name', row),
+            title=self.get('title', row),
+            kin=tables.KINS[tables.KIN_CODES.names[self.kins[row]]],
+            profession=tables.PROFESSIONS[tables.PROFESSION_CODES.names[self.professions[row]]],
+            attributes=[chargen.Attribute(name=name, level=level)
+                        for name, level in zip(self.attribute_names, attributes)],
+            skills=[chargen.Skill(name=name, attribute=tables.SKILLS[name].attribute, level=level)
+                    for name, level in zip(self.skill_names, skills) if level > 0],
+            talents=[chargen.Talent(name=self.talents[self.talent_codes[talent]],
+                                    type=tables.TALENTS[self.talents[self.talent_codes[talent]]].type,
+                                    level=self.talent_levels[talent])
+                     for talent in talents],
+            personality=chargen.Personality(trait=self.get('trait', row), like=self.get('like', row),
+                                            dislike=self.get('dislike', row)),
+            age=age,
+            renown=age.renown)
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def get(self, field, row):
+        return self.vocabularies[field][self.codes[field][row]]
+
+    def append(self, character):
+        tables = chargen.tables
+        for field in ('name', 'title'):
+            self.codes[field].append(self.vocabularies[field].code(getattr(character, field)))
+        for field in ('trait', 'like', 'dislike'):
+            self.codes[field].append(self.vocabularies[field].code(getattr(character.personality, field)))
+        self.kins.append(tables.KIN_CODES.codes[character.kin.name])
+        self.ages.append(tables.AGE_CODES.codes[character.age.name])
+        self.professions.append(tables.PROFESSION_CODES.codes[character.profession.name])
+
+        levels = dict.fromkeys(self.attribute_names, 0)
+        levels.update((attribute.name, attribute.level) for attribute in character.attributes)
+        self.attributes.extend(levels.values())
+        levels = [0] * len(self.skill_names)
+        for skill in character.skills:
+            levels[self.skill_codes[skill.name]] = skill.level
+        self.skills.extend(levels)
+
+        for talent in character.talents:
+            self.talent_codes.append(self.talents.code(talent.name))
+            self.talent_levels.append(talent.level)
+        self.talent_offsets.append(len(self.talent_codes))
+
+    def extend(self, characters):
+        for character in characters:
+            self.append(character)
+
+    def to_characters(self):
+        return list(self)
+
+
+# The columnar batch of every kind that has one
+COLUMNS = {'item': ItemColumns, 'character': CharacterColumns}
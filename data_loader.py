@@ -1,10 +1,335 @@
-import json
+import functools
+import hashlib
 import os
+import pickle
+import sys
+import threading
+import time
 
 base_folder = os.path.dirname(__file__)
 
+# Derived tables are cached on disk in snapshots, keyed by the hashes of the JSON sources and of the package's code,
+# so a warm start unpickles the tables instead of parsing JSON and building them again
+# bump SNAPSHOT_VERSION when the snapshot layout itself changes
+SNAPSHOT_VERSION = 1
+snapshot_folder = os.path.join(base_folder, '__pycache__', 'snapshots')
+use_snapshots = True
 
+lock = threading.RLock()
+sources = {}
+registry = {}
+# The modification time and hash of every source as it was last read, to tell which ones changed since
+source_states = {}
+# The modification time and hash of the changed sources a reload last failed on, so a broken source is reported once
+# and only tried again once it (or another source) changes again
+failed_states = {}
+
+
+def get_source_path(filename):
+    return os.path.join(base_folder, 'sources', filename)
+
+
+# Returns the parsed contents, the modification time and the hash of a JSON file in the sources folder
+def read_source(filename):
+    # json (and the re module it pulls in) is only imported when a source is actually parsed,
+    # a warm start that loads every table from its snapshot never needs it
+    import json
+
+    path = get_source_path(filename)
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, 'rb') as f:
+        contents = f.read()
+    return json.loads(contents.decode('utf-8')), mtime, hashlib.sha256(contents).hexdigest()
+
+
+# Returns the parsed contents of a JSON file in the sources folder
+# every file is parsed at most once and shared by all generators
 def init_data(filename):
-    with open(os.path.join(base_folder, 'sources', filename), encoding='utf-8') as f:
-        data = json.load(f)
-        return data
+    with lock:
+        if filename not in sources:
+            sources[filename], mtime, digest = read_source(filename)
+            source_states[filename] = (mtime, digest)
+        return sources[filename]
+
+
+def get_file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def get_source_hash(filename):
+    path = get_source_path(filename)
+    mtime = os.stat(path).st_mtime_ns
+    digest = get_file_hash(path)
+    with lock:
+        source_states.setdefault(filename, (mtime, digest))
+    return digest
+
+
+# The static tables of a generator module, built from one or more JSON sources on first use
+# the tables are read as attributes, e.g. tables.KINS, and only then loaded from a snapshot or built
+class Tables:
+    __slots__ = ('_name', '_build', '_filenames', '_caches', '__dict__')
+
+    def __init__(self, name, build, filenames):
+        self._name = name
+        self._build = build
+        self._filenames = filenames
+        self._caches = []
+
+    def __getattr__(self, attribute):
+        if attribute.startswith('__'):
+            raise AttributeError(attribute)
+        self.load()
+        try:
+            return self.__dict__[attribute]
+        except KeyError:
+            raise AttributeError(f'{self._name} has no table {attribute!r}') from None
+
+    @property
+    def loaded(self):
+        return bool(self.__dict__)
+
+    def load(self):
+        with lock:
+            if not self.__dict__:
+                self.__dict__.update(load_tables(self._name, self._build, self._filenames))
+
+
+# Registers the tables a module builds from its sources and returns them, still unloaded
+# build is called with the parsed sources in the order of filenames and returns a dictionary of tables
+def register(name, build, *filenames):
+    with lock:
+        registry[name] = Tables(name, build, filenames)
+        return registry[name]
+
+
+# Registers lru_cache functions that derive from the tables, they are cleared whenever the tables are reloaded
+def add_caches(tables, *functions):
+    tables._caches.extend(functions)
+
+
+# Loads every registered table, e.g. before forking worker processes
+def load_all():
+    for tables in list(registry.values()):
+        tables.load()
+
+
+# The hash of every module of the package, the tables are built by the helpers of other modules as well
+# (records, weighted_random...) so a change to any of them invalidates the snapshots, the code does not change
+# while the process runs so it is hashed only once
+@functools.lru_cache(maxsize=None)
+def get_code_hash():
+    code = hashlib.sha256()
+    for filename in sorted(os.listdir(base_folder)):
+        if filename.endswith('.py'):
+            code.update(filename.encode('utf-8'))
+            code.update(get_file_hash(os.path.join(base_folder, filename)).encode('ascii'))
+    return code.hexdigest()
+
+
+def get_snapshot_key(build, filenames):
+    return {'version': SNAPSHOT_VERSION,
+            'module': build.__module__,
+            'code': get_code_hash(),
+            'sources': {filename: get_source_hash(filename) for filename in filenames}}
+
+
+def get_snapshot_path(name):
+    return os.path.join(snapshot_folder, f'{name}.pickle')
+
+
+def read_snapshot(name, key):
+    try:
+        with open(get_snapshot_path(name), 'rb') as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('key') != key:
+        return None
+    return snapshot.get('tables')
+
+
+# Writes a snapshot next to its destination and renames it, so a concurrent reader never sees a partial file
+# a read-only install simply goes without snapshots
+def write_snapshot(name, key, tables):
+    path = get_snapshot_path(name)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(snapshot_folder, exist_ok=True)
+        with open(temporary_path, 'wb') as f:
+            pickle.dump({'key': key, 'tables': tables}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+    except (OSError, pickle.PicklingError):
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+def load_tables(name, build, filenames):
+    key = get_snapshot_key(build, filenames) if use_snapshots else None
+    if key is not None:
+        tables = read_snapshot(name, key)
+        if tables is not None:
+            return tables
+
+    tables = build(*[init_data(filename) for filename in filenames])
+    if key is not None:
+        write_snapshot(name, key, tables)
+    return tables
+
+
+# Requests in flight and the reloads waiting to swap in new tables
+# a generator decorated with consistent runs entirely on either the old or the new tables: a reload waits for the
+# requests in flight to finish before it swaps, and new requests wait for the swap, which only assigns the tables
+# that were already built and clears the caches derived from them
+# requests mark themselves in a set of thread idents (adding and discarding are atomic), which is far cheaper for
+# every call than a lock, while the rare swap polls for the requests in flight to finish
+active = set()
+swapping = False
+swapped = threading.Event()
+swapped.set()
+reload_lock = threading.Lock()
+SWAP_POLL_SECONDS = 0.0005
+
+
+def consistent(generator):
+    @functools.wraps(generator)
+    def wrapper(*args, **kwargs):
+        ident = threading.get_ident()
+        # Generators calling each other, e.g. generate_item an artifact's generate_creator, are one request
+        if ident in active:
+            return generator(*args, **kwargs)
+        while True:
+            while swapping:
+                swapped.wait()
+            active.add(ident)
+            # A swap that started after the check waits for this request, so back off and let it go first
+            if not swapping:
+                break
+            active.discard(ident)
+        try:
+            return generator(*args, **kwargs)
+        finally:
+            active.discard(ident)
+    return wrapper
+
+
+def swap(apply):
+    global swapping
+    swapped.clear()
+    swapping = True
+    try:
+        while active:
+            time.sleep(SWAP_POLL_SECONDS)
+        apply()
+    finally:
+        swapping = False
+        swapped.set()
+
+
+# Returns the modification time and hash of the sources that changed since they were read, by modification time
+# and then by hash, so touching a file without changing it does not reload anything
+# a source that failed to reload and was not modified since is not hashed again
+def get_changed_sources():
+    changed = {}
+    with lock:
+        states = dict(source_states)
+        failed = dict(failed_states)
+    for filename, (mtime, digest) in states.items():
+        try:
+            new_mtime = os.stat(get_source_path(filename)).st_mtime_ns
+            if new_mtime == mtime:
+                continue
+            if filename in failed and failed[filename][0] == new_mtime:
+                changed[filename] = failed[filename]
+                continue
+            new_digest = get_file_hash(get_source_path(filename))
+        except OSError:
+            continue
+        if new_digest != digest:
+            changed[filename] = (new_mtime, new_digest)
+        else:
+            with lock:
+                source_states[filename] = (new_mtime, digest)
+                failed_states.pop(filename, None)
+    return changed
+
+
+# Reloads the changed sources, or the given ones, and returns their names
+# only the changed files are parsed again and only the loaded tables built from them are rebuilt, all of it before
+# anything is swapped in, so a source that fails to parse or validate leaves the old tables in place
+# the changed sources that failed are not reloaded again until one of them changes, and nothing is returned for them
+# the swap waits for the requests in flight, so it can not be called from inside a consistent generator
+def reload(filenames=None):
+    if threading.get_ident() in active:
+        raise RuntimeError('reload() can not be called from inside a consistent generator, '
+                           'the swap would wait for the request calling it')
+    with reload_lock:
+        with lock:
+            if filenames is None:
+                states = get_changed_sources()
+                if all(failed_states.get(filename) == state for filename, state in states.items()):
+                    return []
+                changed = list(states)
+            else:
+                changed = list(filenames)
+            if not changed:
+                return []
+
+            try:
+                parsed = {filename: read_source(filename) for filename in changed}
+                rebuilt = {}
+                for name, tables in registry.items():
+                    if not tables.loaded or not set(tables._filenames) & set(changed):
+                        continue
+                    data = [parsed[filename][0] if filename in parsed else init_data(filename)
+                            for filename in tables._filenames]
+                    rebuilt[name] = tables._build(*data)
+            except Exception:
+                if filenames is None:
+                    failed_states.update(states)
+                raise
+
+        # The swap takes the lock only once no request is in flight, since a request may need it to load tables
+        def apply():
+            with lock:
+                for filename, (data, mtime, digest) in parsed.items():
+                    sources[filename] = data
+                    source_states[filename] = (mtime, digest)
+                    failed_states.pop(filename, None)
+                for name, tables in registry.items():
+                    if name in rebuilt:
+                        tables.__dict__ = rebuilt[name]
+                    elif set(tables._filenames) & set(changed):
+                        # Loaded while the others were rebuilt, from the old sources, so it is loaded again on use
+                        tables.__dict__ = {}
+                    else:
+                        continue
+                    for function in tables._caches:
+                        function.cache_clear()
+
+        swap(apply)
+
+        if use_snapshots:
+            for name, new_tables in rebuilt.items():
+                tables = registry[name]
+                write_snapshot(name, get_snapshot_key(tables._build, tables._filenames), new_tables)
+        return changed
+
+
+# Reloads the changed sources every interval seconds in a background thread, until the returned event is set
+# a source that fails to load is reported on standard error once and the old tables are kept until it changes again
+def watch(interval=1.0):
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                reload()
+            except Exception as error:
+                print(f'could not reload the sources: {error}', file=sys.stderr)
+
+    threading.Thread(target=run, name='source-watcher', daemon=True).start()
+    return stop
@@ -1,15 +1,17 @@
+import bisect
 import math
 import random
 import time
 from collections import namedtuple
+from functools import lru_cache
+from itertools import repeat
 
 from . import data_loader
+from . import metrics
+from . import records
 from . import weighted_random
 from . import chargen
 
-item_data = data_loader.init_data('item_data.json')
-char_data = data_loader.init_data('char_data.json')
-
 Weapon = namedtuple('Weapon', 'name type grip rarity bonus damage range value weight attributes myth perk drawback')
 Armor = namedtuple('Armor', 'name type rarity bonus value weight attributes myth perk drawback')
 Treasure = namedtuple('Treasure', 'name type rarity value weight')
@@ -21,26 +23,17 @@ Tier = namedtuple('Tier', ['descriptions', 'description_at_end', 'rarity', 'bonu
                            'name_endings', 'creator_named_item', 'skill_type', 'value_modifier'])
 Skill = namedtuple('Skill', 'name type')
 
-SKILLS = [Skill(name=s.get('name'), type=s.get('attribute')) for s in char_data['skills']]
-
-ITEM_NAMES = item_data['item_names']
+# An item from item_data.json as generate_item draws it, category is one of CATEGORIES
+BaseItem = namedtuple('BaseItem', 'name indefinite category type properties locations grip bonus damage range '
+                                  'value_in_copper carry_weight attributes ignore_tier')
 
-CURRENCIES = {denomination: currency for denomination, currency in item_data['money'].items()}
-ITEM_WEIGHTS = item_data['carry_weights']
+# Extra artifact name endings for items with one of the required properties
+ItemName = namedtuple('ItemName', 'required_properties name_endings')
 
-WEAPONS = [weapon for weapon in item_data['equipment']['weapons']]
-TOOLS = [tool for tool in item_data['equipment']['tools']]
-ARMOR_LISTS = {armor_type: armor_list for armor_type, armor_list in item_data['equipment']['armors'].items()}
-ARMORS = []
-for armor_list in ARMOR_LISTS.values():
-    for armor in armor_list:
-        ARMORS.append(armor)
+Currency = namedtuple('Currency', 'name copper_value')
 
-TREASURE_LISTS = {treasure_type: treasure for treasure_type, treasure in item_data['items'].items()}
-TREASURES = []
-for treasure_list in TREASURE_LISTS.values():
-    for treasure in treasure_list:
-        TREASURES.append(treasure)
+# The currency names and copper values get_total_value formats with
+Money = namedtuple('Money', 'gold silver copper worthless gold_value silver_value')
 
 CHEAP_COPPER_LIMIT = 100
 VALUABLE_COPPER_LIMIT = 400
@@ -52,89 +45,351 @@ ARTIFACT_TIER_WEIGHTS = {'epic': 1}
 TIER_WEIGHTS = {'cheap': CHEAP_TIER_WEIGHTS, 'valuable': VALUABLE_TIER_WEIGHTS, 'precious': PRECIOUS_TIER_WEIGHTS,
                 'artifact': ARTIFACT_TIER_WEIGHTS}
 
-CHEAP_ITEMS = {
-    'treasure': [treasure for treasure in TREASURES if treasure.get('value_in_copper') < CHEAP_COPPER_LIMIT],
-    'armor': [armor for armor in ARMORS if armor.get('value_in_copper') < CHEAP_COPPER_LIMIT],
-    'weapon': [weapon for weapon in WEAPONS if weapon.get('value_in_copper') < CHEAP_COPPER_LIMIT],
-    'tool': [tool for tool in TOOLS if tool.get('value_in_copper') < CHEAP_COPPER_LIMIT]}
-
-VALUABLE_ITEMS = {
-    'treasure': [treasure for treasure in TREASURES if treasure.get('value_in_copper') < VALUABLE_COPPER_LIMIT],
-    'armor': [armor for armor in ARMORS if armor.get('value_in_copper') < VALUABLE_COPPER_LIMIT],
-    'weapon': [weapon for weapon in WEAPONS if weapon.get('value_in_copper') < VALUABLE_COPPER_LIMIT],
-    'tool': [tool for tool in TOOLS if tool.get('value_in_copper') < VALUABLE_COPPER_LIMIT]}
-
-PRECIOUS_ITEMS = {
-    'treasure': [treasure for treasure in TREASURES if not treasure.get('ignore_tier')],
-    'armor': [armor for armor in ARMORS if not armor.get('ignore_tier')],
-    'weapon': [weapon for weapon in WEAPONS if not weapon.get('ignore_tier')],
-    'tool': [tool for tool in TOOLS if not tool.get('ignore_tier')]}
-
-ITEM_VALUES = {'cheap': CHEAP_ITEMS, 'valuable': VALUABLE_ITEMS, 'precious': PRECIOUS_ITEMS, 'artifact': PRECIOUS_ITEMS}
-
-TIERS = {tier: [Tier(
-    descriptions=subtier.get('descriptions'),
-    description_at_end=subtier.get('description_at_end'),
-    rarity=tier,
-    bonus_modifier=subtier.get('bonus_modifier'),
-    damage_modifier=subtier.get('damage_modifier'),
-    value_multiplier=subtier.get('value_multiplier'),
-    required_properties=subtier.get('required_properties'),
-    required_attributes=subtier.get('required_attributes'),
-    added_attributes=subtier.get('added_attributes'),
-    weight_multiplier=subtier.get('weight_multiplier'),
-    armor_modifier=subtier.get('armor_modifier'),
-    removed_attributes=subtier.get('removed_attributes'),
-    creator_race=subtier.get('creator_race'),
-    creator_profession=subtier.get('creator_profession'),
-    myth=subtier.get('myth'),
-    perk=subtier.get('perk'),
-    drawback=subtier.get('drawback'),
-    name_beginnings=subtier.get('name_beginnings'),
-    name_endings=subtier.get('name_endings'),
-    creator_named_item=subtier.get('creator_named_item'),
-    skill_type=subtier.get('skill_type'),
-    is_artifact=subtier.get('is_artifact'),
-    value_modifier=subtier.get('value_modifier'))
-    for subtier in item_data['item_tiers'][tier]] for tier in item_data['item_tiers']}
-
-
-def generate_item(item_types, item_value='cheap', max_weight=100):
-    t1 = time.time()
-
-    print(f'requested item of type {item_types}')
-    item_type = random.choice(item_types)
-    print(list(ITEM_VALUES.get(item_value).keys()))
-    if item_type.lower() not in list(ITEM_VALUES.get(item_value).keys()):
-        item_type = random.choice(list(ITEM_VALUES.get(item_value).keys()))
+# Integer codes of the item categories and value classes, in table order
+CATEGORIES = records.enumeration(('treasure', 'armor', 'weapon', 'tool'))
+ITEM_VALUE_CLASSES = records.enumeration(TIER_WEIGHTS)
+
+# The shape of item_data.json, checked once when the tables are built
+ITEM_SCHEMA = {'name': str, 'indefinite': str, 'type': str, 'properties': records.STRINGS,
+               'locations': records.OptionalField(records.STRINGS), 'grip': records.OptionalField(str),
+               'bonus': records.OptionalField(int), 'damage': records.OptionalField(int),
+               'range': records.OptionalField(str), 'value_in_copper': int, 'carry_weight': records.NUMBER,
+               'attributes': records.OptionalField(records.STRINGS), 'ignore_tier': records.OptionalField(bool)}
+OPTIONAL_STRINGS = records.OptionalField(records.STRINGS)
+TIER_SCHEMA = {'descriptions': records.OptionalField(records.DictOf(str)),
+               'description_at_end': records.OptionalField(bool),
+               'bonus_modifier': records.OptionalField(int), 'damage_modifier': records.OptionalField(int),
+               'armor_modifier': records.OptionalField(int), 'value_modifier': records.OptionalField(int),
+               'value_multiplier': records.OptionalField(records.NUMBER),
+               'weight_multiplier': records.OptionalField(records.NUMBER),
+               'required_properties': OPTIONAL_STRINGS, 'required_attributes': OPTIONAL_STRINGS,
+               'added_attributes': OPTIONAL_STRINGS, 'removed_attributes': OPTIONAL_STRINGS,
+               'creator_race': records.OptionalField(str), 'creator_profession': records.OptionalField(str),
+               'is_artifact': records.OptionalField(bool), 'creator_named_item': records.OptionalField(bool),
+               'myth': records.OptionalField(str), 'perk': records.OptionalField(str),
+               'drawback': records.OptionalField(str), 'name_beginnings': OPTIONAL_STRINGS,
+               'name_endings': OPTIONAL_STRINGS}
+ITEM_DATA_SCHEMA = {
+    'money': {'copper': {'name': str, 'copper_value': int}, 'silver': {'name': str, 'copper_value': int},
+              'gold': {'name': str, 'copper_value': int}, 'worthless': {'name': str}},
+    'carry_weights': records.DictOf(str),
+    'determiners': records.DictOf(str),
+    'items': records.DictOf(records.ListOf(ITEM_SCHEMA)),
+    'equipment': {'weapons': records.ListOf(ITEM_SCHEMA), 'tools': records.ListOf(ITEM_SCHEMA),
+                  'armors': records.DictOf(records.ListOf(ITEM_SCHEMA))},
+    'item_tiers': records.DictOf(records.ListOf(TIER_SCHEMA)),
+    'item_names': records.ListOf({'required_properties': records.STRINGS, 'name_endings': records.STRINGS}),
+    'creator_origins': records.STRINGS}
+
+# The items of a value class and category sorted by carry weight
+# the items weighing at most max_weight are a prefix, its length is one bisect over carry_weights
+ItemIndex = namedtuple('ItemIndex', 'items carry_weights')
+
+# The categories of a value class that have an item weighing at most a max weight
+# categories[i] are the feasible categories for max weights from min_weights[i] up to min_weights[i + 1]
+CategoryIndex = namedtuple('CategoryIndex', 'min_weights categories')
+
+
+def index_items(items):
+    items = sorted(items, key=lambda item: item.carry_weight)
+    return ItemIndex(items=items, carry_weights=[item.carry_weight for item in items])
+
+
+def index_categories(item_index):
+    min_weights = sorted({index.carry_weights[0] for index in item_index.values() if index.items})
+    categories = [tuple(category for category, index in item_index.items()
+                        if index.items and index.carry_weights[0] <= min_weight) for min_weight in min_weights]
+    return CategoryIndex(min_weights=min_weights, categories=categories)
+
+
+# Return the item records of a category, with their properties as a frozenset and their attributes as a tuple
+def parse_items(item_data, category):
+    return [records.make_record(BaseItem, item,
+                                category=records.intern_value(category),
+                                properties=records.interned_set(item.get('properties')),
+                                locations=records.interned_tuple(item.get('locations')),
+                                attributes=(records.interned_tuple(item.get('attributes'))
+                                            if item.get('attributes') is not None else None),
+                                ignore_tier=bool(item.get('ignore_tier')))
+            for item in item_data]
+
+
+# Return a tier record, with its property and attribute lists as frozensets and its name parts as tuples
+def parse_tier(rarity, subtier):
+    descriptions = subtier.get('descriptions')
+    if descriptions:
+        descriptions = {records.intern_value(indefinite): records.intern_value(description)
+                        for indefinite, description in descriptions.items()}
+    return records.make_record(Tier, subtier,
+                               rarity=records.intern_value(rarity),
+                               descriptions=descriptions,
+                               required_properties=records.interned_set(subtier.get('required_properties')),
+                               required_attributes=records.interned_set(subtier.get('required_attributes')),
+                               added_attributes=records.interned_set(subtier.get('added_attributes')),
+                               removed_attributes=records.interned_set(subtier.get('removed_attributes')),
+                               name_beginnings=records.interned_tuple(subtier.get('name_beginnings')),
+                               name_endings=records.interned_tuple(subtier.get('name_endings')))
+
+
+def parse_tiers(item_data):
+    return {tier: [parse_tier(tier, subtier) for subtier in item_data['item_tiers'][tier]]
+            for tier in item_data['item_tiers']}
+
+
+# Index the tiers of every rarity by their required properties
+# {'rare': {'metall': [0, 4], ...}}, tiers without required properties fit any item and are kept separately
+def index_tiers(tiers):
+    index = {}
+    for position, tier in enumerate(tiers):
+        for required_property in tier.required_properties:
+            index.setdefault(required_property, []).append(position)
+    return index
+
+
+# Index the extra artifact name endings by the property that unlocks them
+# {'egg': [0], ...} where the numbers are positions in ITEM_NAMES
+def index_item_names(item_names):
+    index = {}
+    for position, item_name in enumerate(item_names):
+        for required_property in item_name.required_properties:
+            index.setdefault(required_property, []).append(position)
+    return index
+
+
+def build_tables(item_data, char_data):
+    records.validate(item_data, ITEM_DATA_SCHEMA, 'item_data')
+    weapons = parse_items(item_data['equipment']['weapons'], 'weapon')
+    tools = parse_items(item_data['equipment']['tools'], 'tool')
+    armor_lists = {armor_type: parse_items(armor_list, 'armor')
+                   for armor_type, armor_list in item_data['equipment']['armors'].items()}
+    armors = []
+    for armor_list in armor_lists.values():
+        for armor in armor_list:
+            armors.append(armor)
+
+    treasure_lists = {treasure_type: parse_items(treasure_list, 'treasure')
+                      for treasure_type, treasure_list in item_data['items'].items()}
+    treasures = []
+    for treasure_list in treasure_lists.values():
+        for treasure in treasure_list:
+            treasures.append(treasure)
+
+    cheap_items = {
+        'treasure': [treasure for treasure in treasures if treasure.value_in_copper < CHEAP_COPPER_LIMIT],
+        'armor': [armor for armor in armors if armor.value_in_copper < CHEAP_COPPER_LIMIT],
+        'weapon': [weapon for weapon in weapons if weapon.value_in_copper < CHEAP_COPPER_LIMIT],
+        'tool': [tool for tool in tools if tool.value_in_copper < CHEAP_COPPER_LIMIT]}
+
+    valuable_items = {
+        'treasure': [treasure for treasure in treasures if treasure.value_in_copper < VALUABLE_COPPER_LIMIT],
+        'armor': [armor for armor in armors if armor.value_in_copper < VALUABLE_COPPER_LIMIT],
+        'weapon': [weapon for weapon in weapons if weapon.value_in_copper < VALUABLE_COPPER_LIMIT],
+        'tool': [tool for tool in tools if tool.value_in_copper < VALUABLE_COPPER_LIMIT]}
+
+    precious_items = {
+        'treasure': [treasure for treasure in treasures if not treasure.ignore_tier],
+        'armor': [armor for armor in armors if not armor.ignore_tier],
+        'weapon': [weapon for weapon in weapons if not weapon.ignore_tier],
+        'tool': [tool for tool in tools if not tool.ignore_tier]}
+
+    item_values = {'cheap': cheap_items, 'valuable': valuable_items, 'precious': precious_items,
+                   'artifact': precious_items}
+    item_index = {item_value: {category: index_items(items) for category, items in value_items.items()}
+                  for item_value, value_items in item_values.items()}
+    tiers = parse_tiers(item_data)
+    item_names = [ItemName(required_properties=records.interned_set(item_name['required_properties']),
+                           name_endings=records.interned_tuple(item_name['name_endings']))
+                  for item_name in item_data['item_names']]
+    currencies = {denomination: records.make_record(Currency, currency)
+                  for denomination, currency in item_data['money'].items()}
+
+    return {'SKILLS': [Skill(name=s.get('name'), type=s.get('attribute')) for s in char_data['skills']],
+            'ITEM_NAMES': item_names,
+            'CURRENCIES': currencies,
+            'MONEY': Money(gold=currencies['gold'].name, silver=currencies['silver'].name,
+                           copper=currencies['copper'].name, worthless=currencies['worthless'].name,
+                           gold_value=currencies['gold'].copper_value, silver_value=currencies['silver'].copper_value),
+            'ITEM_WEIGHTS': {weight: records.intern_value(name) for weight, name in item_data['carry_weights'].items()},
+            'DETERMINERS': item_data['determiners'],
+            'CREATOR_ORIGINS': records.interned_tuple(item_data['creator_origins']),
+            'WEAPONS': weapons,
+            'TOOLS': tools,
+            'ARMOR_LISTS': armor_lists,
+            'ARMORS': armors,
+            'TREASURE_LISTS': treasure_lists,
+            'TREASURES': treasures,
+            'CHEAP_ITEMS': cheap_items,
+            'VALUABLE_ITEMS': valuable_items,
+            'PRECIOUS_ITEMS': precious_items,
+            'ITEM_VALUES': item_values,
+            'ITEM_INDEX': item_index,
+            'CATEGORY_INDEX': {item_value: index_categories(index) for item_value, index in item_index.items()},
+            'TIERS': tiers,
+            'TIER_INDEX': {rarity: index_tiers(rarity_tiers) for rarity, rarity_tiers in tiers.items()},
+            'UNRESTRICTED_TIERS': {rarity: [position for position, tier in enumerate(rarity_tiers)
+                                            if not tier.required_properties]
+                                   for rarity, rarity_tiers in tiers.items()},
+            'NAME_INDEX': index_item_names(item_names)}
+
+
+# Static tables, loaded from item_data.json and char_data.json (or a snapshot of them) on first use
+tables = data_loader.register('itemgen', build_tables, 'item_data.json', 'char_data.json')
+
+
+# Module level access to the tables and sources, e.g. itemgen.TIERS
+def __getattr__(name):
+    if name == 'item_data':
+        return data_loader.init_data('item_data.json')
+    if name == 'char_data':
+        return data_loader.init_data('char_data.json')
+    return getattr(tables, name)
+
+
+# Returns the items of a value class and category weighing at most max_weight, as (sorted items, amount)
+def get_possible_items(item_value, category, max_weight):
+    index = tables.ITEM_INDEX.get(item_value).get(category)
+    if index is None:
+        return [], 0
+    return index.items, bisect.bisect_right(index.carry_weights, max_weight)
+
+
+# Returns the categories of a value class with at least one item weighing at most max_weight
+def get_feasible_categories(item_value, max_weight):
+    index = tables.CATEGORY_INDEX.get(item_value)
+    position = bisect.bisect_right(index.min_weights, max_weight)
+    return index.categories[position - 1] if position > 0 else ()
+
+
+# Returns the tiers of a rarity that fit an item with the given properties
+# a tier fits if it has no required properties or shares at least one with the item
+@lru_cache(maxsize=4096)
+def get_eligible_tiers(rarity, properties):
+    return tuple(tables.TIERS.get(rarity)[position] for position in get_eligible_positions(rarity, properties))
+
+
+# The positions in TIERS[rarity] of the tiers that fit an item with the given properties
+@lru_cache(maxsize=4096)
+def get_eligible_positions(rarity, properties):
+    index = tables.TIER_INDEX.get(rarity)
+    positions = set(tables.UNRESTRICTED_TIERS.get(rarity))
+    for item_property in properties:
+        positions.update(index.get(item_property, ()))
+    return tuple(sorted(positions))
 
+
+# Returns the extra artifact name endings unlocked by the given item properties
+@lru_cache(maxsize=4096)
+def get_property_name_endings(properties):
+    positions = set()
+    for item_property in properties:
+        positions.update(tables.NAME_INDEX.get(item_property, ()))
+    return tuple(ending for position in sorted(positions) for ending in tables.ITEM_NAMES[position].name_endings)
+
+
+# The part of generate_item that only depends on its arguments, compiled once per distinct set of arguments
+# categories maps every requested item type to its category, or to None if the value class has no such category
+# candidates maps every category to its items weighing at most max_weight, as (sorted items, amount)
+ItemPlan = namedtuple('ItemPlan', 'item_types item_value max_weight categories value_categories '
+                                  'feasible_categories rarity_sampler candidates')
+
+# A request for one item, the arguments of generate_item
+ItemRequest = namedtuple('ItemRequest', 'item_types item_value max_weight', defaults=('cheap', 100))
+
+
+@lru_cache(maxsize=1024)
+def get_item_plan(item_types, item_value='cheap', max_weight=100):
+    value_categories = tuple(tables.ITEM_VALUES.get(item_value).keys())
+    return ItemPlan(item_types=item_types,
+                    item_value=item_value,
+                    max_weight=max_weight,
+                    categories={item_type: item_type.lower() if item_type.lower() in value_categories else None
+                                for item_type in item_types},
+                    value_categories=value_categories,
+                    feasible_categories=get_feasible_categories(item_value, max_weight),
+                    rarity_sampler=weighted_random.compile_weights(TIER_WEIGHTS.get(item_value)),
+                    candidates={category: get_possible_items(item_value, category, max_weight)
+                                for category in value_categories})
+
+
+# seed, an int or any other key such as ('item', 3, 4), draws the item from a private rng instead of rng,
+# the same seed and arguments always give the same item
+@data_loader.consistent
+def generate_item(item_types, item_value='cheap', max_weight=100, rng=random, seed=None):
+    if seed is not None:
+        rng = weighted_random.get_rng(seed)
     if max_weight is None:
         max_weight = 100
+    return generate_planned_item(get_item_plan(tuple(item_types), item_value, max_weight), rng)
+
+
+# Generate an item for every request, an ItemRequest or an (item_types, item_value, max_weight) tuple
+# requests with the same arguments share one plan, and the items are generated in request order on one rng,
+# so they are the same items as calling generate_item for every request in turn
+@data_loader.consistent
+def generate_items(requests, rng=random):
+    plans = {}
+    items = []
+    for item_types, item_value, max_weight in requests:
+        key = (tuple(item_types), item_value, 100 if max_weight is None else max_weight)
+        plan = plans.get(key)
+        if plan is None:
+            plan = plans[key] = get_item_plan(*key)
+        items.append(generate_planned_item(plan, rng))
+    return items
 
-    def get_item_list():
-        items = ITEM_VALUES.get(item_value).get(item_type.lower())
-        return [item for item in items if item.get('carry_weight') <= max_weight]
 
-    tiers = TIERS.get(weighted_random.weighted_random_choice(TIER_WEIGHTS.get(item_value)))
+def generate_planned_item(plan, rng=random):
+    timed = metrics.enabled
+    if timed:
+        t1 = time.perf_counter()
 
-    possible_items = get_item_list()
-    while not possible_items:
-        item_type = random.choice(list(ITEM_VALUES.get(item_value).keys()))
-        possible_items = get_item_list()
+    item_type = rng.choice(plan.item_types)
+    category = plan.categories[item_type]
+    if category is None:
+        item_type = category = rng.choice(plan.value_categories)
 
-    item = random.choice(possible_items)
+    rarity = plan.rarity_sampler.choice(rng)
 
-    item_properties = item.get('properties')
-    item_attributes = item.get('attributes')
+    # If nothing in the category is light enough, pick another category that has something that is
+    possible_items, amount = plan.candidates[category]
+    if not amount:
+        if not plan.feasible_categories:
+            raise ValueError(f'there is no {plan.item_value} item with a carry weight of at most {plan.max_weight}')
+        if metrics.enabled:
+            metrics.count_retry('possible_items')
+        item_type = rng.choice(plan.feasible_categories)
+        possible_items, amount = plan.candidates[item_type]
 
-    if not item.get('ignore_tier'):
-        item_tier = get_tier(item_properties, tiers)
+    item = possible_items[rng.randrange(amount)]
+
+    if timed:
+        t2 = time.perf_counter()
+
+    if not item.ignore_tier:
+        item_tier = get_tier(item.properties, rarity, rng)
     else:
-        tiers = TIERS.get('common')
-        item_tier = get_tier(item_properties, tiers)
+        item_tier = get_tier(item.properties, 'common', rng)
+
+    if timed:
+        metrics.end_stage('tier_selection', t2)
+
+    item = build_item(item, item_tier, item_type, rng)
+
+    if timed:
+        metrics.observe_generator('generate_item', time.perf_counter() - t1)
+
+    return item
+
+
+# Turns a base item and its tier into an Item, drawing the artifact creator, the name and the value
+# copper, if given, is the value in copper instead of a randomized one
+def build_item(item, item_tier, item_type, rng=random, copper=None):
+    timed = metrics.enabled
+    if timed:
+        t2 = time.perf_counter()
 
     item_weight = get_item_weight(item, item_tier)
-    item_attributes = get_item_attributes(item_attributes, item_tier, item_weight)
+    item_attributes = get_item_attributes(item.attributes, item_tier, item_weight)
 
     item_myth = None
     item_perk = None
@@ -142,143 +397,610 @@ def generate_item(item_types, item_value='cheap', max_weight=100):
     creator = None
 
     if item_tier.is_artifact:
-        creator = chargen.generate_character(requested_kin=item_tier.creator_race,
-                                             requested_profession=item_tier.creator_profession)
+        creator = chargen.generate_creator(requested_kin=item_tier.creator_race,
+                                           requested_profession=item_tier.creator_profession,
+                                           rng=rng)
         creator_name = f'{creator.name.title()} {creator.title.title()}'
         item_myth = item_tier.myth.replace('{{ creator_name }}', creator_name)
         item_myth = item_myth.replace('{{ determiner }}',
-                                      item_data['determiners'][item.get("indefinite")])
-        item_myth = item_myth.replace('{{ item_name }}', item.get('name').split(' ')[-1])
+                                      tables.DETERMINERS[item.indefinite])
+        item_myth = item_myth.replace('{{ item_name }}', item.name.split(' ')[-1])
         item_myth = item_myth.replace('{{ race_compound }}', creator.kin.compound)
         item_myth = item_myth.replace('{{ profession_definite }}', creator.profession.definite)
 
-        item_myth = item_myth.replace('{{ creator_origin }}', random.choice(item_data['creator_origins']))
-        skills = {s.name: s.level for s in creator.skills}
-        skill = max(skills, key=(lambda key: skills[key])).capitalize()
+        item_myth = item_myth.replace('{{ creator_origin }}', rng.choice(tables.CREATOR_ORIGINS))
+        skill = creator.skill.capitalize()
         item_perk = item_tier.perk.replace('{{ skill }}', skill)
         item_drawback = item_tier.drawback.replace('{{ skill }}', skill)
 
-    item_name = get_item_name(item, item_tier, creator=creator)
+    if timed and creator:
+        t2 = metrics.end_stage('artifact_creator', t2)
 
-    t2 = time.time() - t1
+    item_name = get_item_name(item, item_tier, creator=creator, rng=rng)
 
-    if item.get('damage'):
-        item_damage = (item.get('damage') + item_tier.damage_modifier
-                       if item.get('damage') + item_tier.damage_modifier >= 0 else 0)
-    else:
-        item_damage = None
-    if item.get('bonus'):
-        if item_type == 'armor':
-            item_bonus = (item.get('bonus') + item_tier.armor_modifier
-                          if item.get('bonus') + item_tier.armor_modifier >= 0 else 0)
-        else:
-            item_bonus = (item.get('bonus') + item_tier.bonus_modifier
-                          if item.get('bonus') + item_tier.bonus_modifier >= 0 else 0)
-    else:
-        item_bonus = None
+    if timed:
+        metrics.end_stage('item_naming', t2)
 
     item = Item(
         name=item_name,
         category=item_type,
-        type=item.get('type'),
-        grip=item.get('grip'),
+        type=item.type,
+        grip=item.grip,
         rarity=item_tier.rarity,
-        bonus=item_bonus,
-        damage=item_damage,
-        range=item.get('range'),
-        value=get_total_value(item.get('value_in_copper'), item_tier.value_multiplier, item_tier.value_modifier),
+        bonus=get_item_bonus(item, item_tier, item_type),
+        damage=get_item_damage(item, item_tier),
+        range=item.range,
+        value=format_value(copper if copper is not None else
+                           get_copper_value(item.value_in_copper, item_tier.value_multiplier,
+                                            item_tier.value_modifier, rng=rng)),
         weight=item_weight,
         attributes=item_attributes,
         myth=item_myth,
         perk=item_perk,
         drawback=item_drawback)
 
-    print(f'{item_type} generated in {t2*1000} ms')
-
     return item
 
 
-def get_tier(properties, tiers):
-    tier = random.choice(tiers)
-    if tier.required_properties:
-        if not (len(set(tier.required_properties) & set(properties)) > 0):
-            print(f'- could not get tier (Properties: {properties}) - recursion!')
-            tier = get_tier(properties, tiers)
-    return tier
+# One way generate_item can pick its base item and tier, tier is the position of the tier in TIERS[rarity]
+ItemOutcome = namedtuple('ItemOutcome', 'item rarity tier')
 
 
-def get_total_value(value, multiplier, modifier, randomize_value=True):
-    gold_value_in_copper = CURRENCIES['gold']['copper_value']
-    silver_value_in_copper = CURRENCIES['silver']['copper_value']
-    gold = CURRENCIES['gold']['name']
-    silver = CURRENCIES['silver']['name']
-    copper = CURRENCIES['copper']['name']
-    worthless = CURRENCIES['worthless']['name']
+# Every way generate_item can pick its base item and tier with its probability, following generate_planned_item
+# {ItemOutcome(item=..., rarity='rare', tier=4): 0.0012, ...}
+@lru_cache(maxsize=256)
+def get_item_outcomes(item_types=('any',), item_value='cheap', max_weight=100):
+    plan = get_item_plan(tuple(item_types), item_value, 100 if max_weight is None else max_weight)
 
-    if modifier:
-        remaining_copper = (value + modifier) * multiplier
+    categories = {}
+    for item_type in plan.item_types:
+        category = plan.categories[item_type]
+        if category is None:
+            for value_category in plan.value_categories:
+                categories[value_category] = (categories.get(value_category, 0) +
+                                              1 / len(plan.item_types) / len(plan.value_categories))
+        else:
+            categories[category] = categories.get(category, 0) + 1 / len(plan.item_types)
+
+    # Categories without a light enough item fall back to one of the feasible categories
+    items = {}
+    for category, probability in categories.items():
+        possible_items, amount = plan.candidates[category]
+        if amount:
+            candidates = [(possible_items, amount, probability)]
+        elif plan.feasible_categories:
+            candidates = [plan.candidates[feasible] + (probability / len(plan.feasible_categories),)
+                          for feasible in plan.feasible_categories]
+        else:
+            raise ValueError(f'there is no {item_value} item with a carry weight of at most {max_weight}')
+        for possible_items, amount, category_probability in candidates:
+            for item in possible_items[:amount]:
+                items[item] = items.get(item, 0) + category_probability / amount
+
+    rarity_weights = plan.rarity_sampler.weights
+    total_weight = sum(rarity_weights.values())
+    outcomes = {}
+    for item, item_probability in items.items():
+        for rarity, weight in rarity_weights.items():
+            tier_rarity = 'common' if item.ignore_tier else rarity
+            positions = get_eligible_positions(tier_rarity, item.properties)
+            if not positions:
+                raise ValueError(f'there is no {tier_rarity} tier for an item with the properties {item.properties}')
+            for position in positions:
+                outcome = ItemOutcome(item=item, rarity=tier_rarity, tier=position)
+                outcomes[outcome] = (outcomes.get(outcome, 0) +
+                                     item_probability * weight / total_weight / len(positions))
+    return outcomes
+
+
+def get_outcome_tier(outcome):
+    return tables.TIERS[outcome.rarity][outcome.tier]
+
+
+# The lowest and highest value in copper of an outcome, every value in between is equally likely
+def get_outcome_copper_range(outcome):
+    tier = get_outcome_tier(outcome)
+    return get_copper_range(get_base_copper_value(outcome.item.value_in_copper, tier.value_multiplier,
+                                                  tier.value_modifier))
+
+
+class ConstraintError(ValueError):
+    pass
+
+
+# Constraints on a generated item, None is no constraint
+# categories and rarities are collections of the allowed ones, the bonus, damage and value (in copper) bounds are
+# inclusive, max_carry_weight is the carry weight after the tier, and attributes must all be among the item's
+ItemConstraints = namedtuple('ItemConstraints', 'categories rarities min_bonus max_bonus min_damage max_damage '
+                                                'min_value max_value max_carry_weight attributes',
+                             defaults=(None,) * 10)
+
+# The outcomes that meet a set of constraints, with a sampler of their positions weighted by their probability
+# of being generated and meeting the value bounds, and the value range each one is drawn from
+FeasibleItems = namedtuple('FeasibleItems', 'outcomes copper_ranges sampler')
+
+
+def within(value, low, high):
+    return (low is None or (value is not None and value >= low)) and \
+        (high is None or (value is not None and value <= high))
+
+
+@lru_cache(maxsize=256)
+def get_feasible_items(constraints, item_types=('any',), item_value='cheap', max_weight=100):
+    outcomes = []
+    copper_ranges = []
+    weights = {}
+    for outcome, probability in get_item_outcomes(item_types, item_value, max_weight).items():
+        item = outcome.item
+        tier = get_outcome_tier(outcome)
+        if constraints.categories is not None and item.category not in constraints.categories:
+            continue
+        if constraints.rarities is not None and outcome.rarity not in constraints.rarities:
+            continue
+        if not within(get_item_bonus(item, tier, item.category), constraints.min_bonus, constraints.max_bonus):
+            continue
+        if not within(get_item_damage(item, tier), constraints.min_damage, constraints.max_damage):
+            continue
+        weight = get_item_weight(item, tier)
+        if constraints.max_carry_weight is not None and parse_weight(weight) > constraints.max_carry_weight:
+            continue
+        if constraints.attributes and not set(constraints.attributes).issubset(
+                get_item_attributes(item.attributes, tier, weight) or ()):
+            continue
+
+        # The value is drawn uniformly from its range, only the part of it within the value bounds is feasible
+        low, high = get_outcome_copper_range(outcome)
+        if constraints.min_value is not None:
+            low = max(low, constraints.min_value)
+        if constraints.max_value is not None:
+            high = min(high, constraints.max_value)
+        if low > high:
+            continue
+        full_low, full_high = get_outcome_copper_range(outcome)
+        weights[len(outcomes)] = probability * (high - low + 1) / (full_high - full_low + 1)
+        outcomes.append(outcome)
+        copper_ranges.append((low, high))
+
+    if not outcomes:
+        raise ConstraintError(f'there is no {item_value} item of {", ".join(item_types)} with a carry weight of at '
+                              f'most {max_weight} that meets {constraints}')
+    return FeasibleItems(outcomes=tuple(outcomes), copper_ranges=tuple(copper_ranges),
+                         sampler=weighted_random.WeightedSampler(weights, frozen=True))
+
+
+# Generate an item that meets the constraints, an ItemConstraints, drawn from the items generate_item would give
+# with the same arguments that meet them, with the same probabilities relative to each other
+# raises a ConstraintError right away if no item can meet them
+@data_loader.consistent
+def generate_constrained_item(constraints, item_types=('any',), item_value='cheap', max_weight=100, rng=random,
+                              seed=None):
+    if seed is not None:
+        rng = weighted_random.get_rng(seed)
+    if max_weight is None:
+        max_weight = 100
+    constraints = constraints._replace(**{field: tuple(getattr(constraints, field))
+                                          for field in ('categories', 'rarities', 'attributes')
+                                          if getattr(constraints, field) is not None})
+    feasible = get_feasible_items(constraints, tuple(item_types), item_value, max_weight)
+    position = feasible.sampler.choice(rng)
+    outcome = feasible.outcomes[position]
+    return build_item(outcome.item, get_outcome_tier(outcome), outcome.item.category, rng,
+                      copper=rng.randint(*feasible.copper_ranges[position]))
+
+
+# The arrays generate_loot draws from, compiled once per distinct set of arguments
+# the base item and the rarity are drawn independently, then one of the tier_counts[item, rarity] tiers that fit them
+# from tier_codes[tier_offsets[item, rarity]:], positions in tiers, a list of (rarity, position in TIERS[rarity])
+# templates maps an item and tier pair, item * len(tiers) + tier, to its Item and copper range as they are drawn
+LootPlan = namedtuple('LootPlan', 'items item_probabilities rarity_probabilities tiers tier_artifacts tier_offsets '
+                                  'tier_counts tier_codes templates')
+
+
+@lru_cache(maxsize=64)
+def get_loot_plan(item_types=('any',), item_value='cheap', max_weight=100):
+    import numpy as np
+
+    # The base items with their probabilities, which generate_planned_item draws before and apart from the rarity
+    item_probabilities = {}
+    for outcome, probability in get_item_outcomes(item_types, item_value, max_weight).items():
+        item_probabilities[outcome.item] = item_probabilities.get(outcome.item, 0) + probability
+    items = list(item_probabilities)
+    rarity_weights = get_item_plan(item_types, item_value, max_weight).rarity_sampler.weights
+    rarities = list(rarity_weights)
+
+    tiers = []
+    tier_positions = {}
+    tier_offsets = np.zeros((len(items), len(rarities)), dtype=np.int64)
+    tier_counts = np.zeros((len(items), len(rarities)), dtype=np.int64)
+    tier_codes = []
+    for i, item in enumerate(items):
+        for r, rarity in enumerate(rarities):
+            tier_rarity = 'common' if item.ignore_tier else rarity
+            positions = get_eligible_positions(tier_rarity, item.properties)
+            tier_offsets[i, r] = len(tier_codes)
+            tier_counts[i, r] = len(positions)
+            for position in positions:
+                tier = tier_positions.get((tier_rarity, position))
+                if tier is None:
+                    tier = tier_positions[(tier_rarity, position)] = len(tiers)
+                    tiers.append((tier_rarity, position))
+                tier_codes.append(tier)
+
+    item_probabilities = np.array(list(item_probabilities.values()))
+    rarity_probabilities = np.array([rarity_weights[rarity] for rarity in rarities], dtype=float)
+    return LootPlan(items=items,
+                    item_probabilities=item_probabilities / item_probabilities.sum(),
+                    rarity_probabilities=rarity_probabilities / rarity_probabilities.sum(),
+                    tiers=tiers,
+                    tier_artifacts=np.array([bool(tables.TIERS[rarity][position].is_artifact)
+                                             for rarity, position in tiers], dtype=bool),
+                    tier_offsets=tier_offsets,
+                    tier_counts=tier_counts,
+                    tier_codes=np.array(tier_codes, dtype=np.int64),
+                    templates={})
+
+
+# The Item of an item and tier pair of a loot plan, without its value, and the range of its value in copper
+# artifacts have no template, their creator is drawn for every one of them
+def get_loot_template(plan, pair):
+    template = plan.templates.get(pair)
+    if template is None:
+        item = plan.items[pair // len(plan.tiers)]
+        rarity, position = plan.tiers[pair % len(plan.tiers)]
+        tier = tables.TIERS[rarity][position]
+        low, high = get_copper_range(get_base_copper_value(item.value_in_copper, tier.value_multiplier,
+                                                           tier.value_modifier))
+        item = build_item(item, tier, item.category, copper=0) if not tier.is_artifact else None
+        template = plan.templates[pair] = (item, low, high)
+    return template
+
+
+# Generate n items of a value class at once, with the same odds as generate_item with the same arguments
+# the item, rarity, tier and value draws are vectorized, and every distinct item and tier is built only once
+# returns a list of Items, or with lazy=True a columns.ItemColumns that formats the values as they are read
+# artifacts are built one by one on the scalar path, so the more of them a value class has the less this gains
+@data_loader.consistent
+def generate_loot(n, item_value='cheap', item_types=('any',), max_weight=100, seed=None, lazy=False):
+    # numpy is only needed for the batch generator, so it is imported on first use instead of with the module
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError('generate_loot requires numpy') from None
+    # columns imports this module, so it is imported here instead of with the module
+    from . import columns
+
+    if max_weight is None:
+        max_weight = 100
+    rng = np.random.default_rng(seed)
+    plan = get_loot_plan(tuple(item_types), item_value, max_weight)
+
+    item_indexes = rng.choice(len(plan.items), size=n, p=plan.item_probabilities)
+    rarity_indexes = rng.choice(len(plan.rarity_probabilities), size=n, p=plan.rarity_probabilities)
+    subtiers = (rng.random(n) * plan.tier_counts[item_indexes, rarity_indexes]).astype(np.int64)
+    tier_indexes = plan.tier_codes[plan.tier_offsets[item_indexes, rarity_indexes] + subtiers]
+
+    pairs, rows = np.unique(item_indexes * len(plan.tiers) + tier_indexes, return_inverse=True)
+    templates = [get_loot_template(plan, pair) for pair in pairs.tolist()]
+    copper_ranges = np.array([(low, high) for _, low, high in templates], dtype=np.int64).reshape(-1, 2)
+    values = rng.integers(copper_ranges[rows, 0], copper_ranges[rows, 1] + 1)
+    templates = [template for template, _, _ in templates]
+
+    # Artifacts are built one by one on the scalar path, keeping the value drawn for them
+    artifacts = np.nonzero(plan.tier_artifacts[tier_indexes])[0].tolist()
+    if artifacts:
+        artifact_rng = random.Random(int(rng.integers(2 ** 63)))
+        for row in artifacts:
+            item = plan.items[item_indexes[row]]
+            rarity, position = plan.tiers[tier_indexes[row]]
+            templates.append(build_item(item, tables.TIERS[rarity][position], item.category, artifact_rng,
+                                        copper=int(values[row])))
+            rows[row] = len(templates) - 1
+        # None of the rows are left on the artifact pairs, which have no template
+        kept = np.array([template is not None for template in templates], dtype=bool)
+        rows = (np.cumsum(kept) - 1)[rows]
+        templates = [template for template in templates if template is not None]
+
+    if not lazy:
+        return build_loot_items(templates, rows, values)
+    loot = columns.ItemColumns()
+    loot.extend_rows(templates, rows, values)
+    return loot
+
+
+# The Items of a batch of loot, row i a copy of templates[rows[i]] worth values[i] copper
+# the templates are copied into one table of fields, so that each field is gathered for all the rows at once,
+# and every distinct value is formatted only once
+def build_loot_items(templates, rows, values):
+    import numpy as np
+
+    values, value_rows = np.unique(values, return_inverse=True)
+    money = np.array([format_value(value) for value in values.tolist()], dtype=object)
+    with records.allocating():
+        table = np.empty((len(templates), len(Item._fields)), dtype=object)
+        for position, template in enumerate(templates):
+            table[position] = template
+        table = table[rows]
+        table[:, Item._fields.index('value')] = money[value_rows]
+        # Every item gets its own list of attributes, as generate_item gives it
+        attributes = table[:, Item._fields.index('attributes')]
+        listed = attributes != None  # noqa: E711, an elementwise comparison
+        attributes[listed] = [list(item_attributes) for item_attributes in attributes[listed].tolist()]
+        # Item._make is tuple.__new__ with a length check, which the table's width already guarantees
+        return list(map(tuple.__new__, repeat(Item), table.tolist()))
+
+
+# The value classes a hoard is drawn from, each one as likely, and how far off the value a hoard may be by default
+HOARD_VALUE_CLASSES = ('cheap', 'valuable', 'precious')
+DEFAULT_HOARD_TOLERANCE = 0.1
+DEFAULT_HOARD_ITEMS = 12
+HOARD_ATTEMPTS = 10
+# Carry weights are counted in steps of this, items without a carry weight ('-') count as 0
+HOARD_WEIGHT_STEP = 0.5
+
+# The outcomes of a hoard index that weigh units weight steps, sorted by value, lows and highs their copper ranges
+# (both ascending) and cumulative the running total of their probabilities, starting at 0
+HoardWeight = namedtuple('HoardWeight', 'units outcomes lows highs cumulative')
+
+# The items of a hoard, with their total value in copper and total carry weight
+Hoard = namedtuple('Hoard', 'items copper carry_weight')
+
+
+# Every item and tier a hoard can hold, grouped by carry weight, the worthless ones are left out
+@lru_cache(maxsize=64)
+def get_hoard_index(item_types=('any',), item_values=HOARD_VALUE_CLASSES):
+    probabilities = {}
+    for item_value in item_values:
+        for outcome, probability in get_item_outcomes(item_types, item_value, 100).items():
+            probabilities[outcome] = probabilities.get(outcome, 0) + probability / len(item_values)
+
+    weights = {}
+    for outcome, probability in probabilities.items():
+        low, high = get_outcome_copper_range(outcome)
+        if high <= 0:
+            continue
+        weight = parse_weight(get_item_weight(outcome.item, get_outcome_tier(outcome)))
+        units = math.ceil(max(weight, 0) / HOARD_WEIGHT_STEP)
+        weights.setdefault(units, []).append((low, high, outcome, probability))
+
+    index = []
+    for units, entries in sorted(weights.items()):
+        entries.sort(key=lambda entry: entry[:2])
+        cumulative = [0]
+        for _, _, _, probability in entries:
+            cumulative.append(cumulative[-1] + probability)
+        index.append(HoardWeight(units=units,
+                                 outcomes=[outcome for _, _, outcome, _ in entries],
+                                 lows=[low for low, _, _, _ in entries],
+                                 highs=[high for _, high, _, _ in entries],
+                                 cumulative=cumulative))
+    return tuple(index)
+
+
+# The most copper count items weighing at most units weight steps together can be worth, as bounds[count][units]
+# an unbounded knapsack over the most valuable item of every carry weight
+@lru_cache(maxsize=256)
+def get_hoard_bounds(item_types, item_values, max_items, max_units):
+    index = get_hoard_index(item_types, item_values)
+    bounds = [[0] * (max_units + 1)]
+    for _ in range(max_items):
+        previous = bounds[-1]
+        row = list(previous)
+        for weight in index:
+            for units in range(weight.units, max_units + 1):
+                row[units] = max(row[units], weight.highs[-1] + previous[units - weight.units])
+        bounds.append(row)
+    return bounds
+
+
+# Builds the hoard index of the default arguments up front, e.g. before serving the first requests
+def prewarm_hoards():
+    get_hoard_index(('any',), HOARD_VALUE_CLASSES)
+
+
+# The outcomes that can be the next item of a hoard, worth at most most copper while at least as much as the
+# count - 1 items after it cannot make up for of what is left, as (weight, first, last, need, probability) slices
+def get_hoard_slices(index, bounds, remaining, most, count, units):
+    slices = []
+    for weight in index:
+        if weight.units > units:
+            break
+        need = max(remaining - bounds[count - 1][units - weight.units], 1)
+        first = bisect.bisect_left(weight.highs, need)
+        last = bisect.bisect_right(weight.lows, most)
+        if first < last:
+            slices.append((weight, first, last, need, weight.cumulative[last] - weight.cumulative[first]))
+    return slices
+
+
+# Draws the items of a hoard worth about target copper in one pass, as (outcome, copper, units),
+# or returns None if it got stuck
+# the items are drawn until they add up to the target, only when no item is worth at most what is left
+# the hoard stops short by up to under, or else the last item goes over by up to over
+# every item is drawn by its probability among the ones that can still be completed into a hoard worth the target
+def pick_hoard(index, bounds, target, under, over, max_items, max_units, rng=random):
+    picks = []
+    remaining = target
+    units = max_units
+    # The bounds leave nothing once every item is drawn
+    while remaining > 0 and len(picks) < max_items:
+        count = max_items - len(picks)
+        most = remaining
+        slices = get_hoard_slices(index, bounds, remaining, most, count, units)
+        if not slices:
+            if remaining <= under:
+                return picks
+            most = remaining + over
+            slices = get_hoard_slices(index, bounds, remaining, most, count, units)
+            if not slices:
+                return None
+
+        draw = rng.random() * sum(mass for _, _, _, _, mass in slices)
+        for weight, first, last, need, mass in slices:
+            if draw < mass:
+                break
+            draw -= mass
+        position = bisect.bisect_right(weight.cumulative, weight.cumulative[first] + draw, first, last) - 1
+        position = min(max(position, first), last - 1)
+        item_copper = rng.randint(max(weight.lows[position], need), min(weight.highs[position], most))
+        picks.append((weight.outcomes[position], item_copper, weight.units))
+        remaining -= item_copper
+        units -= weight.units
+    return picks
+
+
+# Generate a hoard of items worth value, in copper or formatted like '30 guld', give or take tolerance of it,
+# weighing at most max_carry_weight together and of at most max_items items
+# the total is drawn uniformly within the tolerance, then the items and their values are picked from the hoard
+# index to add up to it, and only the picked items are built
+# raises a ConstraintError right away if no hoard of max_items items can be worth that much
+@data_loader.consistent
+def generate_hoard(value, max_carry_weight=None, tolerance=DEFAULT_HOARD_TOLERANCE, max_items=DEFAULT_HOARD_ITEMS,
+                   item_types=('any',), item_values=HOARD_VALUE_CLASSES, rng=random, seed=None):
+    if seed is not None:
+        rng = weighted_random.get_rng(seed)
+    copper = parse_value(value) if isinstance(value, str) else value
+    item_types = tuple(item_types)
+    item_values = tuple(item_values)
+    index = get_hoard_index(item_types, item_values)
+    if max_carry_weight is None:
+        max_units = max_items * max((weight.units for weight in index), default=0)
+    else:
+        max_units = int(max_carry_weight / HOARD_WEIGHT_STEP)
+    bounds = get_hoard_bounds(item_types, item_values, max_items, max_units)
+
+    slack = int(copper * tolerance)
+    low = max(copper - slack, 1)
+    high = min(copper + slack, bounds[max_items][max_units])
+    if low > high:
+        raise ConstraintError(f'no hoard of at most {max_items} {"/".join(item_values)} items with a carry weight of '
+                              f'at most {max_carry_weight} is worth {format_value(copper)}')
+    # The target is kept over the attempts, so the targets that are harder to fill are not drawn less often
+    target = rng.randint(low, high)
+    for _ in range(HOARD_ATTEMPTS):
+        picks = pick_hoard(index, bounds, target, target - low, high - target, max_items, max_units, rng)
+        if picks is not None:
+            break
     else:
-        remaining_copper = value * multiplier
+        raise ConstraintError(f'could not fill a hoard worth {format_value(copper)} in {HOARD_ATTEMPTS} attempts')
+
+    items = [build_item(outcome.item, get_outcome_tier(outcome), outcome.item.category, rng, copper=item_copper)
+             for outcome, item_copper, _ in picks]
+    return Hoard(items=items,
+                 copper=sum(item_copper for _, item_copper, _ in picks),
+                 carry_weight=sum(units for _, _, units in picks) * HOARD_WEIGHT_STEP)
+
+
+# The bonus of an item of a tier, armor uses the armor modifier of the tier and everything else the bonus modifier
+def get_item_bonus(item, tier, item_type):
+    if not item.bonus:
+        return None
+    modifier = tier.armor_modifier if item_type == 'armor' else tier.bonus_modifier
+    return item.bonus + modifier if item.bonus + modifier >= 0 else 0
+
+
+def get_item_damage(item, tier):
+    if not item.damage:
+        return None
+    return item.damage + tier.damage_modifier if item.damage + tier.damage_modifier >= 0 else 0
+
 
+def get_tier(properties, rarity, rng=random):
+    tiers = get_eligible_tiers(rarity, frozenset(properties or ()))
+    if not tiers:
+        raise ValueError(f'there is no {rarity} tier for an item with the properties {properties}')
+    return tiers[rng.randrange(len(tiers))]
+
+
+def get_total_value(value, multiplier, modifier, randomize_value=True, rng=random):
+    return format_value(get_copper_value(value, multiplier, modifier, randomize_value, rng))
+
+
+# The value of an item in copper, randomized by up to 10% either way
+def get_copper_value(value, multiplier, modifier, randomize_value=True, rng=random):
+    remaining_copper = get_base_copper_value(value, multiplier, modifier)
     if randomize_value:
-        min_value = int(remaining_copper * 0.9)
-        max_value = int(remaining_copper * 1.1)
-        remaining_copper = random.randint(min_value, max_value)
+        remaining_copper = rng.randint(*get_copper_range(remaining_copper))
+    return remaining_copper
+
+
+def get_base_copper_value(value, multiplier, modifier):
+    if modifier:
+        return (value + modifier) * multiplier
+    return value * multiplier
+
+
+# The lowest and highest randomized value of a value in copper, every value in between is equally likely
+def get_copper_range(remaining_copper):
+    return int(remaining_copper * 0.9), int(remaining_copper * 1.1)
+
+
+# Formats a value in copper as gold, silver and copper, e.g. '12 guld, 3 silver', values of at most 0 are worthless
+def format_value(remaining_copper):
+    money = tables.MONEY
 
     if remaining_copper > 0:
         total_value_in_gold = 0
-        total_value_in_silver = 0
 
         if remaining_copper > 1000:
-            while remaining_copper - gold_value_in_copper >= 0:
-                total_value_in_gold += 1
-                remaining_copper -= gold_value_in_copper
+            total_value_in_gold, remaining_copper = divmod(remaining_copper, money.gold_value)
 
-        while remaining_copper - silver_value_in_copper >= 0:
-            total_value_in_silver += 1
-            remaining_copper -= silver_value_in_copper
+        total_value_in_silver, remaining_copper = divmod(remaining_copper, money.silver_value)
 
         total_value_in_copper = int(remaining_copper)
         values = []
         if total_value_in_gold > 0:
-            values.append(f'{total_value_in_gold} {gold}')
+            values.append(f'{int(total_value_in_gold)} {money.gold}')
         if total_value_in_silver > 0:
-            values.append(f'{total_value_in_silver} {silver}')
+            values.append(f'{int(total_value_in_silver)} {money.silver}')
         if total_value_in_copper > 0:
-            values.append(f'{total_value_in_copper} {copper}')
+            values.append(f'{total_value_in_copper} {money.copper}')
 
         return ', '.join(values)
     else:
-        return worthless
+        return money.worthless
+
+
+# The value in copper of a value formatted by format_value, worthless is 0
+def parse_value(value):
+    money = tables.MONEY
+    copper_values = {money.gold: money.gold_value, money.silver: money.silver_value, money.copper: 1}
+    if value == money.worthless:
+        return 0
+    copper = 0
+    for part in value.split(', '):
+        amount, currency = part.split(' ')
+        copper += int(amount) * copper_values[currency]
+    return copper
 
 
-def get_item_name(item, tier, creator=None):
+def get_item_name(item, tier, creator=None, rng=random):
     if creator:
-        if tier.creator_named_item or random.choice([True, False]):
+        if tier.creator_named_item or rng.choice([True, False]):
             first_name = creator.name
             if first_name.endswith('s'):
-                name = f'{first_name} {item.get("name").split(" ")[-1]} ({item.get("name")})'
+                name = f'{first_name} {item.name.split(" ")[-1]} ({item.name})'
             else:
-                name = f'{first_name}s {item.get("name").split(" ")[-1]} ({item.get("name")})'
+                name = f'{first_name}s {item.name.split(" ")[-1]} ({item.name})'
             return name
         else:
-            name_beginnings = tier.name_beginnings
-            name_endings = tier.name_endings
-            for name in ITEM_NAMES:
-                if len(set(name.get('required_properties')) & set(item.get('properties'))) > 0:
-                    name_endings += name['name_endings']
-            name = f'{random.choice(name_beginnings)}{random.choice(name_endings)} ({item.get("name")})'
+            # One draw over the tier's own endings followed by the ones unlocked by the item's properties
+            tier_endings = tier.name_endings
+            property_endings = get_property_name_endings(item.properties)
+            ending = rng.randrange(len(tier_endings) + len(property_endings))
+            name_ending = tier_endings[ending] if ending < len(tier_endings) else \
+                property_endings[ending - len(tier_endings)]
+            name = f'{rng.choice(tier.name_beginnings)}{name_ending} ({item.name})'
             return name
     if tier.descriptions:
         if tier.description_at_end:
-            return f'{item.get("name")} {tier.descriptions.get(item.get("indefinite"))}'
+            return f'{item.name} {tier.descriptions.get(item.indefinite)}'
         else:
-            return f'{tier.descriptions.get(item.get("indefinite"))} {item.get("name")}'
-    return item.get('name')
+            return f'{tier.descriptions.get(item.indefinite)} {item.name}'
+    return item.name
 
 
 def get_item_weight(item, tier, creator=None):
-    item_weight = item.get('carry_weight')
+    item_weight = item.carry_weight
     if tier.weight_multiplier:
         item_weight = item_weight * tier.weight_multiplier
         if item_weight > 0.5:
@@ -288,29 +1010,50 @@ def get_item_weight(item, tier, creator=None):
         elif item_weight == 0.0:
             item_weight = 0
 
-    return ITEM_WEIGHTS.get(str(item_weight)) if ITEM_WEIGHTS.get(str(item_weight)) else str(item_weight)
+    item_weights = tables.ITEM_WEIGHTS
+    return item_weights.get(str(item_weight)) if item_weights.get(str(item_weight)) else str(item_weight)
+
+
+# The carry weight of an item weight returned by get_item_weight, e.g. 0.5 for 'lätt'
+def parse_weight(weight):
+    for number, name in tables.ITEM_WEIGHTS.items():
+        if name == weight:
+            return float(number)
+    return float(weight)
+
+
+# The item weight of a carry weight, the inverse of parse_weight
+def format_weight(weight):
+    number = str(int(weight)) if float(weight).is_integer() else str(weight)
+    return tables.ITEM_WEIGHTS.get(number) or number
 
 
 def get_item_attributes(attributes, tier, weight):
+    item_weights = tables.ITEM_WEIGHTS
     if attributes is not None:
         item_attributes = sorted(list(set(attributes)))
     else:
         item_attributes = attributes
     if tier.added_attributes and item_attributes is not None:
-        item_attributes = list(set(item_attributes).union(set(tier.added_attributes)))
+        item_attributes = sorted(set(item_attributes).union(set(tier.added_attributes)))
     if tier.removed_attributes and item_attributes is not None:
-        item_attributes = list(set(item_attributes) - (set(tier.removed_attributes)))
-    if item_attributes is not None and weight != ITEM_WEIGHTS.get('0') and weight != ITEM_WEIGHTS.get('1'):
+        item_attributes = sorted(set(item_attributes) - (set(tier.removed_attributes)))
+    if item_attributes is not None and weight != item_weights.get('0') and weight != item_weights.get('1'):
         if len(item_attributes) > 0 and len(weight) > 1:
-            item_attributes.insert(0, ITEM_WEIGHTS.get('2')) \
-                if weight not in ITEM_WEIGHTS.values() else item_attributes.insert(0, weight)
+            item_attributes.insert(0, item_weights.get('2')) \
+                if weight not in item_weights.values() else item_attributes.insert(0, weight)
         elif len(weight) > 1:
-            item_attributes.append(ITEM_WEIGHTS.get('2')) \
-                if weight not in ITEM_WEIGHTS.values() else item_attributes.append(weight)
+            item_attributes.append(item_weights.get('2')) \
+                if weight not in item_weights.values() else item_attributes.append(weight)
 
     return item_attributes
 
 
+# The plans, tiers and feasible sets are compiled from the tables, so a reload of item_data.json clears them
+data_loader.add_caches(tables, get_eligible_tiers, get_eligible_positions, get_property_name_endings, get_item_plan,
+                       get_item_outcomes, get_feasible_items, get_loot_plan, get_hoard_index, get_hoard_bounds)
+
+
 """item = generate_item('tool')
 print(f'Föremål: {item.name.title()}')
 print(f'Typ: {item.type.title()} {("(" + item.grip.upper() + ")") if item.grip else ""}')
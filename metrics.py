@@ -0,0 +1,144 @@
+import bisect
+import os
+import threading
+import time
+from collections import namedtuple
+
+# Opt-in instrumentation for the generators
+# the generators only check the module level enabled flag when instrumentation is off,
+# so nothing is timed, counted or allocated until enable() is called
+
+# Upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+           0.25, 0.5, 1.0)
+
+# A metric family with its Prometheus name, type, label and help text
+Family = namedtuple('Family', 'name type label help')
+
+FAMILIES = {
+    'generator': Family(name='mdnl_generator_seconds', type='histogram', label='generator',
+                        help='Latency of a top level generator call'),
+    'stage': Family(name='mdnl_stage_seconds', type='histogram', label='stage',
+                    help='Latency of a stage inside a generator'),
+    'retries': Family(name='mdnl_retries_total', type='counter', label='loop',
+                      help='Redraws done by a rejection sampling loop')}
+
+enabled = False
+
+lock = threading.Lock()
+histograms = {}
+counters = {}
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        counts = []
+        running_count = 0
+        for count in self.counts:
+            running_count += count
+            counts.append(running_count)
+        return counts
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    with lock:
+        histograms.clear()
+        counters.clear()
+
+
+def observe(family, name, seconds):
+    with lock:
+        histogram = histograms.get((family, name))
+        if histogram is None:
+            histogram = histograms[(family, name)] = Histogram()
+        histogram.observe(seconds)
+
+
+def increment(family, name, amount=1):
+    with lock:
+        counters[(family, name)] = counters.get((family, name), 0) + amount
+
+
+def observe_generator(generator, seconds):
+    observe('generator', generator, seconds)
+
+
+def observe_stage(stage, seconds):
+    observe('stage', stage, seconds)
+
+
+# Records the time since start as a stage timing and returns the current time, the start of the next stage
+def end_stage(stage, start):
+    now = time.perf_counter()
+    observe_stage(stage, now - start)
+    return now
+
+
+def count_retry(loop, amount=1):
+    increment('retries', loop, amount)
+
+
+# Returns all collected metrics as a plain dictionary
+# {'generator': {'generate_item': {'count': 3, 'sum': 0.001, 'buckets': {0.00001: 0, ..., inf: 3}}}, 'retries': ...}
+def snapshot():
+    metrics = {family: {} for family in FAMILIES}
+    with lock:
+        for (family, name), histogram in histograms.items():
+            bounds = BUCKETS + (float('inf'),)
+            metrics[family][name] = {'count': histogram.count,
+                                     'sum': histogram.total,
+                                     'buckets': dict(zip(bounds, histogram.cumulative_counts()))}
+        for (family, name), value in counters.items():
+            metrics[family][name] = value
+    return metrics
+
+
+# Returns all collected metrics in the Prometheus text exposition format
+def to_prometheus():
+    lines = []
+    metrics = snapshot()
+    for family_key, family in FAMILIES.items():
+        lines.append(f'# HELP {family.name} {family.help}')
+        lines.append(f'# TYPE {family.name} {family.type}')
+        for name, value in sorted(metrics[family_key].items()):
+            label = f'{family.label}="{name}"'
+            if family.type == 'histogram':
+                for bound, count in value['buckets'].items():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{family.name}_bucket{{{label},le="{le}"}} {count}')
+                lines.append(f'{family.name}_sum{{{label}}} {value["sum"]}')
+                lines.append(f'{family.name}_count{{{label}}} {value["count"]}')
+            else:
+                lines.append(f'{family.name}{{{label}}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# Writes the metrics to a Prometheus text file, e.g. for the node exporter textfile collector
+# the file is written next to its destination and then renamed, so a scrape never reads a partial file
+def write_prometheus(path):
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        f.write(to_prometheus())
+    os.replace(temporary_path, path)
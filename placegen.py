@@ -3,12 +3,11 @@ import time
 from collections import namedtuple
 
 from . import data_loader
+from . import metrics
+from . import records
 from . import weighted_random
 from . import itemgen
 
-place_data = data_loader.init_data('place_data.json')
-creature_data = data_loader.init_data('creature_data.json')
-
 Village = namedtuple('Village', 'type name age size leader problem speciality oddity institutions')
 Institution = namedtuple('Institution', 'name type')
 Tavern = namedtuple('Tavern', 'name type speciality oddity guest')
@@ -25,315 +24,622 @@ Door = namedtuple('Door', 'name trap status')
 Treasure = namedtuple('Treasure', 'name contents trap')
 Trap = namedtuple('Trap', 'name effect victim')
 
+# A room of a streamed dungeon, exits are the numbers of the rooms its doors lead to (None if not connected)
+Dungeon_Room = namedtuple('Dungeon_Room', 'number room exits')
+# A dungeon whose rooms are generated one at a time while iterating over rooms
+Streamed_Dungeon = namedtuple('Streamed_Dungeon', 'seed dungeon rooms')
+
 Origin = namedtuple('Origin', 'creator purpose reason history')
 Age = namedtuple('Age', 'name years')
 
+# The room tables of place_data.json and the monsters of creature_data.json
+RoomType = namedtuple('RoomType', 'name weight content_rolls')
+RoomContent = namedtuple('RoomContent', 'name weight treasure_chance inhabited trapped')
+RoomTreasure = namedtuple('RoomTreasure', 'name weight trap_chance simple_treasure_rolls valuable_treasure_rolls '
+                                          'precious_treasure_rolls max_weight')
+RoomTrap = namedtuple('RoomTrap', 'name weight effect victim effect_min effect_max')
+DoorState = namedtuple('DoorState', 'name weight trapped status')
+Monster = namedtuple('Monster', 'name single weight')
+
+# The village, dungeon and fortress tables of place_data.json
+AgeRange = namedtuple('AgeRange', 'name weight min_age max_age')
+VillageSizeRange = namedtuple('VillageSizeRange', 'name weight min_population max_population min_institutions '
+                                                  'max_institutions')
+InstitutionType = namedtuple('InstitutionType', 'name weight type specializations')
+DungeonSizeRange = namedtuple('DungeonSizeRange', 'name weight min_rooms max_rooms')
+DungeonCreator = namedtuple('DungeonCreator', 'name weight manmade')
+FortressInhabitants = namedtuple('FortressInhabitants', 'name weights roll_empty roll_moved_in')
+FortressEmpty = namedtuple('FortressEmpty', 'name weight min_amount max_amount monsters')
+Intruder = namedtuple('Intruder', 'name weight single amount roll_for_monster')
+# The lists of place_data.json a place draws its descriptions from uniformly
+VillageTexts = namedtuple('VillageTexts', 'leader_oddities leader_types problems specialities oddities')
+TavernTexts = namedtuple('TavernTexts', 'name_beginnings name_endings oddities specialities guests')
+DungeonTexts = namedtuple('DungeonTexts', 'reasons histories oddities')
+FortressTexts = namedtuple('FortressTexts', 'claims_to_fame histories oddities')
+
+# The item types of simple treasure rolls and of valuable and precious ones
+SIMPLE_TREASURE_TYPES = ('any',)
+VALUABLE_TREASURE_TYPES = ('weapon', 'armor', 'treasure')
+
+# The shape of place_data.json and creature_data.json, checked once when the tables are built
+WEIGHTED = records.ListOf({'name': str, 'weight': records.NUMBER})
+AGES_SCHEMA = records.ListOf({'name': str, 'weight': records.NUMBER, 'min_age': int, 'max_age': int})
+NAMES_SCHEMA = {'beginnings': records.STRINGS, 'endings': records.STRINGS}
+PLACE_DATA_SCHEMA = {
+    'villages': {'sizes': records.ListOf({'name': str, 'weight': records.NUMBER, 'min_population': int,
+                                          'max_population': int, 'min_institutions': int,
+                                          'max_institutions': int}),
+                 'ages': AGES_SCHEMA,
+                 'leaders': {'oddities': records.STRINGS, 'types': records.STRINGS},
+                 'problems': records.STRINGS,
+                 'specialities': records.STRINGS,
+                 'oddities': records.STRINGS,
+                 'institutions': records.ListOf({'name': str, 'weight': records.NUMBER,
+                                                 'type': records.OptionalField(str),
+                                                 'specializations': records.OptionalField(records.STRINGS)}),
+                 'taverns': {'guests': records.STRINGS, 'names': NAMES_SCHEMA, 'oddities': records.STRINGS,
+                             'specialities': records.STRINGS},
+                 'names': NAMES_SCHEMA},
+    'dungeons': {'sizes': records.ListOf({'name': str, 'weight': records.NUMBER, 'min_rooms': int,
+                                          'max_rooms': int}),
+                 'ages': AGES_SCHEMA,
+                 'purposes': WEIGHTED,
+                 'origins': {'creators': records.ListOf({'name': str, 'weight': records.NUMBER, 'manmade': bool}),
+                             'histories': records.STRINGS, 'reasons': records.STRINGS},
+                 'inhabitants': WEIGHTED,
+                 'entrances': WEIGHTED,
+                 'oddities': records.STRINGS,
+                 'rooms': {'types': records.ListOf({'name': str, 'weight': records.NUMBER, 'content_rolls': int}),
+                           'contents': records.ListOf({'name': str, 'weight': records.NUMBER, 'treasure_chance': int,
+                                                       'inhabited': bool, 'trapped': bool}),
+                           'treasures': records.ListOf({'name': str, 'weight': records.NUMBER, 'trap_chance': int,
+                                                        'simple_treasure_rolls': int,
+                                                        'valuable_treasure_rolls': int,
+                                                        'precious_treasure_rolls': int,
+                                                        'max_weight': records.OptionalField(records.NUMBER)}),
+                           'traps': records.ListOf({'name': str, 'weight': records.NUMBER, 'effect': str,
+                                                    'victim': str, 'effect_min': records.OptionalField(int),
+                                                    'effect_max': records.OptionalField(int)}),
+                           'entrances': records.ListOf({'number': str, 'weight': records.NUMBER}),
+                           'entrance_states': records.ListOf({'name': str, 'weight': records.NUMBER,
+                                                              'trapped': bool, 'status': str})}},
+    'fortresses': {'sizes': records.ListOf({'size': str, 'name': str, 'weight': records.NUMBER,
+                                            'min_garrison': int, 'max_garrison': int}),
+                   'ages': AGES_SCHEMA,
+                   'origins': {'creators': WEIGHTED, 'claims_to_fame': records.STRINGS,
+                               'histories': records.STRINGS,
+                               'conditions': records.ListOf({'name': str, 'weights': records.DictOf(records.NUMBER)}),
+                               'inhabitants': records.ListOf({'name': str, 'weights': records.DictOf(records.NUMBER),
+                                                              'roll_empty': records.OptionalField(bool),
+                                                              'roll_moved_in': records.OptionalField(bool)})},
+                   'empty': records.ListOf({'name': str, 'weight': records.NUMBER,
+                                            'min_amount': records.OptionalField(int),
+                                            'max_amount': records.OptionalField(int),
+                                            'monsters': records.OptionalField(records.STRINGS)}),
+                   'intruders': records.ListOf({'name': str, 'weight': records.NUMBER,
+                                                'single': records.OptionalField(str),
+                                                'amount': records.DictOf({'min_intruders': int,
+                                                                          'max_intruders': int}),
+                                                'roll_for_monster': records.OptionalField(bool)}),
+                   'oddities': records.STRINGS,
+                   'names': NAMES_SCHEMA}}
+CREATURE_DATA_SCHEMA = {'monsters': records.ListOf({'name': str, 'single': str, 'weight': records.NUMBER})}
+
+
+# Shortens runs of three or four of the same letter to two, e.g. 'Stennnäs' to 'Stennäs'
+def collapse_letters(name):
+    for c in name:
+        if c * 4 in name:
+            name = name.replace(f'{c*4}', c*2)
+        if c * 3 in name:
+            name = name.replace(f'{c*3}', c*2)
+    return name
 
 
-def create_village():
-    t1 = time.time()
+# Return every valid name of a place type, a beginning and an ending where neither is part of the other,
+# with the repeated letters collapsed
+def compile_place_names(names):
+    beginnings = list(dict.fromkeys(names['beginnings']))
+    endings = list(dict.fromkeys(names['endings']))
+    return tuple(collapse_letters(beginning + ending) for beginning in beginnings for ending in endings
+                 if beginning not in ending and ending not in beginning)
+
+
+# Return a dictionary of records by name, e.g. {'grotta': RoomType(name='grotta', ...)}
+def parse_records(record_type, data, **fields):
+    parsed = [records.make_record(record_type, item, **fields) for item in data]
+    return {record.name: record for record in parsed}
+
+
+# A shared sampler drawing the names of records by their weights
+def compile_sampler(weights):
+    return weighted_random.WeightedSampler(weights, frozen=True)
+
+
+def compile_record_sampler(parsed):
+    return compile_sampler({record.name: record.weight for record in parsed.values()})
+
+
+def build_tables(place_data, creature_data):
+    records.validate(place_data, PLACE_DATA_SCHEMA, 'place_data')
+    records.validate(creature_data, CREATURE_DATA_SCHEMA, 'creature_data')
+    villages = place_data['villages']
+    dungeons = place_data['dungeons']
+    fortresses = place_data['fortresses']
+    rooms = dungeons['rooms']
+
+    ages = {place_type: parse_records(AgeRange, place_data[place_type]['ages'])
+            for place_type in ('villages', 'dungeons', 'fortresses')}
+    village_sizes = parse_records(VillageSizeRange, villages['sizes'])
+    institutions = {item['name']: records.make_record(InstitutionType, item,
+                                                      specializations=records.interned_tuple(
+                                                          item.get('specializations')))
+                    for item in villages['institutions']}
+    dungeon_sizes = parse_records(DungeonSizeRange, dungeons['sizes'])
+    dungeon_creators = parse_records(DungeonCreator, dungeons['origins']['creators'])
+    fortress_sizes = {size['name']: Fortress_Size(name=records.intern_value(size['name']),
+                                                  size=records.intern_value(size['size']),
+                                                  min_garrison=size['min_garrison'], max_garrison=size['max_garrison'])
+                      for size in fortresses['sizes']}
+    conditions = fortresses['origins']['conditions']
+    inhabitants = {item['name']: records.make_record(FortressInhabitants, item,
+                                                     roll_empty=bool(item.get('roll_empty')),
+                                                     roll_moved_in=bool(item.get('roll_moved_in')))
+                   for item in fortresses['origins']['inhabitants']}
+    empties = parse_records(FortressEmpty, fortresses['empty'])
+    intruders = {item['name']: records.make_record(Intruder, item,
+                                                   roll_for_monster=bool(item.get('roll_for_monster')))
+                 for item in fortresses['intruders']}
+    room_types = parse_records(RoomType, rooms['types'])
+    room_contents = parse_records(RoomContent, rooms['contents'])
+    room_treasures = parse_records(RoomTreasure, rooms['treasures'])
+    room_traps = parse_records(RoomTrap, rooms['traps'])
+    room_doors = {door['number']: door['weight'] for door in rooms['entrances']}
+    room_door_states = parse_records(DoorState, rooms['entrance_states'])
+    room_monsters = {monster['name']: monster['weight'] for monster in dungeons['inhabitants']}
+    monsters = parse_records(Monster, creature_data['monsters'])
+
+    taverns = villages['taverns']
+
+    return {'AGES': ages,
+            'AGE_SAMPLERS': {place_type: compile_record_sampler(place_ages) for place_type, place_ages in ages.items()},
+            'VILLAGE_SIZES': village_sizes,
+            'VILLAGE_SIZE_SAMPLER': compile_record_sampler(village_sizes),
+            'INSTITUTIONS': institutions,
+            'INSTITUTION_SAMPLER': compile_record_sampler(institutions),
+            'DUNGEON_SIZES': dungeon_sizes,
+            'DUNGEON_SIZE_SAMPLER': compile_record_sampler(dungeon_sizes),
+            'DUNGEON_CREATORS': dungeon_creators,
+            'DUNGEON_CREATOR_SAMPLER': compile_record_sampler(dungeon_creators),
+            'PURPOSE_SAMPLER': compile_sampler({purpose['name']: purpose['weight']
+                                                for purpose in dungeons['purposes']}),
+            'ENTRANCE_SAMPLER': compile_sampler({entrance['name']: entrance['weight']
+                                                 for entrance in dungeons['entrances']}),
+            'FORTRESS_SIZES': fortress_sizes,
+            'FORTRESS_SIZE_SAMPLER': compile_sampler({size['name']: size['weight'] for size in fortresses['sizes']}),
+            'FORTRESS_CREATOR_SAMPLER': compile_sampler({creator['name']: creator['weight']
+                                                         for creator in fortresses['origins']['creators']}),
+            # The condition of a fortress depends on its age, and who lives there on its condition
+            'CONDITION_SAMPLERS': {age: compile_sampler({condition['name']: condition['weights'][age]
+                                                         for condition in conditions})
+                                   for age in ages['fortresses']},
+            'FORTRESS_INHABITANTS': inhabitants,
+            'INHABITANT_SAMPLERS': {condition['name']: compile_sampler({name: inhabitant.weights[condition['name']]
+                                                                        for name, inhabitant in inhabitants.items()})
+                                    for condition in conditions},
+            'FORTRESS_EMPTIES': empties,
+            'EMPTY_SAMPLER': compile_record_sampler(empties),
+            'INTRUDERS': intruders,
+            'INTRUDER_SAMPLER': compile_record_sampler(intruders),
+            'ROOM_TYPES': room_types,
+            'ROOM_TYPE_SAMPLER': compile_record_sampler(room_types),
+            'ROOM_CONTENTS': room_contents,
+            'ROOM_CONTENT_SAMPLER': compile_record_sampler(room_contents),
+            'ROOM_TREASURES': room_treasures,
+            'ROOM_TREASURE_SAMPLER': compile_record_sampler(room_treasures),
+            'ROOM_TRAPS': room_traps,
+            'ROOM_TRAP_SAMPLER': compile_record_sampler(room_traps),
+            'ROOM_DOORS': room_doors,
+            'ROOM_DOOR_SAMPLER': compile_sampler(room_doors),
+            'ROOM_DOOR_STATES': room_door_states,
+            'DOOR_STATE_SAMPLER': compile_record_sampler(room_door_states),
+            'ROOM_MONSTERS': room_monsters,
+            'ROOM_MONSTER_SAMPLER': compile_sampler(room_monsters),
+            'MONSTERS': monsters,
+            'MONSTER_SAMPLER': compile_record_sampler(monsters),
+            'PLACE_NAMES': {place_type: compile_place_names(place_data[place_type]['names'])
+                            for place_type in ('villages', 'fortresses')},
+            'VILLAGE_TEXTS': VillageTexts(leader_oddities=records.interned_tuple(villages['leaders']['oddities']),
+                                          leader_types=records.interned_tuple(villages['leaders']['types']),
+                                          problems=records.interned_tuple(villages['problems']),
+                                          specialities=records.interned_tuple(villages['specialities']),
+                                          oddities=records.interned_tuple(villages['oddities'])),
+            'TAVERN_TEXTS': TavernTexts(name_beginnings=records.interned_tuple(taverns['names']['beginnings']),
+                                        name_endings=records.interned_tuple(taverns['names']['endings']),
+                                        oddities=records.interned_tuple(taverns['oddities']),
+                                        specialities=records.interned_tuple(taverns['specialities']),
+                                        guests=records.interned_tuple(taverns['guests'])),
+            'DUNGEON_TEXTS': DungeonTexts(reasons=records.interned_tuple(dungeons['origins']['reasons']),
+                                          histories=records.interned_tuple(dungeons['origins']['histories']),
+                                          oddities=records.interned_tuple(dungeons['oddities'])),
+            'FORTRESS_TEXTS': FortressTexts(
+                claims_to_fame=records.interned_tuple(fortresses['origins']['claims_to_fame']),
+                histories=records.interned_tuple(fortresses['origins']['histories']),
+                oddities=records.interned_tuple(fortresses['oddities']))}
+
+
+# Static tables, loaded from place_data.json and creature_data.json (or a snapshot of them) on first use
+tables = data_loader.register('placegen', build_tables, 'place_data.json', 'creature_data.json')
+
+
+# Module level access to the tables, e.g. placegen.ROOM_TYPES
+def __getattr__(name):
+    return getattr(tables, name)
+
+
+# Every generator takes a seed, an int or any other key such as ('village', 3, 4), to draw from a private rng
+# instead of rng, the same seed always gives the same place
+@data_loader.consistent
+def create_village(rng=random, seed=None):
+    if seed is not None:
+        rng = weighted_random.get_rng(seed)
+    timed = metrics.enabled
+    if timed:
+        t1 = time.perf_counter()
+
+    texts = tables.VILLAGE_TEXTS
+    tavern_texts = tables.TAVERN_TEXTS
 
     def create_tavern():
-        tavern_oddity = random.choice(place_data['villages']['taverns']['oddities'])
-        tavern_speciality = random.choice(place_data['villages']['taverns']['specialities'])
-        tavern_guest = random.choice(place_data['villages']['taverns']['guests'])
+        tavern_oddity = rng.choice(tavern_texts.oddities)
+        tavern_speciality = rng.choice(tavern_texts.specialities)
+        tavern_guest = rng.choice(tavern_texts.guests)
 
-        ampersand = random.choice([True, False])
+        ampersand = rng.choice([True, False])
         if ampersand:
-            first, second = random.sample(place_data["villages"]["taverns"]["names"]["endings"], k=2)
+            first, second = rng.sample(tavern_texts.name_endings, k=2)
             tavern_name = f'{first}' \
                           f' & ' \
                           f'{second}'
         else:
-            tavern_name = f'{random.choice(place_data["villages"]["taverns"]["names"]["beginnings"])}' \
+            tavern_name = f'{rng.choice(tavern_texts.name_beginnings)}' \
                           f' ' \
-                          f'{random.choice(place_data["villages"]["taverns"]["names"]["endings"])}'
+                          f'{rng.choice(tavern_texts.name_endings)}'
         return Tavern(name=tavern_name, oddity=tavern_oddity, speciality=tavern_speciality,
                       guest=tavern_guest, type='tavern')
 
-    sizes = {size['name']: size for size in place_data['villages']['sizes']}
-    size_weights = {size['name']: size['weight'] for size in sizes.values()}
-    place_size = sizes[weighted_random.weighted_random_choice(size_weights)]
-    place_population = random.randint(place_size['min_population'], place_size['max_population'])
+    place_size = tables.VILLAGE_SIZES[tables.VILLAGE_SIZE_SAMPLER.choice(rng)]
+    place_population = rng.randint(place_size.min_population, place_size.max_population)
 
-    place_age = get_age('villages')
+    place_age = get_age('villages', rng)
 
-    place_leader = random.choice(place_data['villages']['leaders']['oddities']) + " " + \
-                   random.choice(place_data['villages']['leaders']['types'])
+    place_leader = rng.choice(texts.leader_oddities) + " " + \
+                   rng.choice(texts.leader_types)
 
-    place_problem = random.choice(place_data['villages']['problems'])
-    place_speciality = random.choice(place_data['villages']['specialities'])
-    place_oddity = random.choice(place_data['villages']['oddities'])
+    place_problem = rng.choice(texts.problems)
+    place_speciality = rng.choice(texts.specialities)
+    place_oddity = rng.choice(texts.oddities)
 
     institutions = []
-    institution_weights = {inst['name']: inst['weight'] for inst in place_data['villages']['institutions']}
-    number_of_institutions = random.randint(place_size['min_institutions'], place_size['max_institutions'])
+    number_of_institutions = rng.randint(place_size.min_institutions, place_size.max_institutions)
     for _ in range(number_of_institutions):
-        all_institutions = {inst['name']: inst for inst in place_data['villages']['institutions']}
-        institution = all_institutions[weighted_random.weighted_random_choice(institution_weights)]
+        institution = tables.INSTITUTIONS[tables.INSTITUTION_SAMPLER.choice(rng)]
 
-        if institution.get('type') == "tavern":
+        if institution.type == "tavern":
             institutions.append(create_tavern())
-        elif institution.get('type'):
-            if institution.get('specializations'):
-                institution_name = f'{institution["name"]} ({random.choice(institution.get("specializations"))})'
+        elif institution.type:
+            if institution.specializations:
+                institution_name = f'{institution.name} ({rng.choice(institution.specializations)})'
             else:
-                institution_name = institution['name']
-            institutions.append(Institution(name=institution_name, type=institution['type']))
+                institution_name = institution.name
+            institutions.append(Institution(name=institution_name, type=institution.type))
 
 
-    place_name = get_name('villages')
-    place_size = Village_Size(name=place_size['name'], population=place_population)
+    place_name = get_name('villages', rng)
+    place_size = Village_Size(name=place_size.name, population=place_population)
 
     village = Village(type='village', name=place_name, age=place_age, size=place_size, leader=place_leader,
                       problem=place_problem, speciality=place_speciality, oddity=place_oddity,
                       institutions=institutions)
-    t2 = time.time() - t1
-    print(f'village generated in {t2*1000} ms')
+    if timed:
+        metrics.observe_generator('create_village', time.perf_counter() - t1)
     return village
 
 
-def create_dungeon():
-    t1 = time.time()
+@data_loader.consistent
+def create_dungeon(rng=random, seed=None):
+    if seed is not None:
+        rng = weighted_random.get_rng(seed)
+    timed = metrics.enabled
+    if timed:
+        t1 = time.perf_counter()
+
+    texts = tables.DUNGEON_TEXTS
 
-    size_weights = {size['name']: size['weight'] for size in place_data['dungeons']['sizes']}
-    place_size = weighted_random.weighted_random_choice(size_weights)
-    place_rooms = [random.randint(size['min_rooms'], size['max_rooms']) for size in
-                   place_data['dungeons']['sizes'] if size['name'] == place_size][0]
-    place_size = Dungeon_Size(name=place_size, rooms=place_rooms)
+    place_size = tables.DUNGEON_SIZES[tables.DUNGEON_SIZE_SAMPLER.choice(rng)]
+    place_size = Dungeon_Size(name=place_size.name, rooms=rng.randint(place_size.min_rooms, place_size.max_rooms))
 
-    place_age = get_age('dungeons')
+    place_age = get_age('dungeons', rng)
 
-    creators = {creator['name']: creator for creator in place_data['dungeons']['origins']['creators']}
-    creator_weights = {creator['name']: creator['weight'] for creator in creators.values()}
-    place_creators = creators[weighted_random.weighted_random_choice(creator_weights)]
+    place_creators = tables.DUNGEON_CREATORS[tables.DUNGEON_CREATOR_SAMPLER.choice(rng)]
 
-    if place_creators['manmade']:
-        purpose_weights = {purpose['name']: purpose['weight'] for purpose in place_data['dungeons']['purposes']}
-        place_purpose = weighted_random.weighted_random_choice(purpose_weights)
-        creator_reason = random.choice(place_data['dungeons']['origins']['reasons'])
-        creator_history = random.choice(place_data['dungeons']['origins']['histories'])
+    if place_creators.manmade:
+        place_purpose = tables.PURPOSE_SAMPLER.choice(rng)
+        creator_reason = rng.choice(texts.reasons)
+        creator_history = rng.choice(texts.histories)
     else:
         place_purpose = ""
         creator_reason = ""
         creator_history = ""
 
-    place_origin = Origin(creator=place_creators['name'], purpose=place_purpose, reason=creator_reason,
+    place_origin = Origin(creator=place_creators.name, purpose=place_purpose, reason=creator_reason,
                           history=creator_history)
 
-    entrance_weights = {entrance['name']: entrance['weight'] for entrance in place_data['dungeons']['entrances']}
-    place_entrance = weighted_random.weighted_random_choice(entrance_weights)
+    place_entrance = tables.ENTRANCE_SAMPLER.choice(rng)
 
-    place_oddity = random.choice(place_data['dungeons']['oddities'])
+    place_oddity = rng.choice(texts.oddities)
 
     dungeon = Dungeon(type='dungeon', age=place_age, size=place_size, entrance=place_entrance, origin=place_origin,
                       oddity=place_oddity)
 
-    t2 = time.time() - t1
-    print(f'dungeon generated in {t2*1000} ms')
+    if timed:
+        metrics.observe_generator('create_dungeon', time.perf_counter() - t1)
 
     return dungeon
 
 
-def create_fortress():
-    t1 = time.time()
+@data_loader.consistent
+def create_fortress(rng=random, seed=None):
+    if seed is not None:
+        rng = weighted_random.get_rng(seed)
+    timed = metrics.enabled
+    if timed:
+        t1 = time.perf_counter()
 
-    place_age = get_age('fortresses')
+    texts = tables.FORTRESS_TEXTS
 
-    sizes = {size['name']: size for size in place_data['fortresses']['sizes']}
-    size_weights = {size['name']: size['weight'] for size in sizes.values()}
-    place_size = sizes[weighted_random.weighted_random_choice(size_weights)]
-    place_size = Fortress_Size(name=place_size['name'], size=place_size['size'],
-                               min_garrison=place_size['min_garrison'],
-                               max_garrison=place_size['max_garrison'])
+    place_age = get_age('fortresses', rng)
 
-    creators = {creator['name']: creator for creator in place_data['fortresses']['origins']['creators']}
-    creator_weights = {creator['name']: creator['weight'] for creator in creators.values()}
-    place_creators = weighted_random.weighted_random_choice(creator_weights)
-    creator_claim_to_fame = random.choice(place_data['fortresses']['origins']['claims_to_fame'])
+    place_size = tables.FORTRESS_SIZES[tables.FORTRESS_SIZE_SAMPLER.choice(rng)]
 
-    purpose_weights = {purpose['name']: purpose['weight'] for purpose in place_data['dungeons']['purposes']}
-    place_purpose = weighted_random.weighted_random_choice(purpose_weights)
+    place_creators = tables.FORTRESS_CREATOR_SAMPLER.choice(rng)
+    creator_claim_to_fame = rng.choice(texts.claims_to_fame)
 
-    conditions = {condition['name']: condition for condition in place_data['fortresses']['origins']['conditions']}
-    condition_weights = {condition['name']: condition['weights'][place_age.name] for condition in conditions.values()}
-    place_condition = weighted_random.weighted_random_choice(condition_weights)
+    place_purpose = tables.PURPOSE_SAMPLER.choice(rng)
 
-    place_history = random.choice(place_data['fortresses']['origins']['histories'])
+    place_condition = tables.CONDITION_SAMPLERS[place_age.name].choice(rng)
 
-    inhabiteds = {result['name']: result for result in place_data['fortresses']['origins']['inhabitants']}
-    inhabited_weights = {result['name']: result['weights'][place_condition] for result in inhabiteds.values()}
-    place_inhabited = inhabiteds[weighted_random.weighted_random_choice(inhabited_weights)]
+    place_history = rng.choice(texts.histories)
 
-    if place_inhabited.get('roll_empty'):
-        empties = {empty['name']: empty for empty in place_data['fortresses']['empty']}
-        empty_weights = {empty['name']: empty['weight'] for empty in empties.values()}
-        empty = empties[weighted_random.weighted_random_choice(empty_weights)]
-        if empty.get('min_amount') and empty.get('max_amount'):
-            amount = random.randint(empty['min_amount'], empty['max_amount'])
-            place_inhabited = empty['name'].replace('{{ amount }}', str(amount))
-        elif empty.get('monsters'):
-            monster = random.choice(empty['monsters'])
-            place_inhabited = empty['name'].replace('{{ monster }}', monster)
+    place_inhabited = tables.FORTRESS_INHABITANTS[tables.INHABITANT_SAMPLERS[place_condition].choice(rng)]
+
+    if place_inhabited.roll_empty:
+        empty = tables.FORTRESS_EMPTIES[tables.EMPTY_SAMPLER.choice(rng)]
+        if empty.min_amount and empty.max_amount:
+            amount = rng.randint(empty.min_amount, empty.max_amount)
+            place_inhabited = empty.name.replace('{{ amount }}', str(amount))
+        elif empty.monsters:
+            monster = rng.choice(empty.monsters)
+            place_inhabited = empty.name.replace('{{ monster }}', monster)
         else:
-            place_inhabited = place_inhabited['name']
-    elif place_inhabited.get('roll_moved_in'):
-        intruders = {intruder['name']: intruder for intruder in place_data['fortresses']['intruders']}
-        intruder_weights = {intruder['name']: intruder['weight'] for intruder in intruders.values()}
-        intruders = intruders[weighted_random.weighted_random_choice(intruder_weights)]
-
-        if intruders.get('roll_for_monster'):
-            monsters = {monster['name']: monster for monster in creature_data['monsters']}
-            monster_weights = {monster['name']: monster['weight'] for monster in monsters.values()}
-            monster = monsters[weighted_random.weighted_random_choice(monster_weights)]
-            place_inhabited = place_inhabited['name'].replace('{{ amount }} {{ intruder }}',
-                                                              f'{monster["single"]} {monster["name"]}')
+            place_inhabited = place_inhabited.name
+    elif place_inhabited.roll_moved_in:
+        intruders = tables.INTRUDERS[tables.INTRUDER_SAMPLER.choice(rng)]
+
+        if intruders.roll_for_monster:
+            monster = tables.MONSTERS[tables.MONSTER_SAMPLER.choice(rng)]
+            place_inhabited = place_inhabited.name.replace('{{ amount }} {{ intruder }}',
+                                                           f'{monster.single} {monster.name}')
         else:
-            amount = random.randint(intruders['amount'][place_size.size]['min_intruders'],
-                                    intruders['amount'][place_size.size]['max_intruders'])
+            amount = rng.randint(intruders.amount[place_size.size]['min_intruders'],
+                                 intruders.amount[place_size.size]['max_intruders'])
             if amount == 1:
-                place_inhabited = place_inhabited['name'].replace('{{ amount }} {{ intruder }}',
-                                                                  f'{intruders.get("single")}')
+                place_inhabited = place_inhabited.name.replace('{{ amount }} {{ intruder }}',
+                                                               f'{intruders.single}')
             else:
-                place_inhabited = place_inhabited['name'].replace('{{ amount }} {{ intruder }}',
-                                                                  f'{amount} {intruders["name"]}')
+                place_inhabited = place_inhabited.name.replace('{{ amount }} {{ intruder }}',
+                                                               f'{amount} {intruders.name}')
     else:
-        place_inhabited = place_inhabited['name']
+        place_inhabited = place_inhabited.name
 
-    place_oddity = random.choice(place_data['fortresses']['oddities'])
+    place_oddity = rng.choice(texts.oddities)
 
     place_creators = f'{place_creators} känd för {creator_claim_to_fame}'
-    place_name = get_name('fortresses')
+    place_name = get_name('fortresses', rng)
 
     fortress = Fortress(type='fortress', name=place_name, age=place_age, size=place_size, creator=place_creators,
                         purpose=place_purpose, history=place_history, condition=place_condition,
                         inhabitants=place_inhabited, oddity=place_oddity)
 
-    t2 = time.time() - t1
-    print(f'fortress generated in {t2*1000} ms')
+    if timed:
+        metrics.observe_generator('create_fortress', time.perf_counter() - t1)
 
     return fortress
 
 
-ROOM_TYPES = {type['name']: type for type in place_data['dungeons']['rooms']['types']}
-ROOM_CONTENTS = {content['name']: content for content in place_data['dungeons']['rooms']['contents']}
-ROOM_TREASURES = {treasure['name']: treasure for treasure in place_data['dungeons']['rooms']['treasures']}
-ROOM_TRAPS = {trap['name']: trap for trap in place_data['dungeons']['rooms']['traps']}
-ROOM_DOORS = {door['number']: door['weight'] for door in place_data['dungeons']['rooms']['entrances']}
-ROOM_DOOR_STATES = {state['name']: state for state in place_data['dungeons']['rooms']['entrance_states']}
-ROOM_MONSTERS = {monster['name']: monster['weight'] for monster in place_data['dungeons']['inhabitants']}
+# Draws the type and the number of doors of a room, the first draws of create_room
+def roll_room_layout(rng=random):
+    room_type = tables.ROOM_TYPES[tables.ROOM_TYPE_SAMPLER.choice(rng)]
+    door_amount = int(tables.ROOM_DOOR_SAMPLER.choice(rng))
+    return room_type, door_amount
+
 
+@data_loader.consistent
+def create_room(rng=random, seed=None):
+    if seed is not None:
+        rng = weighted_random.get_rng(seed)
+    timed = metrics.enabled
+    if timed:
+        t1 = time.perf_counter()
 
-def create_room():
     def roll_door():
-        state = ROOM_DOOR_STATES[weighted_random.weighted_random_choice(door_weights)]
+        state = tables.ROOM_DOOR_STATES[tables.DOOR_STATE_SAMPLER.choice(rng)]
         trap = None
-        if state.get('trapped'):
+        if state.trapped:
             trap = roll_trap()
-        return Door(name=state.get('name'), trap=trap, status=state.get('status'))
+        return Door(name=state.name, trap=trap, status=state.status)
 
     def roll_treasure():
-        treasure_weights = {treasure['name']: treasure['weight'] for treasure in ROOM_TREASURES.values()}
-        treasure = ROOM_TREASURES[weighted_random.weighted_random_choice(treasure_weights)]
+        treasure = tables.ROOM_TREASURES[tables.ROOM_TREASURE_SAMPLER.choice(rng)]
         trap = None
-        if 0 < treasure.get('trap_chance') <= random.randint(1, 6):
+        if 0 < treasure.trap_chance <= rng.randint(1, 6):
             trap = roll_trap()
 
-        items = []
-        max_weight = treasure.get('max_weight')
+        max_weight = treasure.max_weight
         if max_weight is None:
             max_weight = 100
-        for _ in range(0, treasure.get('simple_treasure_rolls')):
-            items.append(itemgen.generate_item(['any'], item_value='cheap', max_weight=max_weight))
-        for _ in range(0, treasure.get('valuable_treasure_rolls')):
-            items.append(itemgen.generate_item(['weapon', 'armor', 'treasure'], item_value='valuable', max_weight=max_weight))
-        for _ in range(0, treasure.get('precious_treasure_rolls')):
-            items.append(itemgen.generate_item(['weapon', 'armor', 'treasure'], item_value='precious', max_weight=max_weight))
+        requests = ([(SIMPLE_TREASURE_TYPES, 'cheap', max_weight)] * treasure.simple_treasure_rolls +
+                    [(VALUABLE_TREASURE_TYPES, 'valuable', max_weight)] * treasure.valuable_treasure_rolls +
+                    [(VALUABLE_TREASURE_TYPES, 'precious', max_weight)] * treasure.precious_treasure_rolls)
+        items = itemgen.generate_items(requests, rng=rng)
 
-        return Treasure(name=treasure.get('name'), contents=items, trap=trap)
+        return Treasure(name=treasure.name, contents=items, trap=trap)
 
     def roll_trap():
-        trap_weights = {trap['name']: trap['weight'] for trap in ROOM_TRAPS.values()}
-        trap = ROOM_TRAPS[weighted_random.weighted_random_choice(trap_weights)]
-        trap_effect = trap.get('effect')
-        if trap.get('effect_min'):
-            trap_effect = trap.get('effect').replace('{{ effect }}', str(random.randint(trap.get('effect_min'),
-                                                                                        trap.get('effect_max'))))
-        return Trap(name=trap.get('name'),
+        trap = tables.ROOM_TRAPS[tables.ROOM_TRAP_SAMPLER.choice(rng)]
+        trap_effect = trap.effect
+        if trap.effect_min:
+            trap_effect = trap.effect.replace('{{ effect }}', str(rng.randint(trap.effect_min, trap.effect_max)))
+        return Trap(name=trap.name,
                     effect=trap_effect,
-                    victim=trap.get('victim'))
+                    victim=trap.victim)
 
-    type_weights = {type['name']: type['weight'] for type in ROOM_TYPES.values()}
-    room_type = ROOM_TYPES[weighted_random.weighted_random_choice(type_weights)]
-    door_amount = int(weighted_random.weighted_random_choice(ROOM_DOORS))
-    door_weights = {state['name']: state['weight'] for state in ROOM_DOOR_STATES.values()}
+    room_type, door_amount = roll_room_layout(rng)
 
     doors = []
     for _ in range(0, door_amount):
         doors.append(roll_door())
 
-    content_weights = {content['name']: content['weight'] for content in ROOM_CONTENTS.values()}
-
     treasure = []
     traps = []
     monsters = []
 
-    if room_type.get('content_rolls') > 0:
-        for _ in range(0, room_type.get('content_rolls')):
-            room_content = ROOM_CONTENTS[weighted_random.weighted_random_choice(content_weights)]
+    if room_type.content_rolls > 0:
+        for _ in range(0, room_type.content_rolls):
+            room_content = tables.ROOM_CONTENTS[tables.ROOM_CONTENT_SAMPLER.choice(rng)]
 
-            roll = random.randint(1, 6)
-            if room_content.get('treasure_chance') >= roll:
+            roll = rng.randint(1, 6)
+            if room_content.treasure_chance >= roll:
                 treasure.append(roll_treasure())
 
-            if room_content.get('trapped'):
+            if room_content.trapped:
                 traps.append(roll_trap())
 
-            if room_content.get('inhabited'):
-                monsters.append(weighted_random.weighted_random_choice(ROOM_MONSTERS))
+            if room_content.inhabited:
+                monsters.append(tables.ROOM_MONSTER_SAMPLER.choice(rng))
 
-    return Room(type=room_type.get('name'),
+    room = Room(type=room_type.name,
                 doors=doors,
-                traps=list(set(traps)),
+                traps=list(dict.fromkeys(traps)),
                 treasures=treasure,
-                monsters=list(set(monsters)),
-                oddity=random.choice(place_data['dungeons']['oddities']))
-
-
-def get_age(place_type):
-    age_weights = {age['name']: age['weight'] for age in place_data[place_type]['ages']}
-    place_age = weighted_random.weighted_random_choice(age_weights)
-    place_years = [random.randint(age['min_age'], age['max_age']) for age in
-                   place_data[place_type]['ages'] if age['name'] == place_age][0]
-    place_age = Age(name=place_age, years=place_years)
-    return place_age
-
-
-def get_name(place_type):
-    def generate_name():
-        name_beg = random.choice(list(set(place_data[place_type]['names']['beginnings'])))
-        name_end = random.choice(list(set(place_data[place_type]['names']['endings'])))
-        while name_beg in name_end or name_end in name_beg:
-            name_beg = random.choice(list(set(place_data[place_type]['names']['beginnings'])))
-            name_end = random.choice(list(set(place_data[place_type]['names']['endings'])))
-        return name_beg + name_end
-    name = generate_name()
-    for c in name:
-        if c * 4 in name:
-            name = name.replace(f'{c*4}', c*2)
-        if c * 3 in name:
-            name = name.replace(f'{c*3}', c*2)
-    return name
+                monsters=list(dict.fromkeys(monsters)),
+                oddity=rng.choice(tables.DUNGEON_TEXTS.oddities))
+
+    if timed:
+        metrics.observe_generator('create_room', time.perf_counter() - t1)
+
+    return room
+
+
+# Derive the seed of a part of a streamed dungeon, the dungeon itself or one of its rooms, the same way every
+# seeded generator derives its rng from a key
+# every room has its own seed, so any room can be generated without generating the rooms before it
+def get_dungeon_seed(seed, part, number=None):
+    return weighted_random.get_seed((part, seed, number))
+
+
+def get_room_rng(seed, number):
+    return random.Random(get_dungeon_seed(seed, 'room', number))
+
+
+# The number of doors of a room of a streamed dungeon, only the layout of the room is drawn
+def get_door_count(seed, number):
+    return roll_room_layout(get_room_rng(seed, number))[1]
+
+
+# Whether a room of a streamed dungeon is connected to the room after it: the rooms form a corridor in which
+# every room but the first keeps its first door for the room before it, so a room leads on to the next one when it
+# has a door left for it and the next one has a door at all, and a room without doors ends the corridor
+def leads_on(number, doors, next_doors):
+    return next_doors > 0 and doors > (0 if number == 0 else 1)
+
+
+# The exits of a room of a streamed dungeon, its connections come first and its other doors are dead ends
+# only the door counts of the room and its two neighbours are needed, so any room is connected in constant time
+def get_room_exits(seed, number, rooms, doors):
+    exits = []
+    if number > 0 and leads_on(number - 1, get_door_count(seed, number - 1), doors):
+        exits.append(number - 1)
+    if number + 1 < rooms and leads_on(number, doors, get_door_count(seed, number + 1)):
+        exits.append(number + 1)
+    return tuple(exits) + (None,) * (doors - len(exits))
+
+
+def get_dungeon_header(seed, rooms=None):
+    dungeon = create_dungeon(rng=random.Random(get_dungeon_seed(seed, 'dungeon')))
+    if rooms is not None:
+        dungeon = dungeon._replace(size=dungeon.size._replace(rooms=rooms))
+    return dungeon
+
+
+def iterate_rooms(seed, rooms, connect=False):
+    for number in range(rooms):
+        yield get_streamed_room(seed, number, rooms, connect)
+
+
+# Every room is generated as one request, so a reload of the tables takes effect between two rooms, never within one
+@data_loader.consistent
+def get_streamed_room(seed, number, rooms, connect):
+    room = create_room(rng=get_room_rng(seed, number))
+    exits = get_room_exits(seed, number, rooms, len(room.doors)) if connect else None
+    return Dungeon_Room(number=number, room=room, exits=exits)
+
+
+# Generate a whole dungeon whose rooms are yielded one at a time, so even a huge dungeon can be written out
+# room by room without keeping the rooms (and the items of their treasures) in memory
+# rooms overrides the number of rooms drawn for the dungeon size, connect adds the exits of every room
+# the stream is not pinned to the tables it started with: each room is built from the tables loaded when it is
+# yielded, so the rooms after a data_loader.reload() (and get_dungeon_room) come from the reloaded sources
+@data_loader.consistent
+def create_streamed_dungeon(seed=None, rooms=None, connect=False):
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    dungeon = get_dungeon_header(seed, rooms)
+    return Streamed_Dungeon(seed=seed, dungeon=dungeon,
+                            rooms=iterate_rooms(seed, dungeon.size.rooms, connect))
+
+
+# Generate a single room of a streamed dungeon again, the same room as the one streamed with the same arguments
+# as long as the tables were not reloaded in between
+@data_loader.consistent
+def get_dungeon_room(seed, number, rooms=None, connect=False):
+    if rooms is None:
+        rooms = get_dungeon_header(seed).size.rooms
+    if not 0 <= number < rooms:
+        raise IndexError(f'the dungeon has no room {number}, it has {rooms} rooms')
+    return get_streamed_room(seed, number, rooms, connect)
+
+
+def get_age(place_type, rng=random):
+    age = tables.AGES[place_type][tables.AGE_SAMPLERS[place_type].choice(rng)]
+    return Age(name=age.name, years=rng.randint(age.min_age, age.max_age))
+
+
+def get_name(place_type, rng=random):
+    return rng.choice(tables.PLACE_NAMES[place_type])
 
 
 place_types = {'village': create_village, 'dungeon': create_dungeon, 'fortress': create_fortress}
 
 
-def create_place(create_place_type=None):
+@data_loader.consistent
+def create_place(create_place_type=None, rng=random, seed=None):
+    if seed is not None:
+        rng = weighted_random.get_rng(seed)
     if create_place_type:
-        return place_types[create_place_type]()
-    place_type = random.choice([place_type for place_type in place_types.values()])
-    return place_type()
+        return place_types[create_place_type](rng=rng)
+    place_type = rng.choice([place_type for place_type in place_types.values()])
+    return place_type(rng=rng)
 
 
 """room = create_room()
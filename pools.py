@@ -0,0 +1,179 @@
+import random
+import threading
+from collections import deque
+from collections import namedtuple
+
+from . import chargen
+from . import data_loader
+from . import itemgen
+from . import placegen
+
+# Pools of pre-generated content, so interactive use gets a generated record at once instead of waiting for it
+# every key has its own pool, e.g. ('item', 'precious', 'weapon') or ('character', 'alv', None), filled up to its size
+# by a background thread and refilled whenever it drops to its low-water mark
+# a request that finds its pool empty is generated on the spot and counted as a miss
+
+DEFAULT_POOL_SIZE = 32
+# The share of its size a pool can drop to before it is refilled
+DEFAULT_LOW_WATER = 0.5
+
+PoolStats = namedtuple('PoolStats', 'hits misses size capacity')
+
+
+# Returns the generator of a pool key, called with the rng of the pool
+# ('item', item_value, item_type), ('place', place_type or None), ('room',) or ('character', kin, profession)
+def get_generator(key):
+    kind = key[0]
+    if kind == 'item':
+        _, item_value, item_type = key
+        return lambda rng: itemgen.generate_item([item_type], item_value, rng=rng)
+    if kind == 'place':
+        _, place_type = key
+        return lambda rng: placegen.create_place(place_type, rng=rng)
+    if kind == 'room':
+        return lambda rng: placegen.create_room(rng=rng)
+    if kind == 'character':
+        _, kin, profession = key
+        return lambda rng: chargen.generate_character(kin, profession, rng=rng)
+    raise ValueError(f'unknown pool kind {kind!r}, expected item, place, room or character')
+
+
+# refilling is tested and set under the lock by the requests and the background thread, so a request that drains the
+# pool can not miss the background thread stopping the refill of the same pool
+class Pool:
+    __slots__ = ('generate', 'size', 'low_water', 'records', 'hits', 'misses', 'refilling', 'lock')
+
+    def __init__(self, key, size, low_water):
+        self.generate = get_generator(key)
+        self.size = size
+        self.low_water = low_water
+        self.records = deque()
+        self.hits = 0
+        self.misses = 0
+        self.refilling = True
+        self.lock = threading.Lock()
+
+
+class ContentPools:
+    # sizes maps pool keys to their sizes, pools of other keys are added with default_size when first requested
+    def __init__(self, sizes=None, default_size=DEFAULT_POOL_SIZE, low_water=DEFAULT_LOW_WATER, seed=None):
+        self.default_size = default_size
+        self.low_water = low_water
+        self.pools = {}
+        # Guards the pools dictionary, which requests add to while the background thread goes through it
+        self.lock = threading.RLock()
+        # The background thread and the requests that miss draw from their own random streams
+        self.rng = random.Random(seed)
+        self.miss_rng = random.Random(self.rng.getrandbits(64))
+        self.wanted = threading.Event()
+        self.stopping = False
+        self.thread = None
+        for key, size in (sizes or {}).items():
+            self.add(key, size)
+
+    def add(self, key, size=None, low_water=None):
+        size = self.default_size if size is None else size
+        low_water = self.low_water if low_water is None else low_water
+        pool = Pool(key, size, int(size * low_water))
+        with self.lock:
+            self.pools[key] = pool
+        self.wanted.set()
+        return pool
+
+    # Returns a record of a pool key, from its pool if there is one ready
+    def get(self, key):
+        pool = self.pools.get(key)
+        if pool is None:
+            with self.lock:
+                pool = self.pools.get(key)
+                if pool is None:
+                    pool = self.add(key)
+        try:
+            record = pool.records.popleft()
+            hit = True
+        except IndexError:
+            record = pool.generate(self.miss_rng)
+            hit = False
+        with pool.lock:
+            if hit:
+                pool.hits += 1
+            else:
+                pool.misses += 1
+            wanted = len(pool.records) <= pool.low_water and not pool.refilling
+            if wanted:
+                pool.refilling = True
+        if wanted:
+            self.wanted.set()
+        return record
+
+    def get_item(self, item_value='cheap', item_type='any'):
+        return self.get(('item', item_value, item_type))
+
+    def get_place(self, place_type=None):
+        return self.get(('place', place_type))
+
+    def get_room(self):
+        return self.get(('room',))
+
+    def get_character(self, kin=None, profession=None):
+        return self.get(('character', kin, profession))
+
+    # Generates one record for every pool that is being refilled, and stops refilling the full ones
+    # returns whether any pool still needs more
+    def refill(self):
+        wanted = False
+        with self.lock:
+            pools = list(self.pools.values())
+        for pool in pools:
+            if not pool.refilling:
+                continue
+            if len(pool.records) < pool.size:
+                pool.records.append(pool.generate(self.rng))
+            with pool.lock:
+                if len(pool.records) >= pool.size:
+                    pool.refilling = False
+                else:
+                    wanted = True
+        return wanted
+
+    # Fills every pool up to its size in the calling thread, e.g. before serving the first requests
+    def fill(self):
+        while self.refill():
+            pass
+
+    def run(self):
+        while not self.stopping:
+            self.wanted.wait()
+            self.wanted.clear()
+            while not self.stopping and self.refill():
+                pass
+
+    # Starts the background thread, after loading the tables so it does not race the first requests for them
+    def start(self):
+        if self.thread is None:
+            data_loader.load_all()
+            chargen.prewarm_plans()
+            itemgen.prewarm_hoards()
+            self.stopping = False
+            self.thread = threading.Thread(target=self.run, name='content-pools', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopping = True
+            self.wanted.set()
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self):
+        with self.lock:
+            pools = list(self.pools.items())
+        return {key: PoolStats(hits=pool.hits, misses=pool.misses, size=len(pool.records), capacity=pool.size)
+                for key, pool in pools}
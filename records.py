@@ -0,0 +1,95 @@
+import gc
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+
+# The compile step shared by the generators' build_tables functions
+# the JSON sources are validated against a schema once at load time, and their records are turned into
+# namedtuples with interned strings, tuples and frozensets, so the generators never see a raw dict or a None
+# where they expect data
+
+
+class SchemaError(ValueError):
+    pass
+
+
+# Schema building blocks, a schema is a type (or tuple of types), one of these, or a dict of key: schema
+OptionalField = namedtuple('OptionalField', 'schema')
+ListOf = namedtuple('ListOf', 'schema')
+DictOf = namedtuple('DictOf', 'schema')
+
+NUMBER = (int, float)
+STRINGS = ListOf(str)
+
+
+# Raises a SchemaError naming the path of the first value that does not match its schema
+# keys that are not in a dict schema are allowed, so the sources can carry data no generator uses yet
+def validate(value, schema, path):
+    if isinstance(schema, OptionalField):
+        if value is None:
+            return
+        schema = schema.schema
+
+    if isinstance(schema, ListOf):
+        if not isinstance(value, list):
+            raise SchemaError(f'{path} should be a list, not {type(value).__name__}')
+        for position, item in enumerate(value):
+            validate(item, schema.schema, f'{path}[{position}]')
+    elif isinstance(schema, DictOf):
+        if not isinstance(value, dict):
+            raise SchemaError(f'{path} should be an object, not {type(value).__name__}')
+        for key, item in value.items():
+            validate(item, schema.schema, f'{path}.{key}')
+    elif isinstance(schema, dict):
+        if not isinstance(value, dict):
+            raise SchemaError(f'{path} should be an object, not {type(value).__name__}')
+        for key, key_schema in schema.items():
+            if key not in value and not isinstance(key_schema, OptionalField):
+                raise SchemaError(f'{path} is missing {key!r}')
+            validate(value.get(key), key_schema, f'{path}.{key}')
+    elif value is None or not isinstance(value, schema):
+        expected = ' or '.join(t.__name__ for t in schema) if isinstance(schema, tuple) else schema.__name__
+        raise SchemaError(f'{path} should be {expected}, not {type(value).__name__}')
+
+
+def intern_value(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def interned_tuple(values):
+    return tuple(intern_value(value) for value in values or ())
+
+
+def interned_set(values):
+    return frozenset(intern_value(value) for value in values or ())
+
+
+# Builds a record from a JSON object, missing fields are None and strings are interned
+# fields given as keyword arguments replace the values from the object
+def make_record(record_type, data, **fields):
+    values = {field: intern_value(data.get(field)) for field in record_type._fields if field not in fields}
+    values.update(fields)
+    return record_type(**values)
+
+
+# A fixed set of names coded as integers in table order
+# Enumeration(names=('treasure', 'armor'), codes={'treasure': 0, 'armor': 1})
+Enumeration = namedtuple('Enumeration', 'names codes')
+
+
+def enumeration(names):
+    names = interned_tuple(names)
+    return Enumeration(names=names, codes={name: code for code, name in enumerate(names)})
+
+
+# Pauses the cyclic garbage collector while a batch of records is built, records hold no reference cycles,
+# so the collections their allocation would trigger would find nothing to free
+@contextmanager
+def allocating():
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if collecting:
+            gc.enable()
@@ -0,0 +1,45 @@
+import importlib
+import math
+import os
+import sys
+
+# The repository folder is the package itself (imported by the name it was cloned as, e.g. mdnl_nexus),
+# so the tests import its modules from the folder above it
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.path.dirname(ROOT) not in sys.path:
+    sys.path.insert(0, os.path.dirname(ROOT))
+PACKAGE = os.path.basename(ROOT)
+
+
+def import_module(name):
+    return importlib.import_module(f'{PACKAGE}.{name}')
+
+
+# The p-value of a chi-square statistic, by the Wilson-Hilferty normal approximation
+def chi_square_p_value(statistic, degrees_of_freedom):
+    if degrees_of_freedom <= 0:
+        return 1.0
+    scale = 2 / (9 * degrees_of_freedom)
+    z = ((statistic / degrees_of_freedom) ** (1 / 3) - (1 - scale)) / math.sqrt(scale)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+# The p-value of counts of outcomes coming from a distribution (chi-square goodness of fit test)
+# outcomes expected fewer than 5 times are pooled, and an outcome that can not happen fails the test outright
+def goodness_of_fit_p_value(counts, probabilities):
+    if any(not probabilities.get(outcome) for outcome in counts):
+        return 0.0
+    total = sum(counts.values())
+    cells = []
+    pooled = [0, 0.0]
+    for outcome in set(counts) | set(probabilities):
+        observed, expected = counts.get(outcome, 0), total * probabilities.get(outcome, 0)
+        if expected < 5:
+            pooled[0] += observed
+            pooled[1] += expected
+        else:
+            cells.append((observed, expected))
+    if pooled[1] > 0:
+        cells.append(tuple(pooled))
+    statistic = sum((observed - expected) ** 2 / expected for observed, expected in cells)
+    return chi_square_p_value(statistic, len(cells) - 1)
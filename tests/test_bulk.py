@@ -0,0 +1,22 @@
+from conftest import import_module
+
+bulk = import_module('bulk')
+
+COUNT = 250
+# Not a divisor of COUNT, so the last shard is a short one
+SHARD_SIZE = 37
+
+
+def test_same_records_for_any_number_of_workers():
+    single = list(bulk.generate('item', COUNT, ['any'], master_seed=11, workers=1, shard_size=SHARD_SIZE))
+    spread = list(bulk.generate('item', COUNT, ['any'], master_seed=11, workers=2, shard_size=SHARD_SIZE))
+    unordered = list(bulk.generate('item', COUNT, ['any'], master_seed=11, workers=2, shard_size=SHARD_SIZE,
+                                   ordered=False))
+    assert len(single) == COUNT
+    assert spread == single
+    assert sorted(map(repr, unordered)) == sorted(map(repr, single))
+
+
+def test_shard_seeds_follow_the_seeds_of_the_generators():
+    assert bulk.get_shard_seed(7, 0) != bulk.get_shard_seed('7', 0)
+    assert bulk.get_shard_seed(7, 0) == bulk.get_shard_seed(7, 0)
@@ -0,0 +1,13 @@
+from conftest import import_module
+
+cache = import_module('cache')
+placegen = import_module('placegen')
+
+
+# Equal seeds with different reprs give different villages, so the cache has to keep them apart
+def test_cached_record_matches_its_seed():
+    content = cache.ContentCache()
+    for seed in ([3, 4], (3, 4), 7, 7.0):
+        assert content.get('village', seed) == placegen.create_village(seed=seed)
+    assert content.get('village', [3, 4]) == placegen.create_village(seed=[3, 4])
+    assert content.stats().hits == 1
@@ -0,0 +1,114 @@
+import itertools
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from conftest import chi_square_p_value
+from conftest import import_module
+
+np = pytest.importorskip('numpy')
+chargen = import_module('chargen')
+
+SAMPLES = 4000
+# A fixed-seed comparison either always passes or always fails, so the threshold only has to rule out real differences
+MIN_P_VALUE = 1e-4
+
+
+# The p-value of two samples of counts coming from the same distribution (chi-square test of homogeneity)
+# outcomes expected fewer than 5 times are pooled
+def homogeneity_p_value(first, second):
+    total_first = sum(first.values())
+    total_second = sum(second.values())
+    cells = []
+    pooled = [0, 0]
+    for key in set(first) | set(second):
+        observed = (first.get(key, 0), second.get(key, 0))
+        expected = sum(observed) * min(total_first, total_second) / (total_first + total_second)
+        if expected < 5:
+            pooled[0] += observed[0]
+            pooled[1] += observed[1]
+        else:
+            cells.append(observed)
+    if sum(pooled):
+        cells.append(tuple(pooled))
+
+    statistic = 0
+    for observed in cells:
+        for count, total in zip(observed, (total_first, total_second)):
+            expected = sum(observed) * total / (total_first + total_second)
+            statistic += (count - expected) ** 2 / expected
+    return chi_square_p_value(statistic, len(cells) - 1)
+
+
+# The two-sided p-value of two samples having the same mean (z-test)
+def mean_p_value(first, second):
+    first = np.asarray(first, dtype=float)
+    second = np.asarray(second, dtype=float)
+    error = math.sqrt(first.var(ddof=1) / len(first) + second.var(ddof=1) / len(second))
+    if error == 0:
+        return 1.0 if first.mean() == second.mean() else 0.0
+    return math.erfc(abs(first.mean() - second.mean()) / error / math.sqrt(2))
+
+
+@pytest.fixture(scope='module')
+def characters():
+    rng = random.Random(1)
+    scalar = [chargen.generate_character(rng=rng) for _ in range(SAMPLES)]
+    batch = chargen.generate_characters(SAMPLES, seed=1)
+    return scalar, batch
+
+
+@pytest.mark.parametrize('key', [lambda character: character.kin.name,
+                                 lambda character: character.age.name,
+                                 lambda character: character.profession.name],
+                         ids=['kin', 'age', 'profession'])
+def test_batch_marginals_match_scalar(characters, key):
+    scalar, batch = characters
+    assert homogeneity_p_value(Counter(map(key, scalar)), Counter(map(key, batch))) > MIN_P_VALUE
+
+
+@pytest.mark.parametrize('key', [lambda character: sum(attribute.level for attribute in character.attributes),
+                                 lambda character: len(character.skills),
+                                 lambda character: len(character.talents)],
+                         ids=['attribute_sum', 'skill_count', 'talent_count'])
+def test_batch_means_match_scalar(characters, key):
+    scalar, batch = characters
+    assert mean_p_value(list(map(key, scalar)), list(map(key, batch))) > MIN_P_VALUE
+
+
+# The levels of the batch characters never go over the point limits of char_data.json
+def test_batch_levels_within_point_limits(characters):
+    _, batch = characters
+    point_limits = chargen.char_data['point_limits']
+
+    def limit(kind, matches):
+        return point_limits[kind].get(str(matches)) or point_limits[kind]['DEFAULT']
+
+    for character in batch:
+        for attribute in character.attributes:
+            matches = (character.kin.attribute == attribute.name) + (character.profession.attribute == attribute.name)
+            assert attribute.level <= limit('attributes', matches)
+        for skill in character.skills:
+            assert skill.level <= limit('skills', int(skill.name in character.profession.skills))
+        for talent in character.talents:
+            assert talent.level <= limit('talents', 'DEFAULT')
+
+
+def test_batch_requested_kin_and_profession():
+    kin = list(chargen.KINS)[0]
+    profession = list(chargen.PROFESSIONS)[0]
+    batch = chargen.generate_characters(50, kin, profession, seed=2)
+    assert {(character.kin.name, character.profession.name) for character in batch} == {(kin, profession)}
+
+
+# Parts with empty and repeated strings, so a name can be spelled more than one way
+def test_name_space_excludes_short_and_banned_names():
+    parts = (['', 'a', 'ka', 'a'], ['', 'r', 'ra'], ['', 'k', 'ak', 'n'])
+    banned = {'karak', 'ran', 'zed'}
+    space = chargen.compile_name_space(parts, banned)
+    excluded = [flat for flat, combination in enumerate(itertools.product(*parts))
+                if ''.join(combination) in banned or len(''.join(combination)) <= 2]
+    assert space.size == 4 * 3 * 4 - len(excluded)
+    assert space.offsets == tuple(flat - position for position, flat in enumerate(excluded))
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import import_module
+
+data_loader = import_module('data_loader')
+
+
+# A data_loader of its own for every test, with its sources in a temporary folder and no snapshots
+@pytest.fixture
+def loader(tmp_path, monkeypatch):
+    (tmp_path / 'sources').mkdir()
+    monkeypatch.setattr(data_loader, 'base_folder', str(tmp_path))
+    monkeypatch.setattr(data_loader, 'use_snapshots', False)
+    for state in ('sources', 'registry', 'source_states', 'failed_states'):
+        monkeypatch.setattr(data_loader, state, {})
+    return data_loader
+
+
+# Writes a source, with a modification time that always differs from the one it replaces
+def write_source(filename, data):
+    path = data_loader.get_source_path(filename)
+    previous = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    os.utime(path, ns=(previous + 1_000_000, previous + 1_000_000))
+
+
+# Registers tables whose VALUE is the value of a source, counting how many times they are built
+def register(name, filename, builds):
+    def build(data):
+        if not isinstance(data.get('value'), int):
+            raise ValueError(f'{filename} has no int value')
+        builds[name] += 1
+        return {'VALUE': data['value']}
+    return data_loader.register(name, build, filename)
+
+
+def test_reload_rebuilds_only_the_tables_of_changed_sources(loader):
+    builds = {'first': 0, 'second': 0}
+    write_source('first.json', {'value': 1})
+    write_source('second.json', {'value': 2})
+    first = register('first', 'first.json', builds)
+    second = register('second', 'second.json', builds)
+    assert (first.VALUE, second.VALUE) == (1, 2)
+
+    write_source('first.json', {'value': 3})
+    assert loader.reload() == ['first.json']
+    assert (first.VALUE, second.VALUE) == (3, 2)
+    assert builds == {'first': 2, 'second': 1}
+    assert loader.reload() == []
+
+
+def test_failed_source_keeps_the_old_tables_and_is_not_retried_until_it_changes(loader):
+    builds = {'first': 0}
+    write_source('first.json', {'value': 1})
+    first = register('first', 'first.json', builds)
+    assert first.VALUE == 1
+
+    write_source('first.json', {'value': 'one'})
+    with pytest.raises(ValueError):
+        loader.reload()
+    assert first.VALUE == 1
+    assert loader.reload() == []
+
+    write_source('first.json', {'value': 4})
+    assert loader.reload() == ['first.json']
+    assert first.VALUE == 4
+
+
+def test_request_in_flight_sees_only_the_old_or_only_the_new_tables(loader):
+    write_source('first.json', {'value': 1})
+    first = register('first', 'first.json', {'first': 0})
+    started = threading.Event()
+
+    @loader.consistent
+    def slow_request():
+        before = first.VALUE
+        started.set()
+        time.sleep(0.2)
+        return before, first.VALUE
+
+    results = []
+    request = threading.Thread(target=lambda: results.append(slow_request()))
+    request.start()
+    started.wait()
+    write_source('first.json', {'value': 2})
+    assert loader.reload() == ['first.json']
+    request.join()
+    assert results == [(1, 1)]
+    assert slow_request() == (2, 2)
+
+
+def test_reload_inside_a_consistent_generator_raises(loader):
+    write_source('first.json', {'value': 1})
+    register('first', 'first.json', {'first': 0})
+
+    @loader.consistent
+    def request():
+        return loader.reload()
+
+    with pytest.raises(RuntimeError):
+        request()
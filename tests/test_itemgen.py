@@ -0,0 +1,79 @@
+import math
+import statistics
+from collections import Counter
+
+import pytest
+
+from conftest import goodness_of_fit_p_value
+from conftest import import_module
+
+analysis = import_module('analysis')
+itemgen = import_module('itemgen')
+
+HOARDS = 300
+CONSTRAINED_SAMPLES = 4000
+MIN_P_VALUE = 1e-4
+
+
+@pytest.mark.parametrize('value, max_carry_weight', [('200 guld', 30), ('30 guld', 6), (500, 2), (120, 0)])
+def test_hoards_centered_within_tolerance(value, max_carry_weight):
+    copper = itemgen.parse_value(value) if isinstance(value, str) else value
+    slack = int(copper * itemgen.DEFAULT_HOARD_TOLERANCE)
+    hoards = [itemgen.generate_hoard(value, max_carry_weight, seed=seed) for seed in range(HOARDS)]
+    totals = [hoard.copper for hoard in hoards]
+
+    for hoard in hoards:
+        assert copper - slack <= hoard.copper <= copper + slack
+        assert hoard.carry_weight <= max_carry_weight
+        assert len(hoard.items) <= itemgen.DEFAULT_HOARD_ITEMS
+        assert sum(itemgen.parse_value(item.value) for item in hoard.items) == hoard.copper
+
+    # The totals are spread over the window around the value, not piled up at one edge of it
+    error = statistics.pstdev(totals) / math.sqrt(HOARDS)
+    assert abs(statistics.mean(totals) - copper) < 4 * error
+    assert totals.count(copper - slack) < HOARDS / 10
+
+
+def test_unreachable_hoard_raises():
+    with pytest.raises(itemgen.ConstraintError):
+        itemgen.generate_hoard('10000 guld', 6)
+
+
+# Any use of the rng fails, so a constraint error has to come before the first draw
+class UnusableRandom:
+    def __getattr__(self, name):
+        raise AssertionError(f'the rng was used ({name}) before the constraints were checked')
+
+
+@pytest.mark.parametrize('constraints', [itemgen.ItemConstraints(categories=['weapon'], max_carry_weight=-5),
+                                         itemgen.ItemConstraints(min_value=10 ** 9),
+                                         itemgen.ItemConstraints(categories=['tool'], min_damage=1)])
+def test_infeasible_constraints_raise_before_drawing(constraints):
+    with pytest.raises(itemgen.ConstraintError):
+        itemgen.generate_constrained_item(constraints, ['any'], 'cheap', rng=UnusableRandom())
+
+
+# The categories of constrained items are those of generate_item, conditioned on the constraint
+def test_constrained_categories_match_the_conditioned_distribution():
+    categories = ('weapon', 'armor', 'tool')
+    constraints = itemgen.ItemConstraints(categories=categories)
+    counts = Counter(itemgen.generate_constrained_item(constraints, ['any'], 'valuable', seed=seed).category
+                     for seed in range(CONSTRAINED_SAMPLES))
+    distribution = analysis.get_item_distribution(['any'], 'valuable').categories
+    conditioned = {category: distribution[category] / sum(distribution[other] for other in categories)
+                   for category in categories}
+    assert goodness_of_fit_p_value(counts, conditioned) > MIN_P_VALUE
+
+
+# The values of constrained items are those of generate_item, conditioned on the value bounds
+def test_constrained_values_match_the_conditioned_distribution():
+    low, high = 20, 60
+    constraints = itemgen.ItemConstraints(min_value=low, max_value=high)
+    counts = Counter(itemgen.parse_value(itemgen.generate_constrained_item(constraints, ['any'], 'cheap',
+                                                                           seed=seed).value)
+                     for seed in range(CONSTRAINED_SAMPLES))
+    distribution = {value: probability
+                    for value, probability in analysis.get_value_distribution(['any'], 'cheap').items()
+                    if low <= value <= high}
+    conditioned = {value: probability / sum(distribution.values()) for value, probability in distribution.items()}
+    assert goodness_of_fit_p_value(counts, conditioned) > MIN_P_VALUE
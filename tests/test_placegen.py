@@ -0,0 +1,32 @@
+import pytest
+
+from conftest import import_module
+
+placegen = import_module('placegen')
+
+SEEDS = (3, 'crypt', (2, 5))
+
+
+@pytest.mark.parametrize('connect', [False, True])
+@pytest.mark.parametrize('seed', SEEDS)
+def test_dungeon_room_is_the_streamed_room(seed, connect):
+    dungeon = placegen.create_streamed_dungeon(seed, connect=connect)
+    streamed = list(dungeon.rooms)
+    assert len(streamed) == dungeon.dungeon.size.rooms
+    for number, room in enumerate(streamed):
+        assert placegen.get_dungeon_room(seed, number, connect=connect) == room
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_room_exits_are_symmetric(seed):
+    rooms = 200
+    exits = [placegen.get_room_exits(seed, number, rooms, placegen.get_door_count(seed, number))
+             for number in range(rooms)]
+    for number, room_exits in enumerate(exits):
+        assert len(room_exits) == placegen.get_door_count(seed, number)
+        for other in range(rooms):
+            assert (other in room_exits) == (number in exits[other])
+
+
+def test_dungeon_seeds_follow_the_seeds_of_the_generators():
+    assert placegen.get_dungeon_seed(7, 'room', 0) != placegen.get_dungeon_seed('7', 'room', 0)
@@ -0,0 +1,24 @@
+from conftest import import_module
+
+itemgen = import_module('itemgen')
+pools = import_module('pools')
+
+KEY = ('item', 'precious', 'weapon')
+
+
+def test_get_serves_a_filled_pool_and_counts_hits_and_misses():
+    content = pools.ContentPools({KEY: 4}, seed=3)
+    content.fill()
+    assert content.stats()[KEY] == pools.PoolStats(hits=0, misses=0, size=4, capacity=4)
+
+    items = [content.get_item('precious', 'weapon') for _ in range(6)]
+    assert all(isinstance(item, itemgen.Item) and item.category == 'weapon' for item in items)
+    assert content.stats()[KEY] == pools.PoolStats(hits=4, misses=2, size=0, capacity=4)
+
+
+def test_pool_of_a_new_key_is_added_on_its_first_request():
+    content = pools.ContentPools(default_size=3, seed=3)
+    assert content.get_room() is not None
+    assert content.stats()[('room',)] == pools.PoolStats(hits=0, misses=1, size=0, capacity=3)
+    content.fill()
+    assert content.stats()[('room',)].size == 3
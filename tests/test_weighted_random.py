@@ -0,0 +1,86 @@
+import random
+from collections import Counter
+
+import pytest
+
+from conftest import goodness_of_fit_p_value
+from conftest import import_module
+
+weighted_random = import_module('weighted_random')
+
+SAMPLES = 20000
+MIN_P_VALUE = 1e-4
+WEIGHTS = {'a': 1, 'b': 2, 'c': 3.5, 'd': 0.5, 'e': 13}
+
+
+def draw(sampler, seed=1):
+    rng = random.Random(seed)
+    return Counter(sampler.choice(rng) for _ in range(SAMPLES))
+
+
+def normalize(weights):
+    total = sum(weights.values())
+    return {key: weight / total for key, weight in weights.items()}
+
+
+def test_frequencies_follow_the_weights():
+    assert goodness_of_fit_p_value(draw(weighted_random.WeightedSampler(WEIGHTS)), normalize(WEIGHTS)) > MIN_P_VALUE
+
+
+def test_removed_keys_are_never_drawn():
+    sampler = weighted_random.WeightedSampler(WEIGHTS)
+    sampler.remove('b')
+    sampler.remove('missing')
+    weights = {key: weight for key, weight in WEIGHTS.items() if key != 'b'}
+    assert len(sampler) == 4 and 'b' not in sampler
+    assert sampler.weights == weights
+    assert goodness_of_fit_p_value(draw(sampler), normalize(weights)) > MIN_P_VALUE
+
+
+# Removing 'e' removes more than half of the total weight, which rebuilds the table without the removed keys
+def test_table_is_rebuilt_after_half_the_weight_is_removed():
+    sampler = weighted_random.WeightedSampler(WEIGHTS)
+    sampler.remove('a')
+    assert len(sampler._keys) == 5
+    sampler.remove('e')
+    weights = {'b': 2, 'c': 3.5, 'd': 0.5}
+    assert sorted(sampler._keys) == sorted(weights)
+    assert sampler.weights == weights
+    assert goodness_of_fit_p_value(draw(sampler), normalize(weights)) > MIN_P_VALUE
+
+
+def test_set_weight():
+    sampler = weighted_random.WeightedSampler(WEIGHTS)
+    sampler.set_weight('a', 20)
+    sampler.set_weight('f', 4)
+    sampler.set_weight('e', 0)
+    weights = {'a': 20, 'b': 2, 'c': 3.5, 'd': 0.5, 'f': 4}
+    assert sampler.weights == weights
+    assert goodness_of_fit_p_value(draw(sampler), normalize(weights)) > MIN_P_VALUE
+
+
+def test_copy_of_a_frozen_sampler_leaves_it_unchanged():
+    frozen = weighted_random.WeightedSampler(WEIGHTS, frozen=True)
+    with pytest.raises(TypeError):
+        frozen.remove('a')
+    with pytest.raises(TypeError):
+        frozen.set_weight('a', 3)
+
+    sampler = frozen.copy()
+    sampler.remove('e')
+    sampler.remove('a')
+    sampler.set_weight('b', 9)
+    assert frozen.weights == WEIGHTS
+    assert len(frozen) == 5
+    assert goodness_of_fit_p_value(draw(frozen), normalize(WEIGHTS)) > MIN_P_VALUE
+
+
+def test_zero_weights_are_never_drawn():
+    assert weighted_random.WeightedSampler({'a': 0, 'b': 0}).choice() is None
+    assert weighted_random.WeightedSampler({}).choice() is None
+    sampler = weighted_random.WeightedSampler({'a': 0, 'b': 1})
+    assert len(sampler) == 1 and 'a' not in sampler
+    assert set(draw(sampler)) == {'b'}
+
+    sampler.remove('b')
+    assert sampler.choice() is None
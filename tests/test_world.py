@@ -0,0 +1,40 @@
+import pytest
+
+from conftest import import_module
+
+world = import_module('world')
+
+SEED = 5
+RADIUS = 14
+CENTERS = ((0, 0), (9, -23), (-31, 4))
+FILTERS = ((None, None), ('village', None), ('village', world.has_tavern), ('fortress', None))
+
+
+# Every cell with a place within RADIUS steps of (q, r), straight from create_cell, nearest first
+def scan(q, r, place_type=None, where=None):
+    area = world.World(SEED)
+    found = []
+    for cell_q in range(q - RADIUS, q + RADIUS + 1):
+        for cell_r in range(r - RADIUS, r + RADIUS + 1):
+            cell = area.create_cell(cell_q, cell_r)
+            distance = world.get_distance(q, r, cell_q, cell_r)
+            if cell.place is not None and distance <= RADIUS and world.matches(cell, place_type, where):
+                found.append((distance, cell_q, cell_r, cell))
+    return [cell for *_, cell in sorted(found, key=lambda match: match[:3])]
+
+
+@pytest.mark.parametrize('place_type, where', FILTERS)
+@pytest.mark.parametrize('q, r', CENTERS)
+def test_within_and_nearest_match_a_full_scan(q, r, place_type, where):
+    expected = scan(q, r, place_type, where)
+    area = world.World(SEED, chunk_size=5)
+    assert area.within(q, r, RADIUS, place_type, where) == expected
+    assert area.nearest(q, r, place_type, where, max_radius=RADIUS) == (expected[0] if expected else None)
+
+
+# Without room for a second chunk every chunk is evicted right away, so a chunk visited twice is generated twice
+def test_nearest_generates_every_chunk_once():
+    roomy = world.World(SEED, chunk_size=4)
+    cramped = world.World(SEED, chunk_size=4, max_bytes=1)
+    assert roomy.nearest(0, 0, 'village', world.has_tavern) == cramped.nearest(0, 0, 'village', world.has_tavern)
+    assert cramped.stats().generated == roomy.stats().generated == roomy.stats().chunks
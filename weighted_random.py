@@ -1,15 +1,144 @@
+import hashlib
 import random
+from functools import lru_cache
+
+
+# A weights dictionary compiled into a Walker/Vose alias table
+# every draw is O(1) regardless of the number of keys, unlike the linear scan in weighted_random_choice
+# keys can be removed cheaply: removed keys are rejected on draw and the table is only rebuilt
+# once more than half of the total weight has been removed
+class WeightedSampler:
+    __slots__ = ('_weights', '_keys', '_probabilities', '_aliases', '_total', '_removed', '_removed_weight',
+                 '_frozen')
+
+    def __init__(self, weights, frozen=False):
+        self._weights = {key: weight for key, weight in weights.items() if weight > 0}
+        self._frozen = frozen
+        self._build()
+
+    def _build(self):
+        keys = list(self._weights.keys())
+        size = len(keys)
+        total = sum(self._weights.values())
+        probabilities = [1.0] * size
+        aliases = list(range(size))
+
+        if size > 0:
+            scaled = [self._weights[key] * size / total for key in keys]
+            small = [i for i, probability in enumerate(scaled) if probability < 1]
+            large = [i for i, probability in enumerate(scaled) if probability >= 1]
+            while small and large:
+                less = small.pop()
+                more = large.pop()
+                probabilities[less] = scaled[less]
+                aliases[less] = more
+                scaled[more] = scaled[more] + scaled[less] - 1
+                if scaled[more] < 1:
+                    small.append(more)
+                else:
+                    large.append(more)
+
+        self._keys = keys
+        self._probabilities = probabilities
+        self._aliases = aliases
+        self._total = total
+        self._removed = set()
+        self._removed_weight = 0
+
+    def __len__(self):
+        return len(self._keys) - len(self._removed)
+
+    def __contains__(self, key):
+        return key in self._weights and key not in self._removed
+
+    @property
+    def weights(self):
+        return {key: weight for key, weight in self._weights.items() if key not in self._removed}
+
+    def copy(self):
+        sampler = WeightedSampler.__new__(WeightedSampler)
+        sampler._weights = self._weights
+        sampler._keys = self._keys
+        sampler._probabilities = self._probabilities
+        sampler._aliases = self._aliases
+        sampler._total = self._total
+        sampler._removed = set(self._removed)
+        sampler._removed_weight = self._removed_weight
+        sampler._frozen = False
+        return sampler
+
+    # returns a key chosen by its weight, or None if no keys are left
+    def choice(self, rng=random):
+        keys = self._keys
+        size = len(keys)
+        if size - len(self._removed) <= 0:
+            return None
+
+        while True:
+            scaled = rng.random() * size
+            index = int(scaled)
+            if scaled - index < self._probabilities[index]:
+                key = keys[index]
+            else:
+                key = keys[self._aliases[index]]
+            if key not in self._removed:
+                return key
+
+    # removes a key, which is the same as setting its weight to zero
+    def remove(self, key):
+        if self._frozen:
+            raise TypeError('cannot modify a shared compiled sampler, use copy() first')
+        if key not in self._weights or key in self._removed:
+            return
+
+        self._removed.add(key)
+        self._removed_weight += self._weights[key]
+        if self._removed_weight * 2 > self._total:
+            self._weights = {key: weight for key, weight in self._weights.items() if key not in self._removed}
+            self._build()
+
+    def set_weight(self, key, weight):
+        if weight <= 0:
+            self.remove(key)
+            return
+        if self._frozen:
+            raise TypeError('cannot modify a shared compiled sampler, use copy() first')
+
+        weights = self.weights
+        weights[key] = weight
+        self._weights = weights
+        self._build()
+
+
+@lru_cache(maxsize=1024)
+def _compile_weights(weight_items):
+    return WeightedSampler(dict(weight_items), frozen=True)
+
+
+# returns a shared, cached sampler for a weights dictionary
+# meant for static tables, copy() the sampler before removing keys from it
+def compile_weights(weights):
+    return _compile_weights(tuple(weights.items()))
 
 
 # returns a dictionary key chosen by its weight (value)
 # the higher the weight, the likelier it is that the key is chosen
-def weighted_random_choice(weights):
+def weighted_random_choice(weights, rng=random):
     if len(weights) > 0:
-        weight_total = sum(weights.values())
-        weighted_random_number = random.randint(0, weight_total - 1)
-        total_sum = 0
-
-        for weight in weights.items():
-            total_sum += weight[1]
-            if total_sum > weighted_random_number:
-                return weight[0]
+        return compile_weights(weights).choice(rng)
+
+
+# returns the int a seed or key stands for, e.g. 7, 'village:3:4' or ('village', 3, 4)
+# int seeds are kept as they are, other keys become a digest of their repr, which unlike hash() is the same in every
+# process, so the same key always gives the same content
+# two keys that are equal but have different reprs, e.g. [3, 4] and (3, 4), are different seeds
+def get_seed(seed):
+    if isinstance(seed, int):
+        return seed
+    digest = hashlib.sha256(repr(seed).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+# returns a private random number generator for a seed or key
+def get_rng(seed):
+    return random.Random(get_seed(seed))
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from collections import namedtuple
+
+from . import cache
+from . import placegen
+from . import weighted_random
+
+# A hex map of a whole region, generated lazily a chunk at a time as it is looked at
+# cells are addressed by axial coordinates (q, r), and the content of a cell only depends on the world seed and its
+# coordinates, so a chunk that was evicted is generated again the same, and chunk sizes never change the map
+# the chunks double as the spatial index: a query only visits the chunks its area overlaps
+
+DEFAULT_CHUNK_SIZE = 16
+# The share of the cells that hold a place
+DEFAULT_DENSITY = 0.08
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# How far nearest looks before it gives up
+DEFAULT_MAX_RADIUS = 256
+
+# A cell of the map, place is a village, dungeon or fortress from placegen.create_place, or None
+Cell = namedtuple('Cell', 'q r place')
+
+# A square of chunk_size by chunk_size cells in axial coordinates, cells maps (q, r) to the cells with a place
+Chunk = namedtuple('Chunk', 'key cells size')
+
+WorldStats = namedtuple('WorldStats', 'chunks bytes generated evicted')
+
+
+# The number of steps between two cells
+def get_distance(q1, r1, q2, r2):
+    dq = q1 - q2
+    dr = r1 - r2
+    return (abs(dq) + abs(dr) + abs(dq + dr)) // 2
+
+
+# The keys of the chunks ring chunks away from the chunk (cq, cr), the chunk itself for ring 0
+def get_ring_keys(cq, cr, ring):
+    if ring == 0:
+        return [(cq, cr)]
+    keys = [(cq + offset, cr + side) for offset in range(-ring, ring + 1) for side in (-ring, ring)]
+    keys += [(cq + side, cr + offset) for offset in range(-ring + 1, ring) for side in (-ring, ring)]
+    return keys
+
+
+# Whether the place of a cell is of place_type and passes where, when they are given
+def matches(cell, place_type, where):
+    return (place_type is None or cell.place.type == place_type) and (where is None or where(cell.place))
+
+
+# Whether a village has a tavern, e.g. world.nearest(q, r, 'village', where=has_tavern)
+def has_tavern(place):
+    return any(institution.type == 'tavern' for institution in getattr(place, 'institutions', ()))
+
+
+class World:
+    def __init__(self, seed, chunk_size=DEFAULT_CHUNK_SIZE, density=DEFAULT_DENSITY, max_bytes=DEFAULT_MAX_BYTES):
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.density = density
+        self.max_bytes = max_bytes
+        # The generated chunks, least recently used first
+        self.chunks = OrderedDict()
+        self.bytes = 0
+        self.generated = 0
+        self.evicted = 0
+
+    # The content of a cell, drawn from its own rng
+    def create_cell(self, q, r):
+        rng = weighted_random.get_rng(('cell', self.seed, q, r))
+        if rng.random() >= self.density:
+            return Cell(q=q, r=r, place=None)
+        return Cell(q=q, r=r, place=placegen.create_place(rng=rng))
+
+    def create_chunk(self, key):
+        cq, cr = key
+        cells = {}
+        for q in range(cq * self.chunk_size, (cq + 1) * self.chunk_size):
+            for r in range(cr * self.chunk_size, (cr + 1) * self.chunk_size):
+                cell = self.create_cell(q, r)
+                if cell.place is not None:
+                    cells[(q, r)] = cell
+        return Chunk(key=key, cells=cells, size=cache.get_size(cells))
+
+    def get_chunk_key(self, q, r):
+        return q // self.chunk_size, r // self.chunk_size
+
+    # Returns a chunk, generating it if it is not in memory, and evicts the least recently used chunks over budget
+    def get_chunk(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        chunk = self.chunks[key] = self.create_chunk(key)
+        self.bytes += chunk.size
+        self.generated += 1
+        while len(self.chunks) > 1 and self.bytes > self.max_bytes:
+            _, evicted = self.chunks.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evicted += 1
+        return chunk
+
+    def get_cell(self, q, r):
+        cell = self.get_chunk(self.get_chunk_key(q, r)).cells.get((q, r))
+        return cell if cell is not None else Cell(q=q, r=r, place=None)
+
+    # The cells with a place within radius steps of (q, r), nearest first
+    # place_type ('village', 'dungeon' or 'fortress') and where (a function of the place) filter the places
+    def within(self, q, r, radius, place_type=None, where=None):
+        min_cq, min_cr = self.get_chunk_key(q - radius, r - radius)
+        max_cq, max_cr = self.get_chunk_key(q + radius, r + radius)
+        found = []
+        for cq in range(min_cq, max_cq + 1):
+            for cr in range(min_cr, max_cr + 1):
+                for cell in self.get_chunk((cq, cr)).cells.values():
+                    distance = get_distance(q, r, cell.q, cell.r)
+                    if distance > radius or not matches(cell, place_type, where):
+                        continue
+                    found.append((distance, cell.q, cell.r, cell))
+        found.sort(key=lambda match: match[:3])
+        return [cell for _, _, _, cell in found]
+
+    # The nearest cell with a place to (q, r) that matches place_type and where, or None within max_radius
+    # ties are broken the same as in within, by q and then r
+    # looks through growing rings of chunks around the chunk of (q, r), visiting every chunk once, and stops as soon
+    # as the next ring is farther away than the nearest match so far, so only the chunks around (q, r) are generated
+    def nearest(self, q, r, place_type=None, where=None, max_radius=DEFAULT_MAX_RADIUS):
+        cq, cr = self.get_chunk_key(q, r)
+        best = None
+        ring = 0
+        # Every cell of a chunk ring chunks away is at least (ring - 1) * chunk_size + 1 steps from (q, r)
+        while ring == 0 or (ring - 1) * self.chunk_size + 1 <= (best[0] if best else max_radius):
+            for key in get_ring_keys(cq, cr, ring):
+                for cell in self.get_chunk(key).cells.values():
+                    distance = get_distance(q, r, cell.q, cell.r)
+                    if distance > max_radius or not matches(cell, place_type, where):
+                        continue
+                    match = (distance, cell.q, cell.r, cell)
+                    if best is None or match[:3] < best[:3]:
+                        best = match
+            ring += 1
+        return best[3] if best else None
+
+    def stats(self):
+        return WorldStats(chunks=len(self.chunks), bytes=self.bytes, generated=self.generated, evicted=self.evicted)